@@ -4,6 +4,7 @@ from flask_login import LoginManager
 from flask_migrate import Migrate
 from datetime import datetime
 import os
+import uuid
 
 db = SQLAlchemy()
 login_manager = LoginManager()
@@ -11,7 +12,7 @@ migrate = Migrate()
 
 from app.models import User 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     
     # Config
@@ -19,11 +20,41 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///expenses.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Dashboard panels: opt-in concurrent computation on a bounded thread pool
+    app.config['DASHBOARD_CONCURRENT_PANELS'] = False
+    app.config['DASHBOARD_PANEL_WORKERS'] = 4
+    app.config['DASHBOARD_PANEL_DEADLINE'] = 2.0  # seconds per request
+    
+    # Live updates: Server-Sent Events keep-alive interval
+    app.config['LIVE_HEARTBEAT_SECONDS'] = 15
+    
+    # Analytics: serve batched widgets from cached NumPy snapshots (needs numpy)
+    app.config['COLUMNAR_ANALYTICS'] = False
+    
+    # Writes: opt-in group commit of request writes on one writer thread (SQLite only)
+    app.config['WRITE_BATCHING'] = False
+    app.config['WRITE_BATCH_WINDOW_MS'] = 2
+    app.config['WRITE_BATCH_MAX_UNITS'] = 64
+    
+    # Idempotency-Key replays are answered from the original result for this long
+    app.config['IDEMPOTENCY_KEY_TTL_HOURS'] = 24
+    
+    # Overrides must be applied before extensions create the database engine
+    if config:
+        app.config.update(config)
+    
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
     
+    # Publish committed data changes to live subscribers; keep derived tables current
+    from app import events, columnar, listeners, batcher
+    events.init_app(app)
+    columnar.init_app(app)
+    listeners.init_app(app)
+    batcher.init_app(app)
+    
     # Initialize Flask-Admin with security boundaries
     from app.admin import init_admin
     init_admin(app, db)
@@ -41,8 +72,12 @@ def create_app():
     app.register_blueprint(main_bp)
     app.register_blueprint(transactions_bp, url_prefix='/transactions')
     
+    # Batch jobs: flask budgets snapshot
+    from app.commands import register_commands
+    register_commands(app)
+    
     @app.context_processor
     def utility_processor():
-        return dict(now=datetime.now)
+        return dict(now=datetime.now, idempotency_token=lambda: uuid.uuid4().hex)
     
     return app
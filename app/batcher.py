@@ -0,0 +1,146 @@
+"""
+Group commit of request writes on SQLite (optional, off by default).
+
+SQLite serializes writers and every commit takes the write lock and syncs the
+journal, so a burst of small request commits queues up behind the disk. With
+WRITE_BATCHING on, request threads hand their writes to a single writer thread
+as *write units* and block on a future for the unit's result. The writer
+collects units for up to WRITE_BATCH_WINDOW_MS (or WRITE_BATCH_MAX_UNITS),
+runs them all and commits the batch in one transaction. If that fails, the
+batch is rolled back and re-run with one SAVEPOINT per unit, so a failing
+unit only fails itself.
+
+A write unit is a callable taking the session it must write with. It runs on
+the writer thread, so it must not touch the request's session, current_user
+or other request-bound proxies, should return plain values (ids) rather than
+ORM objects, and may run twice (after a rolled-back batch). The usual session
+hooks (ledger, shares, change events) run as for any other flush/commit.
+
+run_write() is the entry point: with batching off, or on other databases, it
+runs the unit on the caller's own session and commits straight away.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from . import db
+
+_STOP = object()
+
+
+class WriteBatcher:
+    """One writer thread committing queued write units in groups"""
+
+    def __init__(self, app, window_ms=2, max_units=64):
+        self.app = app
+        self.window = window_ms / 1000
+        self.max_units = max_units
+        self.batches = 0  # commits made, for benchmarks and tests
+        self.units = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, unit):
+        """Queue unit(session) for the next group commit and return its Future"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-batcher', daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((unit, future))
+        return future
+
+    def close(self):
+        """Commit whatever is queued and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _run(self):
+        with self.app.app_context():
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_units:
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit(batch)
+
+    def _commit(self, batch):
+        batch = [(unit, future) for unit, future in batch if future.set_running_or_notify_cancel()]
+        try:
+            try:
+                # Optimistic path: one flush and one commit for the whole batch
+                results = [unit(db.session) for unit, _ in batch]
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._commit_isolated(batch)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+        finally:
+            db.session.remove()
+            self.batches += 1
+            self.units += len(batch)
+
+    def _commit_isolated(self, batch):
+        """Re-run a failed batch with one SAVEPOINT per unit, so only the bad units fail"""
+        done = []
+        for unit, future in batch:
+            try:
+                with db.session.begin_nested():
+                    result = unit(db.session)
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                done.append((future, result))
+
+        try:
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            for future, _ in done:
+                future.set_exception(exc)
+        else:
+            for future, result in done:
+                future.set_result(result)
+
+
+def run_write(unit):
+    """Run unit(session) and commit it, through the app's write batcher when enabled"""
+    batcher = current_app.extensions.get('write_batcher')
+    if batcher is None:
+        result = unit(db.session)
+        db.session.commit()
+        return result
+
+    # End this session's transaction so it holds no SQLite locks while the writer commits
+    db.session.commit()
+    return batcher.submit(unit).result()
+
+
+def init_app(app):
+    """Start batching writes when WRITE_BATCHING is on and the database is SQLite"""
+    if app.config.get('WRITE_BATCHING') and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.extensions['write_batcher'] = WriteBatcher(
+            app,
+            window_ms=app.config.get('WRITE_BATCH_WINDOW_MS', 2),
+            max_units=app.config.get('WRITE_BATCH_MAX_UNITS', 64)
+        )
@@ -0,0 +1,480 @@
+"""
+Columnar per-user transaction snapshots for vectorized analytics (optional, needs NumPy).
+
+A user's transactions are loaded once into parallel NumPy arrays:
+
+    transaction_ids    int64   primary keys, used to skip rows already loaded
+    days               int32   transaction date as days since 1970-01-01
+    amount_pence       int64   amount in pence
+    category_codes     int32   category_id, 0 when uncategorized
+    is_income          bool    transaction type flag
+    participants       int16   assigned members + the user when participating
+    user_participates  bool
+
+Snapshots are cached per process and kept current through the event hub:
+committed inserts are appended on next use, anything that rewrites existing
+rows drops the snapshot so it reloads. Results mirror SimpleAnalyticsService,
+which stays the reference implementation. Date bounds are whole days.
+
+Tags are indexed over the same row positions by TagBitmaps, one packed bitset
+per tag, built on first use and patched as tag links change.
+"""
+import threading
+from datetime import date, datetime
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from . import db
+from .events import event_hub
+from .models import Transaction, MembersTransaction, Category, Tag, TransactionTag
+
+EPOCH = date(1970, 1, 1)
+
+
+def is_available():
+    return np is not None
+
+
+def to_day(value):
+    """Days since 1970-01-01 for a date or datetime"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def to_month_index(year, month):
+    """Months since 1970-01, the unit of TransactionColumns.month_indexes()"""
+    return (year - 1970) * 12 + month - 1
+
+
+class TransactionColumns:
+    """One user's transactions as parallel arrays"""
+
+    def __init__(self, transaction_ids, days, amount_pence, category_codes,
+                 is_income, participants, user_participates):
+        self.transaction_ids = transaction_ids
+        self.days = days
+        self.amount_pence = amount_pence
+        self.category_codes = category_codes
+        self.is_income = is_income
+        self.participants = participants
+        self.user_participates = user_participates
+
+    def __len__(self):
+        return len(self.transaction_ids)
+
+    @classmethod
+    def load(cls, user_id, transaction_ids=None):
+        """Read a user's transactions (or just transaction_ids) with one grouped query"""
+        member_counts = db.session.query(
+            MembersTransaction.transaction_id,
+            db.func.count().label('member_count')
+        ).group_by(MembersTransaction.transaction_id).subquery()
+
+        query = db.session.query(
+            Transaction.transaction_id,
+            Transaction.transaction_date,
+            Transaction.amount,
+            Transaction.category_id,
+            Transaction.transaction_type,
+            Transaction.user_participates,
+            db.func.coalesce(member_counts.c.member_count, 0)
+        ).outerjoin(
+            member_counts, member_counts.c.transaction_id == Transaction.transaction_id
+        ).filter(Transaction.user_id == user_id)
+        if transaction_ids is not None:
+            query = query.filter(Transaction.transaction_id.in_(transaction_ids))
+
+        rows = query.order_by(Transaction.transaction_id).all()
+        return cls(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([to_day(row[1]) for row in rows], dtype=np.int32),
+            np.array([int(row[2] * 100) for row in rows], dtype=np.int64),
+            np.array([row[3] or 0 for row in rows], dtype=np.int32),
+            np.array([row[4] == 'income' for row in rows], dtype=bool),
+            np.array([row[6] + (1 if row[5] else 0) for row in rows], dtype=np.int16),
+            np.array([bool(row[5]) for row in rows], dtype=bool)
+        )
+
+    def append(self, other):
+        """New snapshot with other's rows added (rows already present are skipped)"""
+        keep = ~np.isin(other.transaction_ids, self.transaction_ids)
+        return TransactionColumns(*(
+            np.concatenate([getattr(self, name), getattr(other, name)[keep]])
+            for name in ('transaction_ids', 'days', 'amount_pence', 'category_codes',
+                         'is_income', 'participants', 'user_participates')
+        ))
+
+    @property
+    def member_counts(self):
+        return self.participants - self.user_participates
+
+    def month_indexes(self):
+        return self.days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+    def day_range(self, start_date=None, end_date=None):
+        """Mask for start_date <= date < end_date"""
+        mask = np.ones(len(self), dtype=bool)
+        if start_date is not None:
+            mask &= self.days >= to_day(start_date)
+        if end_date is not None:
+            mask &= self.days < to_day(end_date)
+        return mask
+
+    def user_shares(self):
+        """Per-row user share in pounds (see Transaction.get_user_share)"""
+        amounts = self.amount_pence / 100
+        split = np.divide(amounts, self.participants, out=np.zeros(len(self)),
+                          where=self.participants > 0)
+        return np.where(self.member_counts == 0, amounts,
+                        np.where(self.user_participates, split, 0.0))
+
+    def members_shares(self):
+        """Per-row combined member share in pounds (see Transaction.get_members_total_share)"""
+        amounts = self.amount_pence / 100
+        split = np.divide(amounts, self.participants, out=np.zeros(len(self)),
+                          where=self.participants > 0)
+        return split * self.member_counts
+
+
+def _positions(columns, transaction_ids):
+    """Row positions of transaction_ids in columns, -1 for ids the snapshot does not hold"""
+    transaction_ids = np.asarray(transaction_ids, dtype=np.int64)
+    if not len(columns):
+        return np.full(len(transaction_ids), -1, dtype=np.int64)
+    order = np.argsort(columns.transaction_ids, kind='stable')
+    ordered = columns.transaction_ids[order]
+    found = np.minimum(np.searchsorted(ordered, transaction_ids), len(ordered) - 1)
+    return np.where(ordered[found] == transaction_ids, order[found], -1)
+
+
+def _bits(positions):
+    """Byte indexes and bit masks of row positions in a packed bitset (np.packbits bit order)"""
+    return positions >> 3, (0x80 >> (positions & 7)).astype(np.uint8)
+
+
+class TagBitmaps:
+    """One user's tags as packed bitsets over the row positions of their TransactionColumns
+
+    Bit i of a tag's bitset is set when row i of the snapshot carries the tag.
+    Bitsets are np.packbits byte arrays, a bit per row, so AND/OR/NOT filters
+    run byte-wise over an eighth of a bool mask and only the final selection is
+    unpacked to index the amount arrays. updated() copies what it changes, so
+    a TagBitmaps that is being read never changes underneath its reader.
+    """
+
+    def __init__(self, size, bitsets):
+        self.size = size          # rows covered, a prefix of the snapshot
+        self.bitsets = bitsets    # tag_id -> uint8 array of (size + 7) // 8 bytes
+
+    @property
+    def nbytes(self):
+        return (self.size + 7) // 8
+
+    @staticmethod
+    def load_links(user_id, transaction_ids=None):
+        """(transaction ids, tag ids) of a user's tag links (or just transaction_ids'), one query"""
+        query = db.session.query(TransactionTag.transaction_id, TransactionTag.tag_id).join(
+            Tag, Tag.tag_id == TransactionTag.tag_id
+        ).filter(Tag.user_id == user_id)
+        if transaction_ids is not None:
+            query = query.filter(TransactionTag.transaction_id.in_(transaction_ids))
+        rows = query.all()
+        return (np.array([row[0] for row in rows], dtype=np.int64),
+                np.array([row[1] for row in rows], dtype=np.int64))
+
+    def updated(self, columns, links, cleared=None):
+        """New bitmaps covering all of columns: cleared rows lose every tag, then links are set"""
+        size = len(columns)
+        nbytes = (size + 7) // 8
+        link_ids, tag_ids = links
+        positions = _positions(columns, link_ids)
+        present = positions >= 0
+        positions, tag_ids = positions[present], tag_ids[present]
+        clearing = cleared is not None and len(cleared) > 0
+
+        bitsets = {}
+        touched = set(tag_ids.tolist())
+        for tag_id, bits in self.bitsets.items():
+            if len(bits) != nbytes or tag_id in touched or clearing:
+                grown = np.zeros(nbytes, dtype=np.uint8)
+                grown[:len(bits)] = bits
+                bits = grown
+            bitsets[tag_id] = bits
+        if clearing:
+            cleared = np.asarray(cleared)
+            byte, bit = _bits(cleared[cleared >= 0])
+            for bits in bitsets.values():
+                np.bitwise_and.at(bits, byte, ~bit)
+
+        order = np.argsort(tag_ids, kind='stable')
+        tag_ids, positions = tag_ids[order], positions[order]
+        unique_tags, starts = np.unique(tag_ids, return_index=True)
+        for tag_id, tag_positions in zip(unique_tags.tolist(), np.split(positions, starts[1:])):
+            bits = bitsets.setdefault(tag_id, np.zeros(nbytes, dtype=np.uint8))
+            byte, bit = _bits(tag_positions)
+            np.bitwise_or.at(bits, byte, bit)
+        if clearing:
+            bitsets = {tag_id: bits for tag_id, bits in bitsets.items() if bits.any()}
+        return TagBitmaps(size, bitsets)
+
+    def unpack(self, bits):
+        """Bool row mask of a packed bitset"""
+        return np.unpackbits(bits, count=self.size).view(bool)
+
+    def select(self, all_tags=(), any_tags=(), none_tags=()):
+        """Rows with every all_tags tag, at least one any_tags tag (if any are given) and no none_tags tag"""
+        empty = np.zeros(self.nbytes, dtype=np.uint8)
+        selected = np.full(self.nbytes, 0xFF, dtype=np.uint8)
+        for tag_id in all_tags:
+            selected &= self.bitsets.get(tag_id, empty)
+        if any_tags:
+            either = empty.copy()
+            for tag_id in any_tags:
+                either |= self.bitsets.get(tag_id, empty)
+            selected &= either
+        for tag_id in none_tags:
+            selected &= ~self.bitsets.get(tag_id, empty)
+        return self.unpack(selected)
+
+
+def _sum_pounds(pence):
+    return int(pence.sum()) / 100
+
+
+class ColumnarAnalytics:
+    """Vectorized analytics over cached per-user snapshots"""
+
+    _lock = threading.Lock()
+    _snapshots = {}        # user_id -> TransactionColumns
+    _pending_appends = {}  # user_id -> transaction ids committed since the snapshot
+    _generations = {}      # user_id -> bumped whenever the snapshot is dropped
+    _tag_bitmaps = {}      # user_id -> (snapshot generation, TagBitmaps)
+    _pending_tags = {}     # user_id -> transaction ids whose tags changed since, None: all of them
+
+    @staticmethod
+    def handle_event(user_id, message):
+        """Event hub listener: queue appended rows and retagged ones, drop snapshots whose rows changed"""
+        data = message['data']
+        kinds = data.get('kinds', ())
+        if 'transactions' not in kinds and 'tags' not in kinds:
+            return
+        with ColumnarAnalytics._lock:
+            if user_id not in ColumnarAnalytics._snapshots:
+                return
+            if 'transactions' in kinds:
+                if data.get('rewritten') or 'appended' not in data:
+                    ColumnarAnalytics._drop(user_id)
+                    return
+                ColumnarAnalytics._pending_appends.setdefault(user_id, []).extend(data['appended'])
+            if 'tags' in kinds:
+                pending = ColumnarAnalytics._pending_tags
+                if 'tagged_ids' not in data:  # bulk tag change: reload every row's tags
+                    pending[user_id] = None
+                elif pending.get(user_id, ()) is not None:
+                    pending.setdefault(user_id, set()).update(data['tagged_ids'])
+
+    @staticmethod
+    def _drop(user_id):
+        # Caller holds the lock
+        ColumnarAnalytics._snapshots.pop(user_id, None)
+        ColumnarAnalytics._pending_appends.pop(user_id, None)
+        ColumnarAnalytics._tag_bitmaps.pop(user_id, None)
+        ColumnarAnalytics._pending_tags.pop(user_id, None)
+        ColumnarAnalytics._generations[user_id] = ColumnarAnalytics._generations.get(user_id, 0) + 1
+
+    @staticmethod
+    def invalidate(user_id=None):
+        """Drop one user's snapshot, or every snapshot (e.g. after out-of-band writes)"""
+        with ColumnarAnalytics._lock:
+            for cached_user_id in ([user_id] if user_id is not None else list(ColumnarAnalytics._snapshots)):
+                ColumnarAnalytics._drop(cached_user_id)
+
+    @staticmethod
+    def get_columns(user_id):
+        """Cached snapshot for user_id, loading it or appending committed inserts as needed"""
+        with ColumnarAnalytics._lock:
+            base = ColumnarAnalytics._snapshots.get(user_id)
+            appended = ColumnarAnalytics._pending_appends.pop(user_id, None)
+            generation = ColumnarAnalytics._generations.get(user_id, 0)
+
+        if base is None:
+            columns = TransactionColumns.load(user_id)
+        elif appended:
+            columns = base.append(TransactionColumns.load(user_id, appended))
+        else:
+            return base
+
+        with ColumnarAnalytics._lock:
+            # A rewrite committed while loading makes this copy stale; serve it once, don't cache it
+            if ColumnarAnalytics._generations.get(user_id, 0) == generation:
+                if ColumnarAnalytics._snapshots.get(user_id) is base:
+                    ColumnarAnalytics._snapshots[user_id] = columns
+                elif appended:
+                    # Another reader replaced the snapshot meanwhile and may lack these rows;
+                    # queue them again (append skips any it already holds)
+                    ColumnarAnalytics._pending_appends.setdefault(user_id, []).extend(appended)
+        return columns
+
+    @staticmethod
+    def get_tag_index(user_id):
+        """(snapshot, TagBitmaps over it), building the bitmaps or patching in tag changes as needed"""
+        with ColumnarAnalytics._lock:
+            generation = ColumnarAnalytics._generations.get(user_id, 0)
+        columns = ColumnarAnalytics.get_columns(user_id)
+        with ColumnarAnalytics._lock:
+            cached = ColumnarAnalytics._tag_bitmaps.get(user_id)
+            retagged = ColumnarAnalytics._pending_tags.pop(user_id, ())
+
+        if cached is None or cached[0] != generation or cached[1].size > len(columns) or retagged is None:
+            bitmaps = TagBitmaps(0, {}).updated(columns, TagBitmaps.load_links(user_id))
+        else:
+            bitmaps = cached[1]
+            if bitmaps.size < len(columns):
+                appended = columns.transaction_ids[bitmaps.size:].tolist()
+                bitmaps = bitmaps.updated(columns, TagBitmaps.load_links(user_id, appended))
+            if retagged:
+                retagged = sorted(retagged)
+                bitmaps = bitmaps.updated(columns, TagBitmaps.load_links(user_id, retagged),
+                                          cleared=_positions(columns, retagged))
+
+        with ColumnarAnalytics._lock:
+            # As in get_columns: bitmaps of a snapshot dropped meanwhile are served once, not cached
+            if ColumnarAnalytics._generations.get(user_id, 0) == generation:
+                ColumnarAnalytics._tag_bitmaps[user_id] = (generation, bitmaps)
+        return columns, bitmaps
+
+    @staticmethod
+    def get_tag_selection(user_id, all_tags=(), any_tags=(), none_tags=(), start_date=None, end_date=None,
+                          limit=50):
+        """Count, income and expenses of the rows a tag filter selects, plus the latest entered ids"""
+        columns, bitmaps = ColumnarAnalytics.get_tag_index(user_id)
+        mask = bitmaps.select(all_tags, any_tags, none_tags) & columns.day_range(start_date, end_date)
+        transaction_ids = columns.transaction_ids[mask]
+        return {
+            'count': int(mask.sum()),
+            'income': _sum_pounds(columns.amount_pence[mask & columns.is_income]),
+            'expenses': _sum_pounds(columns.amount_pence[mask & ~columns.is_income]),
+            'transaction_ids': np.sort(transaction_ids)[::-1][:limit].tolist()
+        }
+
+    @staticmethod
+    def get_tag_totals(user_id, start_date=None, end_date=None):
+        """tag_id -> count, income and expenses of its rows, for tags with rows in the range"""
+        columns, bitmaps = ColumnarAnalytics.get_tag_index(user_id)
+        in_range = columns.day_range(start_date, end_date)
+        totals = {}
+        for tag_id, bits in bitmaps.bitsets.items():
+            mask = bitmaps.unpack(bits) & in_range
+            if mask.any():
+                totals[tag_id] = {
+                    'count': int(mask.sum()),
+                    'income': _sum_pounds(columns.amount_pence[mask & columns.is_income]),
+                    'expenses': _sum_pounds(columns.amount_pence[mask & ~columns.is_income])
+                }
+        return totals
+
+    @staticmethod
+    def get_totals(user_id):
+        """All-time income and expenses"""
+        columns = ColumnarAnalytics.get_columns(user_id)
+        return {
+            'income': _sum_pounds(columns.amount_pence[columns.is_income]),
+            'expenses': _sum_pounds(columns.amount_pence[~columns.is_income])
+        }
+
+    @staticmethod
+    def get_recent_count(user_id, since):
+        """Transactions dated on or after since"""
+        columns = ColumnarAnalytics.get_columns(user_id)
+        return int(columns.day_range(start_date=since).sum())
+
+    @staticmethod
+    def get_monthly_series(user_id, start_date, end_date):
+        """Same result as SimpleAnalyticsService.get_monthly_series"""
+        columns = ColumnarAnalytics.get_columns(user_id)
+        mask = columns.day_range(start_date, end_date)
+        if not mask.any():
+            return {}
+
+        months = columns.month_indexes()[mask]
+        pence = columns.amount_pence[mask]
+        is_income = columns.is_income[mask]
+        first = int(months.min())
+        offsets = months - first
+        size = int(offsets.max()) + 1
+        income = np.bincount(offsets[is_income], weights=pence[is_income], minlength=size)
+        expenses = np.bincount(offsets[~is_income], weights=pence[~is_income], minlength=size)
+        present = np.bincount(offsets, minlength=size) > 0
+
+        series = {}
+        for offset in np.flatnonzero(present):
+            year, month = divmod(first + int(offset), 12)
+            series[(1970 + year, month + 1)] = {
+                'income': int(income[offset]) / 100,
+                'expenses': int(expenses[offset]) / 100
+            }
+        return series
+
+    @staticmethod
+    def get_monthly_totals(user_id, year, month):
+        """Same result as SimpleAnalyticsService.get_monthly_totals"""
+        columns = ColumnarAnalytics.get_columns(user_id)
+        mask = columns.month_indexes() == to_month_index(year, month)
+        income = _sum_pounds(columns.amount_pence[mask & columns.is_income])
+        expenses = _sum_pounds(columns.amount_pence[mask & ~columns.is_income])
+        return {'income': income, 'expenses': expenses, 'balance': income - expenses}
+
+    @staticmethod
+    def get_spending_by_category(user_id):
+        """Same result as SimpleAnalyticsService.get_spending_by_category"""
+        columns = ColumnarAnalytics.get_columns(user_id)
+        expense = ~columns.is_income
+        if not expense.any():
+            return {}
+
+        codes = columns.category_codes[expense]
+        pence = np.bincount(codes, weights=columns.amount_pence[expense])
+        names = dict(db.session.query(Category.category_id, Category.category_name).filter(
+            Category.category_id.in_([int(code) for code in np.unique(codes) if code])
+        ).all())
+
+        category_totals = {}
+        for code in np.unique(codes):
+            name = names.get(int(code), 'Other')
+            category_totals[name] = category_totals.get(name, 0) + int(pence[code]) / 100
+        return category_totals
+
+    @staticmethod
+    def get_expense_shares(user_id, start_date=None, end_date=None):
+        """User and combined member shares of expenses (sums of the Transaction share helpers)"""
+        columns = ColumnarAnalytics.get_columns(user_id)
+        mask = ~columns.is_income & columns.day_range(start_date, end_date)
+        return {
+            'user_share': float(columns.user_shares()[mask].sum()),
+            'members_share': float(columns.members_shares()[mask].sum())
+        }
+
+    @staticmethod
+    def get_budget_spent(user_id, category_id, start_date, end_date=None, personal_only=False):
+        """Expenses in a category (None: all categories) for a budget period
+
+        personal_only keeps expenses the user pays alone, as the dashboard's personal
+        budget alerts do.
+        """
+        columns = ColumnarAnalytics.get_columns(user_id)
+        mask = ~columns.is_income & columns.day_range(start_date, end_date)
+        if category_id is not None:
+            mask &= columns.category_codes == category_id
+        if personal_only:
+            mask &= columns.user_participates & (columns.member_counts == 0)
+        return _sum_pounds(columns.amount_pence[mask])
+
+
+def init_app(app):
+    """Keep cached snapshots in step with committed writes"""
+    if is_available():
+        event_hub.add_listener(ColumnarAnalytics.handle_event)
@@ -0,0 +1,106 @@
+"""
+Flask CLI commands for scheduled batch jobs.
+
+Run from cron, e.g. on the 1st of every month / every night:
+    flask --app run budgets snapshot
+    flask --app run idempotency purge
+    flask --app run recurring run
+
+Large bank statements are best imported from disk, where they are memory-mapped:
+    flask --app run statements import --email user@example.com statement.csv
+"""
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+import click
+from flask.cli import AppGroup
+
+from app.importer import FORMATS, detect_format, iter_file_lines, parse_statement
+from app.models import User
+from app import db
+from app.services import (AnalyticsBatchService, BudgetSnapshotService, IdempotencyService, RecurringService,
+                          StatementImportService)
+
+budgets_cli = AppGroup('budgets', help='Budget batch jobs.')
+idempotency_cli = AppGroup('idempotency', help='Idempotency key maintenance.')
+statements_cli = AppGroup('statements', help='Bank statement import.')
+recurring_cli = AppGroup('recurring', help='Recurring transactions.')
+
+
+@budgets_cli.command('snapshot')
+@click.option('--month', metavar='YYYY-MM', help='Month to capture (default: the month that just closed).')
+def snapshot_budgets(month):
+    """Capture every user's active budgets for a closed month"""
+    if month:
+        try:
+            closed = datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            raise click.BadParameter('expected YYYY-MM', param_hint='--month')
+        year, month_number = closed.year, closed.month
+    else:
+        today = datetime.now()
+        year, month_number = AnalyticsBatchService.shift_month(today.year, today.month, -1)
+
+    written = BudgetSnapshotService.capture_month(year, month_number)
+    click.echo(f'Captured {written} budget snapshots for {year:04d}-{month_number:02d}.')
+
+
+@idempotency_cli.command('purge')
+def purge_idempotency_keys():
+    """Delete expired idempotency keys"""
+    click.echo(f'Purged {IdempotencyService.purge_expired()} expired idempotency keys.')
+
+
+@statements_cli.command('import')
+@click.option('--email', required=True, help='Owner of the imported transactions.')
+@click.option('--format', 'statement_format', type=click.Choice(FORMATS), help='Default: from the file extension.')
+@click.option('--keep-duplicates', is_flag=True, help='Also import rows matching stored transactions.')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_statement(email, statement_format, keep_duplicates, path):
+    """Import a CSV, OFX or QIF bank statement file"""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.BadParameter(f'no user with email {email}', param_hint='--email')
+    try:
+        statement_format = statement_format or detect_format(path)
+        report, _ = StatementImportService.run(
+            user.user_id, lambda: parse_statement(iter_file_lines(path), statement_format),
+            skip_duplicates=not keep_duplicates
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"Imported {report['imported']} transactions ({report['categorized']} categorized), "
+               f"skipped {report['duplicates']} duplicates, rejected {report['rejected']}.")
+    for message in report['errors']:
+        click.echo(f'  {message}')
+
+
+@recurring_cli.command('run')
+@click.option('--date', 'until', metavar='YYYY-MM-DD', help='Enter occurrences due up to this day (default: today).')
+def run_recurring(until):
+    """Enter every user's due recurring transactions, catching up any missed runs"""
+    try:
+        today = datetime.strptime(until, '%Y-%m-%d').date() if until else None
+    except ValueError:
+        raise click.BadParameter('expected YYYY-MM-DD', param_hint='--date')
+    try:
+        report = RecurringService.materialize(today)
+    except IntegrityError:
+        db.session.rollback()
+        raise click.ClickException('Another run entered some of these occurrences first; nothing was written. '
+                                   'Run again to enter the rest.')
+
+    click.echo(f"Entered {report['transactions']} transactions from {report['rules']} rules "
+               f"for {report['users']} users.")
+    if report['behind']:
+        click.echo(f"{report['behind']} rules are still behind (more than {RecurringService.MAX_CATCH_UP} "
+                   f"occurrences due); run again to continue.")
+
+
+def register_commands(app):
+    app.cli.add_command(budgets_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(statements_cli)
+    app.cli.add_command(recurring_cli)
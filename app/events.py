@@ -0,0 +1,197 @@
+"""
+In-process publish/subscribe hub for per-user data change notifications.
+
+Committed ORM writes to transactions, member links, members, budgets and tags
+are published automatically by the session hooks registered in init_app().
+Bulk writes that bypass the ORM should call event_hub.publish() themselves.
+The hub lives in one process; with several worker processes each one only
+sees the writes it made itself.
+"""
+import json
+import queue
+import threading
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .models import Transaction, MembersTransaction, Member, Budget, Tag, TransactionTag
+
+
+class EventHub:
+    """Fan-out of change events to the queues of a user's live subscribers"""
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of queues
+        self._versions = {}     # user_id -> number of events published
+        self._listeners = []    # callbacks run for every user's events
+
+    def add_listener(self, callback):
+        """Call callback(user_id, message) for every published event (e.g. to maintain caches)"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def subscribe(self, user_id):
+        """Register a new subscriber queue for user_id"""
+        subscription = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event_type, data=None):
+        """Send an event to every subscriber of user_id and return the new version"""
+        with self._lock:
+            version = self._versions.get(user_id, 0) + 1
+            self._versions[user_id] = version
+            subscribers = list(self._subscribers.get(user_id, ()))
+            listeners = list(self._listeners)
+
+        message = {'event': event_type, 'data': data or {}, 'version': version}
+        for callback in listeners:
+            callback(user_id, message)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                # Slow reader: drop its oldest event, the newest one carries the latest version
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+                subscription.put_nowait(message)
+        return version
+
+    def version(self, user_id):
+        """Number of events published for user_id, usable as a cache key"""
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def subscriber_count(self, user_id):
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+
+event_hub = EventHub()
+
+
+def format_sse(data, event_type=None, event_id=None):
+    """Encode one Server-Sent Events message"""
+    message = ''
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    if event_type:
+        message += f'event: {event_type}\n'
+    return message + f'data: {json.dumps(data)}\n\n'
+
+
+def publish_bulk_change(user_id, kinds):
+    """Announce committed bulk/Core writes, which the session hooks below do not see"""
+    return event_hub.publish(user_id, 'data_changed', {
+        'kinds': sorted(kinds),
+        'appended': [],
+        'rewritten': True
+    })
+
+
+# Session hooks: collect the users touched by each flush, publish once the commit succeeds
+
+def _owner_id(session, obj):
+    """User id owning a flushed object, or None when it cannot be resolved"""
+    if isinstance(obj, (Transaction, Member, Tag)):
+        return obj.user_id
+    if isinstance(obj, Budget):
+        if obj.user_id is not None:
+            return obj.user_id
+        return session.connection().execute(
+            select(Member.user_id).where(Member.member_id == obj.member_id)
+        ).scalar()
+    if isinstance(obj, (MembersTransaction, TransactionTag)):
+        transaction = obj.__dict__.get('transaction')
+        if transaction is not None:
+            return transaction.user_id
+        return session.connection().execute(
+            select(Transaction.user_id).where(Transaction.transaction_id == obj.transaction_id)
+        ).scalar()
+    return None
+
+
+_CHANGE_KINDS = {
+    Transaction: 'transactions',
+    MembersTransaction: 'transactions',
+    Member: 'members',
+    Budget: 'budgets',
+    Tag: 'tags',
+    TransactionTag: 'tags'
+}
+
+
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('pending_events', {})
+    for state, objects in (('new', session.new), ('dirty', session.dirty), ('deleted', session.deleted)):
+        # Transactions first, so links flushed together with a new transaction count as appended
+        for obj in sorted(objects, key=lambda obj: not isinstance(obj, Transaction)):
+            kind = _CHANGE_KINDS.get(type(obj))
+            if kind is None:
+                continue
+            # Attribute sets that left every value as it was do not count as changes
+            if state == 'dirty' and not session.is_modified(obj, include_collections=False):
+                continue
+            user_id = _owner_id(session, obj)
+            if user_id is None:
+                continue
+
+            changes = pending.setdefault(user_id, {'kinds': set(), 'appended': [], 'rewritten': False,
+                                                   'rewritten_ids': set(), 'tagged_ids': set()})
+            changes['kinds'].add(kind)
+            # 'appended' lists brand-new transactions (with their member links); anything
+            # that alters existing transactions or their participants marks 'rewritten',
+            # and 'rewritten_ids' names those transactions. 'tagged_ids' names existing
+            # transactions whose tags changed, which leaves their other data as it was.
+            if state == 'new' and isinstance(obj, Transaction):
+                changes['appended'].append(obj.transaction_id)
+            elif state == 'new' and isinstance(obj, MembersTransaction):
+                if obj.transaction_id not in changes['appended']:
+                    changes['rewritten'] = True
+                    changes['rewritten_ids'].add(obj.transaction_id)
+            elif isinstance(obj, TransactionTag):
+                if not (state == 'new' and obj.transaction_id in changes['appended']):
+                    changes['tagged_ids'].add(obj.transaction_id)
+            elif isinstance(obj, (Transaction, MembersTransaction)):
+                changes['rewritten'] = True
+                changes['rewritten_ids'].add(obj.transaction_id)
+            elif state == 'deleted' and isinstance(obj, Member):
+                changes['rewritten'] = True
+
+
+def _publish_changes(session):
+    pending = session.info.pop('pending_events', None)
+    for user_id, changes in (pending or {}).items():
+        event_hub.publish(user_id, 'data_changed', {
+            'kinds': sorted(changes['kinds']),
+            'appended': changes['appended'],
+            'rewritten': changes['rewritten'],
+            'rewritten_ids': sorted(changes['rewritten_ids']),
+            'tagged_ids': sorted(changes['tagged_ids'])
+        })
+
+
+def _discard_changes(session):
+    session.info.pop('pending_events', None)
+
+
+def init_app(app):
+    """Register the session hooks once per process"""
+    if not event.contains(Session, 'after_flush', _collect_changes):
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'after_commit', _publish_changes)
+        event.listen(Session, 'after_rollback', _discard_changes)
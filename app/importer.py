@@ -0,0 +1,282 @@
+"""
+Streaming bank-statement parsing and rule-based categorization.
+
+Parsers turn CSV, OFX and QIF statements into StatementRow tuples one record
+at a time, so memory stays flat whatever the file size. iter_file_lines()
+memory-maps files on disk; uploads are read straight from their stream.
+
+CategoryRules compiles the keyword rules into one prefix-trie pattern (and any
+regex rules into one alternation), so a description is scanned once or twice
+whatever the number of rules. Persisting rows is StatementImportService's job.
+"""
+import csv
+import io
+import mmap
+import re
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# amount is signed as on the statement: negative for money out
+StatementRow = namedtuple('StatementRow', 'line date amount description')
+
+FORMATS = ('csv', 'ofx', 'qif')
+
+# Day-first, as on UK statements: YYYY-MM-DD, DD/MM/YYYY (or - . separators, 2-digit
+# years), and OFX's YYYYMMDD[HHMMSS...]. Parsed with one pattern: strptime per row
+# dominated parse time.
+_DATE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})[/.'-](\d{1,2})[/.'-](\d{4}|\d{2})|(\d{4})(\d\d)(\d\d)")
+
+DEFAULT_RULES = {
+    'Transport': ['uber', 'tfl', 'trainline', 'national rail', 'shell', 'esso', 'bp ', 'parking', 'ryanair', 'easyjet'],
+    'Utilities': ['british gas', 'octopus energy', 'edf', 'thames water', 'council tax', 'vodafone', 'ee ',
+                  'virgin media', 'bt group', 'water'],
+    'Entertainment': ['netflix', 'spotify', 'disney', 'cinema', 'odeon', 'steam', 'playstation', 'ticketmaster'],
+    'Food': ['tesco', 'sainsbury', 'asda', 'aldi', 'lidl', 'waitrose', 'morrisons', 'co-op', 'deliveroo',
+             'just eat', 'uber eats', 'restaurant', 'cafe', 'pret', 'greggs'],
+    'Healthcare': ['pharmacy', 'boots', 'superdrug', 'dentist', 'nhs', 'optician', 'bupa'],
+    'Shopping': ['amazon', 'argos', 'ebay', 'ikea', 'john lewis', 'primark', 'next ', 'currys'],
+}
+
+
+class StatementError(ValueError):
+    """A statement row that cannot be imported"""
+
+
+def parse_date(value):
+    found = _DATE.match(value.strip())
+    if found:
+        if found.group(1):
+            year, month, day = found.group(1, 2, 3)
+        elif found.group(4):
+            day, month, year = found.group(4, 5, 6)
+            if len(year) == 2:
+                year = ('20' if int(year) < 69 else '19') + year  # strptime's %y pivot
+        else:
+            year, month, day = found.group(7, 8, 9)
+        try:
+            return datetime(int(year), int(month), int(day))
+        except ValueError:
+            pass
+    raise StatementError(f'Unrecognised date {value.strip()!r}')
+
+
+def parse_amount(value):
+    cleaned = value.strip().replace(',', '').replace('£', '')
+    if cleaned.startswith('(') and cleaned.endswith(')'):
+        cleaned = '-' + cleaned[1:-1]
+    try:
+        return Decimal(cleaned)
+    except InvalidOperation:
+        raise StatementError(f'Unrecognised amount {value!r}')
+
+
+def iter_file_lines(path, encoding='utf-8'):
+    """Decoded lines of a file on disk, read through a memory map"""
+    with open(path, 'rb') as handle:
+        if not handle.seek(0, 2):
+            return
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for raw in iter(mapped.readline, b''):
+                yield raw.decode(encoding, errors='replace')
+
+
+def iter_stream_lines(stream, encoding='utf-8'):
+    """Decoded lines of a binary stream such as an uploaded file, from its start"""
+    stream.seek(0)
+    text = io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+    try:
+        yield from text
+    finally:
+        text.detach()  # leave the stream open for a re-read
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported statement format {extension!r}; expected {', '.join(FORMATS)}.")
+    return extension
+
+
+def parse_statement(lines, statement_format):
+    """StatementRow or StatementError per record, in file order"""
+    parsers = {'csv': parse_csv, 'ofx': parse_ofx, 'qif': parse_qif}
+    return parsers[statement_format](lines)
+
+
+def parse_csv(lines):
+    """CSV with a header row: Date, then Amount or Debit/Credit (Paid out/Paid in), and Description
+
+    Header names are matched case-insensitively; Description falls back to Payee,
+    Name, Memo or Reference.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {name.strip().lower(): index for index, name in enumerate(header)}
+
+    def column(*names):
+        return next((columns[name] for name in names if name in columns), None)
+
+    date_column = column('date', 'transaction date', 'posted date')
+    amount_column = column('amount', 'value')
+    debit_column = column('debit', 'paid out', 'money out')
+    credit_column = column('credit', 'paid in', 'money in')
+    description_column = column('description', 'payee', 'name', 'memo', 'reference', 'details')
+    if date_column is None or (amount_column is None and debit_column is None and credit_column is None):
+        raise ValueError('CSV header needs a Date column and an Amount (or Debit/Credit) column.')
+
+    for line, record in enumerate(reader, start=2):
+        if not any(field.strip() for field in record):
+            continue
+        try:
+            if amount_column is not None:
+                amount = parse_amount(record[amount_column])
+            else:
+                debit = record[debit_column].strip() if debit_column is not None else ''
+                credit = record[credit_column].strip() if credit_column is not None else ''
+                amount = -parse_amount(debit) if debit else parse_amount(credit or '0')
+            description = record[description_column].strip() if description_column is not None else ''
+            yield StatementRow(line, parse_date(record[date_column]), amount, description)
+        except IndexError:
+            yield StatementError(f'Line {line}: missing columns')
+        except StatementError as e:
+            yield StatementError(f'Line {line}: {e}')
+
+
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+
+def parse_ofx(lines):
+    """<STMTTRN> records of an OFX file (SGML or XML flavour): DTPOSTED, TRNAMT, NAME/MEMO"""
+    record = None
+    record_line = 0
+    for line, text in enumerate(lines, start=1):
+        for closing, tag, value in _OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not closing:
+                    record, record_line = {}, line
+                elif record is not None:
+                    yield _ofx_row(record_line, record)
+                    record = None
+            elif record is not None and not closing and value.strip():
+                record.setdefault(tag, value.strip())
+
+
+def _ofx_row(line, record):
+    try:
+        description = record.get('NAME') or record.get('MEMO') or record.get('PAYEE') or ''
+        return StatementRow(line, parse_date(record['DTPOSTED']), parse_amount(record['TRNAMT']), description)
+    except KeyError as e:
+        return StatementError(f'Line {line}: transaction without {e.args[0]}')
+    except StatementError as e:
+        return StatementError(f'Line {line}: {e}')
+
+
+def parse_qif(lines):
+    """QIF records: D date, T (or U) amount, P payee, M memo, ended by ^"""
+    record = {}
+    record_line = None
+    for line, text in enumerate(lines, start=1):
+        text = text.rstrip('\r\n')
+        if not text or text.startswith('!'):
+            continue
+        code, value = text[0], text[1:].strip()
+        if code == '^':
+            if record:
+                yield _qif_row(record_line, record)
+            record, record_line = {}, None
+            continue
+        if record_line is None:
+            record_line = line
+        record.setdefault(code, value)
+    if record:
+        yield _qif_row(record_line, record)
+
+
+def _qif_row(line, record):
+    try:
+        amount = record.get('T', record.get('U'))
+        if amount is None or 'D' not in record:
+            raise StatementError('record needs D and T lines')
+        return StatementRow(line, parse_date(record['D']), parse_amount(amount),
+                            record.get('P') or record.get('M') or '')
+    except StatementError as e:
+        return StatementError(f'Line {line}: {e}')
+
+
+def _trie_pattern(words):
+    """Regex source matching any of words, factored into a prefix trie
+
+    'uber', 'uber eats' becomes 'uber(?:\\ eats)?': every branch starts with a
+    distinct literal, so the engine can rule out most positions with one
+    character test, and the longest keyword at a position wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def pattern(node):
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return f'(?:{body})?'
+        return body
+
+    return pattern(trie)
+
+
+class CategoryRules:
+    """Keyword/regex → category name rules compiled into as few patterns as possible
+
+    rules is a list of (pattern, category_name); a pattern starting with 're:'
+    is a regular expression, anything else a case-insensitive keyword. All the
+    keywords share one trie-shaped pattern and all the regexes one alternation,
+    so a description is scanned at most twice whatever the number of rules.
+    The match starting earliest wins; at the same position a regex beats a
+    keyword, the longer keyword beats its prefix, and of equal rules the one
+    listed first wins.
+    """
+
+    def __init__(self, rules):
+        self.categories = []
+        self.keywords = {}
+        alternatives = []
+        for index, (pattern, category_name) in enumerate(rules):
+            self.categories.append(category_name)
+            if not pattern.startswith('re:'):
+                if pattern.strip():
+                    self.keywords.setdefault(pattern.lower(), category_name)
+                continue
+            try:
+                re.compile(pattern[3:])  # report a bad user pattern on its own, not inside the combined one
+            except re.error as e:
+                raise ValueError(f'Invalid rule pattern {pattern!r}: {e}')
+            alternatives.append(f'(?P<r{index}>{pattern[3:]})')
+        self.regex = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+        self.keyword_pattern = re.compile(_trie_pattern(self.keywords)) if self.keywords else None
+
+    @classmethod
+    def default(cls, extra_rules=()):
+        """User rules first (so they win ties), then the built-in keyword list"""
+        return cls(list(extra_rules) + [(keyword, category_name)
+                                        for category_name, keywords in DEFAULT_RULES.items()
+                                        for keyword in keywords])
+
+    def match(self, description):
+        """Category name of the first rule found in description, or None"""
+        if not description:
+            return None
+        found = self.regex.search(description) if self.regex is not None else None
+        if self.keyword_pattern is not None:
+            keyword = self.keyword_pattern.search(description.lower())
+            if keyword and (found is None or keyword.start() < found.start()):
+                return self.keywords[keyword.group()]
+        return self.categories[int(found.lastgroup[1:])] if found else None
@@ -0,0 +1,132 @@
+"""
+Session hooks that keep derived tables in step with ORM writes.
+
+Each flush turns the inserted, updated and deleted transactions into ledger
+deltas, and recomputes the stored participant shares of transactions whose
+amount, participation or members changed. Both are written on the flush's own
+connection, so derived rows commit or roll back together with the
+transactions. Before each flush, edited transactions get a fresh duplicate
+fingerprint (new ones get theirs from the column default). Bulk Core/query
+writes bypass these hooks and must call LedgerService.apply_deltas (or
+rebuild), TransactionService.update_shares and
+TransactionService.update_fingerprints themselves.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from .models import Transaction, MembersTransaction
+from .services import LedgerService, TransactionService
+from .utils import to_pence, transaction_fingerprint
+
+LEDGER_FIELDS = ('user_id', 'transaction_type', 'category_id', 'transaction_date', 'amount')
+FINGERPRINT_FIELDS = ('transaction_type', 'transaction_date', 'amount', 'category_id', 'description')
+
+
+def _ledger_entry(values):
+    """(ledger key, pence) for a transaction's field values"""
+    user_id, transaction_type, category_id, transaction_date, amount = values
+    key = LedgerService.transaction_key(user_id, transaction_type, category_id, transaction_date)
+    return key, to_pence(amount)
+
+
+def _current_values(obj):
+    return tuple(getattr(obj, field) for field in LEDGER_FIELDS)
+
+
+def _committed_values(obj):
+    """Field values as last loaded from the database, before this flush's changes"""
+    state = inspect(obj)
+    values = []
+    for field in LEDGER_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        else:
+            values.append(getattr(obj, field))
+    return tuple(values)
+
+
+def _ledger_deltas(session):
+    deltas = {}
+
+    def add(values, sign):
+        key, pence = _ledger_entry(values)
+        deltas[key] = deltas.get(key, 0) + sign * pence
+
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            add(_current_values(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            add(_committed_values(obj), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj, include_collections=False):
+            add(_committed_values(obj), -1)
+            add(_current_values(obj), 1)
+    return {key: pence for key, pence in deltas.items() if pence}
+
+
+def _share_transaction_ids(session):
+    """Transactions whose split changed: amount or participation edits, member links added or removed"""
+    transaction_ids = set()
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and obj not in session.deleted:
+            state = inspect(obj)
+            if state.attrs.amount.history.has_changes() or state.attrs.user_participates.history.has_changes():
+                transaction_ids.add(obj.transaction_id)
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, MembersTransaction):
+            transaction_ids.add(obj.transaction_id)
+    deleted_ids = {obj.transaction_id for obj in session.deleted if isinstance(obj, Transaction)}
+    return transaction_ids - deleted_ids - {None}
+
+
+def _sync_shares(session, shares):
+    """Copy freshly written shares onto objects already loaded in the session"""
+    for transaction_id, (user_share, member_shares) in shares.items():
+        transaction = session.identity_map.get(identity_key(Transaction, transaction_id))
+        if transaction is not None:
+            set_committed_value(transaction, 'user_share_amount', user_share)
+        for member_id, share in member_shares.items():
+            link = session.identity_map.get(identity_key(MembersTransaction, (transaction_id, member_id)))
+            if link is not None:
+                set_committed_value(link, 'share_amount', share)
+
+
+def _before_flush(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and obj not in session.deleted:
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in FINGERPRINT_FIELDS):
+                obj.fingerprint = transaction_fingerprint(*(getattr(obj, field) for field in FINGERPRINT_FIELDS))
+
+
+def _after_flush(session, flush_context):
+    # Attribute history still holds the pre-flush values here
+    deltas = _ledger_deltas(session)
+    if deltas:
+        LedgerService.apply_deltas(session.connection(), deltas)
+
+    transaction_ids = _share_transaction_ids(session)
+    if transaction_ids:
+        _sync_shares(session, TransactionService.update_shares(session.connection(), transaction_ids))
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+def init_app(app):
+    """Register the session hooks once per process"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+        # active_history loads an expired attribute's old value before it is overwritten,
+        # so updates to transactions committed earlier can be reversed out of the ledger
+        for field in LEDGER_FIELDS:
+            event.listen(getattr(Transaction, field), 'set', _keep_previous_value,
+                         active_history=True, retval=True)
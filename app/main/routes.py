@@ -10,16 +10,18 @@ This module contains all main application routes organized by functionality:
 - API Endpoints
 """
 
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, make_response
 from flask_login import login_required, current_user
 from app import db
-from app.models import Transaction, User, Category, Budget, Member, MembersTransaction
+from app.models import Transaction, User, Category, Budget, Member, MembersTransaction, DailyCumulative, BudgetSnapshot, IdempotencyKey
+from app.events import publish_bulk_change
 from app.auth.forms import LoginForm, SignupForm
 from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired, Length, EqualTo
 from flask_wtf import FlaskForm
-from app.services import TransactionService, CashFlowService, SimpleAnalyticsService, ReportingService, BudgetService, CategoryService
+from app.services import TransactionService, CashFlowService, SimpleAnalyticsService, ReportingService, BudgetService, CategoryService, DashboardService, FamilyExpenseService, AnalyticsBatchService, LedgerService, BudgetSnapshotService, IdempotencyService
 
 main_bp = Blueprint('main', __name__)
 
@@ -46,159 +48,68 @@ def about():
 @login_required
 def dashboard():
     from datetime import datetime
-    from app.models import Transaction
     now = datetime.now()
     
     try:
         # Get time range from request
         time_range = request.args.get('range', '6months')
         
-        # Define start_of_month for current month calculations
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        current_month_data = SimpleAnalyticsService.get_monthly_totals(current_user.user_id, now.year, now.month)
+        # Panels are independent and read-only, so they can optionally be
+        # computed concurrently (each with its own session) under a deadline
+        # The page is a cheap shell: charts and budget alerts are lazy-loaded
+        # from the fragment endpoints below
+        if current_app.config.get('DASHBOARD_CONCURRENT_PANELS'):
+            panels, degraded_panels = DashboardService.get_dashboard_panels_concurrent(
+                current_app._get_current_object(),
+                current_user.user_id,
+                time_range,
+                now=now,
+                max_workers=current_app.config.get('DASHBOARD_PANEL_WORKERS', 4),
+                deadline=current_app.config.get('DASHBOARD_PANEL_DEADLINE', 2.0),
+                names=DashboardService.SHELL_PANELS
+            )
+        else:
+            panels, degraded_panels = DashboardService.get_dashboard_panels(
+                current_user.user_id, time_range, now=now,
+                names=DashboardService.SHELL_PANELS
+            )
         
+        current_month_data = panels['monthly_totals']
         monthly_income = current_month_data['income']
         monthly_expenses = current_month_data['expenses']
         monthly_balance = current_month_data['balance']
         
-        # Get PERSONAL budget alerts only (member_id is NULL)
-        budget_alerts = []
-        personal_budgets = Budget.query.filter_by(
-            user_id=current_user.user_id,
-            member_id=None,  # Personal budgets only
-            is_active=True
-        ).all()
-        
-        for budget in personal_budgets:
-            if budget.category:
-                # Calculate spending for this category (personal expenses only)
-                category_spent_query = db.session.query(db.func.sum(Transaction.amount)).filter(
-                    Transaction.user_id == current_user.user_id,
-                    Transaction.transaction_type == 'expense',
-                    Transaction.category_id == budget.category_id,
-                    Transaction.transaction_date >= start_of_month,
-                    Transaction.user_participates == True,
-                    ~Transaction.members.any()  # No family members - personal expenses only
-                ).scalar()
-                
-                category_spent = float(category_spent_query) if category_spent_query else 0
-                budget_amount = float(budget.budget_amount)
-                
-                if budget_amount > 0:
-                    percentage = (category_spent / budget_amount * 100)
-                    # Show all personal budget alerts, not just over 75%
-                    budget_alerts.append({
-                        'category_name': budget.category.category_name,
-                        'budget_amount': budget_amount,
-                        'spent': category_spent,
-                        'percentage': percentage
-                    })
-        
-        # Sort budget alerts by percentage (highest first)
-        budget_alerts.sort(key=lambda x: x['percentage'], reverse=True)
-        
-        # Get monthly comparison data based on selected time range
-        monthly_comparison = []
-        
-        oldest_transaction = Transaction.query.filter_by(
-            user_id=current_user.user_id
-        ).order_by(Transaction.transaction_date.asc()).first()
-        
-        if not oldest_transaction:
-            start_date = now - timedelta(days=150)  # ~5 months
+        # Fall back to the monthly balance when no total budget is set
+        total_budget_status = panels['total_budget_status']
+        if total_budget_status:
+            remaining_budget = total_budget_status['remaining']
+            total_budget = total_budget_status['budget_amount']
         else:
-            if time_range == '3months':
-                start_date = now - timedelta(days=90)   # ~3 months
-            elif time_range == '6months':
-                start_date = now - timedelta(days=150)  # ~5 months
-            elif time_range == '1year':
-                start_date = now - timedelta(days=330)  # ~11 months
-            elif time_range == '2years':
-                start_date = now - timedelta(days=690)  # ~23 months
-            elif time_range == 'all':
-                start_date = oldest_transaction.transaction_date.replace(day=1)
-            else:
-                start_date = now - timedelta(days=150)  # ~5 months
-        
-        current_date = start_date.replace(day=1)
-        end_date = now.replace(day=1)
-        
-        while current_date <= end_date:
-            year = current_date.year
-            month = current_date.month
-            
-            monthly_data = SimpleAnalyticsService.get_monthly_totals(current_user.user_id, year, month)
-            monthly_comparison.append({
-                'month': f"{year}-{month:02d}",
-                'month_name': datetime(year, month, 1).strftime('%b %Y'),
-                'month_short': datetime(year, month, 1).strftime('%b'),
-                'income': monthly_data['income'],
-                'expenses': monthly_data['expenses']
-            })
-            
-            # Move to next month
-            if current_date.month == 12:
-                current_date = current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                current_date = current_date.replace(month=current_date.month + 1)
-        
-        if len(monthly_comparison) > 24:
-            monthly_comparison = monthly_comparison[-24:]
-        
-        # Simplified category spending - use existing method
-        category_spending = SimpleAnalyticsService.get_spending_by_category(current_user.user_id)
-        
-        # Simplified budget calculation for now
-        try:
-            total_budget_status = BudgetService.get_total_budget_status(current_user.user_id)
-            if total_budget_status:
-                remaining_budget = total_budget_status['remaining']
-                total_budget = total_budget_status['budget_amount']
-            else:
-                remaining_budget = monthly_balance
-                total_budget = 0
-        except:
             remaining_budget = monthly_balance
             total_budget = 0
         
-        # Calculate total balance (all-time income - all-time expenses)
-        balance = SimpleAnalyticsService.get_balance(current_user.user_id)
-        income = SimpleAnalyticsService.get_total_income(current_user.user_id)
-        expenses = SimpleAnalyticsService.get_total_expenses(current_user.user_id)
-        
         return render_template('dashboard.html',
                              user=current_user,
-                             balance=balance,
-                             income=income,
-                             expenses=expenses,
                              monthly_income=monthly_income,
                              monthly_expenses=monthly_expenses,
                              remaining_budget=remaining_budget,
                              total_budget=total_budget,
                              current_month=now.strftime('%B %Y'),
                              current_month_short=now.strftime('%b'),
-                             monthly_comparison=monthly_comparison,
-                             category_spending=category_spending,
-                             budget_alerts=budget_alerts,
+                             degraded_panels=degraded_panels,
                              current_time_range=time_range)
     
     except Exception as e:
         print(f"Dashboard error: {e}")
         return render_template('dashboard.html',
                              user=current_user,
-                             balance=0,
-                             income=0,
-                             expenses=0,
                              monthly_income=0,
                              monthly_expenses=0,
                              remaining_budget=0,
                              total_budget=0,
                              current_month=datetime.now().strftime('%B %Y'),
                              current_month_short=datetime.now().strftime('%b'),
-                             monthly_comparison=[],
-                             category_spending={},
-                             budget_alerts=[],
+                             degraded_panels=[],
                              current_time_range='6months')
     
 @main_bp.route('/faq')
@@ -226,41 +137,12 @@ def cash_flow():
         # Get category report
         category_report = ReportingService.get_category_report(current_user.user_id)
 
-        # Get available years from user's transactions
-        available_years = db.session.query(
-            db.func.extract('year', Transaction.transaction_date)
-        ).filter(
-            Transaction.user_id == current_user.user_id
-        ).distinct().order_by(
-            db.func.extract('year', Transaction.transaction_date).asc()
-        ).all()
-        
-        available_years = [int(year[0]) for year in available_years]
-
-        # Get yearly data only for years that have transactions
-        yearly_data = []
-        if available_years:
-            for year in available_years:
-                yearly_income = 0
-                yearly_expenses = 0
-                
-                for month in range(1, 13):
-                    try:
-                        monthly_data = SimpleAnalyticsService.get_monthly_totals(current_user.user_id, year, month)
-                        yearly_income += monthly_data['income']
-                        yearly_expenses += monthly_data['expenses']
-                    except Exception as e:
-                        print(f"Error getting monthly data for {year}-{month}: {e}")
-                        continue
-                
-                # Only add year if there's actual data
-                if yearly_income > 0 or yearly_expenses > 0:
-                    yearly_data.append({
-                        'year': year,
-                        'income': yearly_income,
-                        'expenses': yearly_expenses,
-                        'balance': yearly_income - yearly_expenses
-                    })
+        # Per-year totals from one GROUP BY on the indexed year column
+        # (years whose totals are all zero are skipped, as before)
+        yearly_data = [
+            year_totals for year_totals in SimpleAnalyticsService.get_yearly_totals(current_user.user_id)
+            if year_totals['income'] > 0 or year_totals['expenses'] > 0
+        ]
         
         # If no yearly data, show current year
         if not yearly_data:
@@ -434,9 +316,10 @@ def update_profile():
 @main_bp.route('/clear_all_data', methods=['POST'])
 @login_required
 def clear_all_data():
-    """Clear all user data (transactions, budgets, family members)"""
+    """Clear all user data (transactions, budgets, family members, recurring rules)"""
     try:
-        from app.models import Member, MembersTransaction
+        from app.models import (Member, MembersTransaction, TransactionTag, RecurringRule, RecurringRuleMember,
+                                RecurringOccurrence)
         
         user_id = current_user.user_id
         
@@ -446,17 +329,35 @@ def clear_all_data():
                 db.session.query(Transaction.transaction_id).filter_by(user_id=user_id)
             )
         ).delete(synchronize_session=False)
+        # Tag links too; foreign keys are not enforced on SQLite
+        TransactionTag.query.filter(
+            TransactionTag.transaction_id.in_(
+                db.session.query(Transaction.transaction_id).filter_by(user_id=user_id)
+            )
+        ).delete(synchronize_session=False)
         
         # Then delete transactions
         Transaction.query.filter_by(user_id=user_id).delete()
         
-        # Delete budgets
+        # Delete budgets and their month-close history
         Budget.query.filter_by(user_id=user_id).delete()
+        BudgetSnapshot.query.filter_by(user_id=user_id).delete()
+        
+        # Delete recurring rules with their member links and entered occurrences
+        user_rules = db.session.query(RecurringRule.rule_id).filter_by(user_id=user_id)
+        RecurringRuleMember.query.filter(RecurringRuleMember.rule_id.in_(user_rules)).delete(synchronize_session=False)
+        RecurringOccurrence.query.filter(RecurringOccurrence.rule_id.in_(user_rules)).delete(synchronize_session=False)
+        RecurringRule.query.filter_by(user_id=user_id).delete()
         
         # Delete family members
         Member.query.filter_by(user_id=user_id).delete()
         
+        # Bulk deletes bypass the ledger hooks, so drop the user's ledger rows too
+        DailyCumulative.query.filter_by(user_id=user_id).delete()
+        IdempotencyKey.query.filter_by(user_id=user_id).delete()
+        
         db.session.commit()
+        publish_bulk_change(user_id, ['transactions', 'budgets', 'members'])
         
         return jsonify({'success': True, 'message': 'All data cleared successfully!'})
     
@@ -470,7 +371,7 @@ def clear_all_data():
 def delete_account():
     """Permanently delete user account and all data"""
     try:
-        from app.models import Member, MembersTransaction
+        from app.models import Member, MembersTransaction, TransactionTag
         from werkzeug.security import check_password_hash
         
         password = request.form.get('password')
@@ -488,21 +389,33 @@ def delete_account():
                 db.session.query(Transaction.transaction_id).filter_by(user_id=user_id)
             )
         ).delete(synchronize_session=False)
+        # Tag links too; foreign keys are not enforced on SQLite
+        TransactionTag.query.filter(
+            TransactionTag.transaction_id.in_(
+                db.session.query(Transaction.transaction_id).filter_by(user_id=user_id)
+            )
+        ).delete(synchronize_session=False)
         
         # 2. Delete transactions
         Transaction.query.filter_by(user_id=user_id).delete()
         
-        # 3. Delete budgets
+        # 3. Delete budgets and their month-close history
         Budget.query.filter_by(user_id=user_id).delete()
+        BudgetSnapshot.query.filter_by(user_id=user_id).delete()
         
         # 4. Delete family members
         Member.query.filter_by(user_id=user_id).delete()
         
-        # 5. Finally delete the user account
+        # 5. Delete ledger rows (bulk deletes bypass the ledger hooks) and idempotency keys
+        DailyCumulative.query.filter_by(user_id=user_id).delete()
+        IdempotencyKey.query.filter_by(user_id=user_id).delete()
+        
+        # 6. Finally delete the user account
         user_to_delete = User.query.get(user_id)
         db.session.delete(user_to_delete)
         
         db.session.commit()
+        publish_bulk_change(user_id, ['transactions', 'budgets', 'members'])
         
         return jsonify({'success': True, 'message': 'Account deleted successfully!'})
     
@@ -524,225 +437,20 @@ def members():
 @main_bp.route('/family_management')
 @login_required
 def family_management():
-    """Comprehensive family management page with members, expenses, and budgets"""
-    from app.models import Member, Category, MembersTransaction
-    from datetime import datetime, timedelta
+    """Family management page shell: members and forms.
+    Summary totals, charts, budgets and recent expenses are lazy-loaded from fragment endpoints."""
+    from app.models import Member, Category
     
     # Get user's family members
     family_members = Member.query.filter_by(user_id=current_user.user_id).all()
     
-    # Calculate basic stats
-    member_count = len(family_members)
-    
-    # Get total family expenses (all expenses including shared ones)
-    total_expenses_query = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.user_id,
-        Transaction.transaction_type == 'expense'
-    ).scalar()
-    
-    total_family_expenses = float(total_expenses_query) if total_expenses_query else 0
-    
-    # Get FAMILY category budgets (member_id is not null)
-    family_budget_records = Budget.query.filter(
-        Budget.user_id == current_user.user_id,
-        Budget.is_active == True,
-        Budget.member_id != None  # This makes it a family budget
-    ).all()
-    
-    # Calculate family budget total
-    family_budget_total = sum([float(b.budget_amount) for b in family_budget_records])
-    
-    budget_percentage = (total_family_expenses / family_budget_total * 100) if family_budget_total > 0 else 0
-    
-    # Calculate REAL member contributions
-    member_contributions = {}
-    user_contribution = 0
-    
-    # Calculate current user's contribution from shared expenses
-    user_shared_expenses = Transaction.query.filter(
-        Transaction.user_id == current_user.user_id,
-        Transaction.transaction_type == 'expense',
-        Transaction.user_participates == True
-    ).all()
-    
-    for expense in user_shared_expenses:
-        cost_per_person = expense.get_cost_per_person()
-        user_contribution += cost_per_person
-    
-    # Calculate each member's contribution
-    for member in family_members:
-        member_total = 0
-        # Get all transactions where this member participates
-        member_transactions = MembersTransaction.query.filter_by(
-            member_id=member.member_id
-        ).join(Transaction).filter(
-            Transaction.user_id == current_user.user_id,
-            Transaction.transaction_type == 'expense'
-        ).all()
-        
-        for mt in member_transactions:
-            cost_per_person = mt.transaction.get_cost_per_person()
-            member_total += cost_per_person
-        
-        member_contributions[member.member_id] = member_total
-    
-    # Category data for charts
-    category_data = db.session.query(
-        Category.category_name,
-        db.func.sum(Transaction.amount).label('total_amount')
-    ).join(Transaction).filter(
-        Transaction.user_id == current_user.user_id,
-        Transaction.transaction_type == 'expense'
-    ).group_by(Category.category_name).all()
-    
-    category_chart_data = [{'category': cat[0], 'amount': float(cat[1])} for cat in category_data]
-    
-    # Create category expenses dictionary for budget section
-    category_expenses = {}
-    for cat in category_data:
-        category_expenses[cat[0]] = float(cat[1])
-    
-    # Prepare family budget data with spent amounts
-    family_budgets_with_spent = []
-    for budget in family_budget_records:
-        if budget.category:
-            category_name = budget.category.category_name
-            budget_amount = float(budget.budget_amount)
-            spent = category_expenses.get(category_name, 0)
-            percentage = (spent / budget_amount * 100) if budget_amount > 0 else 0
-            
-            family_budgets_with_spent.append({
-                'budget_id': budget.budget_id,
-                'category_name': category_name,
-                'budget_amount': budget_amount,
-                'spent': spent,
-                'percentage': percentage,
-                'alert_level': 'over-budget' if percentage >= 100 else ('near-limit' if percentage >= 75 else 'within-budget')
-            })
-    
-    # Sort family budgets by percentage (highest first)
-    family_budgets_with_spent.sort(key=lambda x: x['percentage'], reverse=True)
-    
-    # Per-member category data
-    per_member_category_data = {}
-    
-    # Get current user's share of expenses by category
-    user_spending_by_category = {}
-    for transaction in user_shared_expenses:
-        if transaction.category:
-            cat_name = transaction.category.category_name
-            cost_per_person = transaction.get_cost_per_person()
-            
-            if cat_name in user_spending_by_category:
-                user_spending_by_category[cat_name] += cost_per_person
-            else:
-                user_spending_by_category[cat_name] = cost_per_person
-    
-    user_spending_list = []
-    for cat_name, amount in user_spending_by_category.items():
-        if amount > 0:
-            user_spending_list.append({'category': cat_name, 'amount': float(amount)})
-    
-    if user_spending_list:
-        per_member_category_data[current_user.user_name or 'You'] = user_spending_list
-    
-    # For family members, show their portion of shared expenses by category
-    for member in family_members:
-        member_expenses_by_category = {}
-        
-        for mt in member.transactions:
-            transaction = mt.transaction
-            if transaction.transaction_type == 'expense' and transaction.category:
-                cat_name = transaction.category.category_name
-                cost_per_person = transaction.get_cost_per_person()
-                
-                if cat_name in member_expenses_by_category:
-                    member_expenses_by_category[cat_name] += cost_per_person
-                else:
-                    member_expenses_by_category[cat_name] = cost_per_person
-        
-        member_expenses_list = []
-        for cat_name, amount in member_expenses_by_category.items():
-            if amount > 0:
-                member_expenses_list.append({'category': cat_name, 'amount': float(amount)})
-        
-        if member_expenses_list:
-            per_member_category_data[member.name] = member_expenses_list
-    
-    # Recent expenses
-    recent_shared_expenses = db.session.query(Transaction).filter(
-        Transaction.user_id == current_user.user_id,
-        Transaction.transaction_type == 'expense'
-    ).order_by(Transaction.transaction_date.desc()).limit(10).all()
-    
-    recent_expenses_data = []
-    for transaction in recent_shared_expenses:
-        shared_with = []
-        
-        if transaction.user_participates:
-            shared_with.append(current_user.user_name or "You")
-        
-        # Add member
-        for member_transaction in transaction.members:
-            if member_transaction.member:
-                shared_with.append(member_transaction.member.name)
-        
-        recent_expenses_data.append({
-            'id': transaction.transaction_id,
-            'date': transaction.transaction_date.strftime('%b %d, %Y'),
-            'description': 'Family Expense',
-            'category': transaction.category.category_name if transaction.category else 'Other',
-            'amount': float(transaction.amount),
-            'cost_per_person': transaction.get_cost_per_person(),
-            'shared_with': shared_with 
-        })
-    
-    # Generate monthly comparison data for charts
-    family_monthly_comparison = []
-    now = datetime.now()
-    
-    # Get last 6 months of data
-    for i in range(5, -1, -1):
-        month_date = now - timedelta(days=30*i)
-        month_start = month_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if month_date.month == 12:
-            month_end = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-        
-        monthly_expenses_query = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user.user_id,
-            Transaction.transaction_type == 'expense',
-            Transaction.transaction_date >= month_start,
-            Transaction.transaction_date <= month_end
-        ).scalar()
-        
-        monthly_expenses = float(monthly_expenses_query) if monthly_expenses_query else 0
-        
-        family_monthly_comparison.append({
-            'month': month_date.strftime('%Y-%m'),
-            'month_name': month_date.strftime('%B %Y'),
-            'month_short': month_date.strftime('%b'),
-            'expenses': monthly_expenses
-        })
-    
     # Get all categories for the form dropdowns
     all_categories = Category.query.all()
     
     return render_template('family_management.html',
                          members=family_members,
-                         member_count=member_count,
-                         total_family_expenses=total_family_expenses,
-                         family_budget_total=family_budget_total,
-                         budget_percentage=budget_percentage,
-                         category_chart_data=category_chart_data,
-                         per_member_category_data=per_member_category_data,
-                         family_budgets_with_spent=family_budgets_with_spent,  
-                         recent_shared_expenses=recent_expenses_data,
-                         family_monthly_comparison=family_monthly_comparison,
-                         categories=all_categories,
-                         member_contributions=member_contributions,
-                         user_contribution=user_contribution)
+                         member_count=len(family_members),
+                         categories=all_categories)
 
 @main_bp.route('/add_family_budget', methods=['POST'])
 @login_required
@@ -769,32 +477,11 @@ def add_family_budget():
             flash('Please add a family member first to create family budgets.', 'error')
             return redirect(url_for('main.family_management'))
         
-        # Check if family budget already exists for this category
-        existing_budget = Budget.query.filter_by(
-            user_id=current_user.user_id,
-            category_id=category_id,
-            member_id=first_member.member_id  # This makes it a family budget
-        ).first()
-        
-        if existing_budget:
-            # Update existing family budget
-            existing_budget.budget_amount = amount
-            existing_budget.updated_at = datetime.now()
-            message = 'Family budget updated successfully'
-        else:
-            # Create new FAMILY budget
-            new_budget = Budget(
-                user_id=current_user.user_id,
-                category_id=category_id,
-                budget_amount=amount,
-                member_id=first_member.member_id,  # This makes it a family budget
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            db.session.add(new_budget)
-            message = 'Family budget added successfully'
+        # Create or update the FAMILY budget (member_id set makes it a family budget) in one statement
+        BudgetService.upsert_budget(amount, user_id=current_user.user_id,
+                                    member_id=first_member.member_id, category_id=category_id)
+        message = 'Family budget saved successfully'
         
-        db.session.commit()
         flash(message, 'success')
         
     except ValueError as e:
@@ -890,7 +577,7 @@ def add_family_expense():
     from datetime import datetime
     
     try:
-        description = request.form.get('description')  # Still get it from form but don't validate
+        description = (request.form.get('description') or '').strip()[:255] or None
         amount = request.form.get('amount')
         category_id = request.form.get('category_id')
         expense_date = request.form.get('expense_date')
@@ -904,28 +591,28 @@ def add_family_expense():
             else:
                 transaction_date = datetime.now()
             
-            # Create the transaction
-            new_transaction = Transaction(
+            values = dict(
                 user_id=current_user.user_id,
                 category_id=category_id,
                 amount=float(amount),
                 transaction_type='expense',
                 user_participates=include_user,
-                transaction_date=transaction_date
+                transaction_date=transaction_date,
+                description=description
             )
             
-            db.session.add(new_transaction)
-            db.session.flush()  # Get the transaction ID
-            
-            # Add member associations
-            for member_id in member_ids:
-                member_transaction = MembersTransaction(
-                    transaction_id=new_transaction.transaction_id,
-                    member_id=int(member_id)
-                )
-                db.session.add(member_transaction)
+            def write(session):
+                # Create the transaction with its member associations
+                new_transaction = Transaction(**values)
+                for member_id in member_ids:
+                    new_transaction.members.append(MembersTransaction(member_id=int(member_id)))
+                session.add(new_transaction)
+                session.flush()
+                return new_transaction.transaction_id
             
-            db.session.commit()
+            # A replayed form token / Idempotency-Key returns the first result without a second row
+            IdempotencyService.run_once(current_user.user_id, 'add_family_expense',
+                                        IdempotencyService.request_key(request), write)
             flash('Family expense added successfully!', 'success')
         else:
             flash('Please provide all required information.', 'error')
@@ -943,7 +630,7 @@ def edit_family_expense(expense_id):
     
     expense_id = request.form.get('expense_id')
     expense_date = request.form.get('expense_date')
-    description = request.form.get('description')  # Still get it from form but don't validate
+    description = (request.form.get('description') or '').strip()[:255] or None
     amount = request.form.get('amount')
     category_id = request.form.get('category_id')
     member_ids = request.form.getlist('member_ids')
@@ -957,26 +644,19 @@ def edit_family_expense(expense_id):
         ).first()
         
         if transaction:
-            # Update transaction details
+            # Update transaction details; unchanged values are not written
             if expense_date:
                 from datetime import datetime
                 transaction.transaction_date = datetime.strptime(expense_date, '%Y-%m-%d')
-            transaction.amount = float(amount)
-            transaction.category_id = category_id
+            # Decimal like the stored value, so an unchanged amount is not an edit
+            transaction.amount = Decimal(amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            transaction.category_id = int(category_id)
             transaction.user_participates = include_user
+            transaction.description = description
             
-            # Clear existing member associations
-            MembersTransaction.query.filter_by(
-                transaction_id=transaction.transaction_id
-            ).delete()
-            
-            # Add new member associations
-            for member_id in member_ids:
-                member_transaction = MembersTransaction(
-                    transaction_id=transaction.transaction_id,
-                    member_id=int(member_id)
-                )
-                db.session.add(member_transaction)
+            # Only add/remove the member links that changed; the flush hooks re-split
+            # shares when participants or the amount changed
+            TransactionService.set_members(transaction, member_ids)
             
             db.session.commit()
             flash('Expense updated successfully!', 'success')
@@ -1031,7 +711,7 @@ def update_family_budget():
         category_id = int(category_id)
         
         # Create or update the budget for this category (note: budget_amount comes before category_id)
-        budget = BudgetService.create_or_update_budget(
+        BudgetService.create_or_update_budget(
             user_id=current_user.user_id,
             budget_amount=amount,
             category_id=category_id
@@ -1164,34 +844,16 @@ def add_budget():
         if not amount or amount <= 0:
             return jsonify({'success': False, 'message': 'Invalid budget amount'}), 400
         
+        alert_threshold = float(data['alert_threshold']) if data.get('alert_threshold') else None
+        
         print(f"DEBUG: Creating PERSONAL budget - user_id: {current_user.user_id}, category_id: {category_id}, amount: {amount}")
         
-        # Check if PERSONAL budget already exists for this category
-        existing_budget = Budget.query.filter_by(
-            user_id=current_user.user_id,
-            category_id=category_id,
-            member_id=None  # This makes it a personal budget
-        ).first()
+        # Create or update the PERSONAL budget (member_id None) in one statement
+        BudgetService.upsert_budget(amount, user_id=current_user.user_id, category_id=category_id,
+                                    alert_threshold=alert_threshold,
+                                    notifications_enabled=data.get('notifications_enabled'))
+        message = 'Personal budget saved successfully'
         
-        if existing_budget:
-            # Update existing PERSONAL budget
-            existing_budget.budget_amount = amount
-            existing_budget.updated_at = datetime.now()
-            message = 'Personal budget updated successfully'
-        else:
-            # Create new PERSONAL budget
-            new_budget = Budget(
-                user_id=current_user.user_id,
-                category_id=category_id,
-                budget_amount=amount,
-                member_id=None,  # This makes it a personal budget
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            db.session.add(new_budget)
-            message = 'Personal budget added successfully'
-        
-        db.session.commit()
         print(f"DEBUG: {message}")
         
         return jsonify({'success': True, 'message': message})
@@ -1247,6 +909,92 @@ def delete_budget(budget_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+# ============================================================================
+# PAGE FRAGMENTS (lazy-loaded by dashboard.html and family_management.html)
+# ============================================================================
+
+def _fragment_response(payload):
+    """JSON (dict/list) or HTML (str) fragment that browsers revalidate via ETag"""
+    if isinstance(payload, str):
+        response = make_response(payload)
+    else:
+        response = jsonify(payload)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@main_bp.route('/dashboard/fragments/summary')
+@login_required
+def dashboard_summary_fragment():
+    """Current month totals, total budget status and all-time totals"""
+    panels, _ = DashboardService.get_dashboard_panels(
+        current_user.user_id, None,
+        names=('monthly_totals', 'total_budget_status', 'all_time_totals')
+    )
+    return _fragment_response(panels)
+
+@main_bp.route('/dashboard/fragments/comparison')
+@login_required
+def dashboard_comparison_fragment():
+    """Income vs expenses series for ?range= (the only part a range switch changes)"""
+    time_range = request.args.get('range', '6months')
+    monthly_comparison = DashboardService.get_monthly_comparison(
+        current_user.user_id, time_range, datetime.now()
+    )
+    return _fragment_response({'range': time_range, 'months': monthly_comparison})
+
+@main_bp.route('/dashboard/fragments/categories')
+@login_required
+def dashboard_categories_fragment():
+    """All-time spending per category"""
+    return _fragment_response(SimpleAnalyticsService.get_spending_by_category(current_user.user_id))
+
+@main_bp.route('/dashboard/fragments/budget_alerts')
+@login_required
+def dashboard_budget_alerts_fragment():
+    """Personal budget alerts rendered as HTML"""
+    start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    budget_alerts = DashboardService.get_personal_budget_alerts(current_user.user_id, start_of_month)
+    return _fragment_response(render_template('_dashboard_budget_alerts.html', budget_alerts=budget_alerts))
+
+@main_bp.route('/family_management/fragments/summary')
+@login_required
+def family_summary_fragment():
+    """Family totals, budget usage and per-person contributions"""
+    return _fragment_response(FamilyExpenseService.get_family_summary(current_user.user_id))
+
+@main_bp.route('/family_management/fragments/category_chart')
+@login_required
+def family_category_chart_fragment():
+    """Household and per-participant category spending"""
+    return _fragment_response(FamilyExpenseService.get_category_chart_data(
+        current_user.user_id, current_user.user_name
+    ))
+
+@main_bp.route('/family_management/fragments/monthly_comparison')
+@login_required
+def family_monthly_comparison_fragment():
+    """Household expenses for recent months"""
+    return _fragment_response(FamilyExpenseService.get_monthly_comparison(current_user.user_id))
+
+@main_bp.route('/family_management/fragments/budget_alerts')
+@login_required
+def family_budget_alerts_fragment():
+    """Family category budgets rendered as HTML"""
+    family_budgets_with_spent = FamilyExpenseService.get_family_budgets_with_spent(current_user.user_id)
+    return _fragment_response(render_template('_family_budget_alerts.html',
+                                              family_budgets_with_spent=family_budgets_with_spent))
+
+@main_bp.route('/family_management/fragments/recent_expenses')
+@login_required
+def family_recent_expenses_fragment():
+    """Recent family expenses rendered as HTML (desktop table and mobile cards)"""
+    recent_shared_expenses = FamilyExpenseService.get_recent_expenses(
+        current_user.user_id, current_user.user_name
+    )
+    return _fragment_response(render_template('_family_recent_expenses.html',
+                                              recent_shared_expenses=recent_shared_expenses))
+
 # ============================================================================
 # API ENDPOINTS
 # ============================================================================
@@ -1272,6 +1020,153 @@ def annual_data():
     
     return jsonify(annual_data)
 
+@main_bp.route('/api/analytics/batch')
+@login_required
+def analytics_batch():
+    """Several dashboard widgets in one response, e.g. ?widgets=transaction_stats,annual_data"""
+    requested = request.args.get('widgets', '')
+    widgets = [name.strip() for name in requested.split(',') if name.strip()]
+    if not widgets:
+        widgets = list(AnalyticsBatchService.WIDGETS)
+
+    try:
+        result = AnalyticsBatchService.get_widgets(current_user.user_id, list(dict.fromkeys(widgets)))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify(result)
+
+def _date_arg(name, default):
+    """YYYY-MM-DD query argument as a date; ValueError when malformed"""
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else default
+
+@main_bp.route('/api/ledger/range_total')
+@login_required
+def ledger_range_total():
+    """Total for ?start=&end= (end exclusive) by ?type= and optional ?category_id="""
+    transaction_type = request.args.get('type', 'expense')
+    category_id = request.args.get('category_id', type=int)
+    today = datetime.now().date()
+    try:
+        start_date = _date_arg('start', today.replace(day=1))
+        end_date = _date_arg('end', today + timedelta(days=1))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD.'}), 400
+    if transaction_type not in ('income', 'expense'):
+        return jsonify({'success': False, 'message': 'type must be income or expense.'}), 400
+
+    category_key = category_id if category_id is not None else DailyCumulative.ALL_CATEGORIES
+    total = LedgerService.get_range_total(current_user.user_id, start_date, end_date,
+                                          transaction_type, category_key)
+    return jsonify({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'type': transaction_type,
+        'category_id': category_id,
+        'total': total
+    })
+
+@main_bp.route('/api/ledger/balance')
+@login_required
+def ledger_balance():
+    """Balance (income - expenses) as of the end of ?date= (default today)"""
+    try:
+        as_of = _date_arg('date', datetime.now().date())
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD.'}), 400
+
+    return jsonify({
+        'date': as_of.isoformat(),
+        'balance': LedgerService.get_balance_as_of(current_user.user_id, as_of)
+    })
+
+@main_bp.route('/api/ledger/heatmap')
+@login_required
+def ledger_heatmap():
+    """Daily expense totals for ?start=&end= (default: the last 365 days)"""
+    today = datetime.now().date()
+    try:
+        end_date = _date_arg('end', today + timedelta(days=1))
+        start_date = _date_arg('start', end_date - timedelta(days=365))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD.'}), 400
+
+    daily = LedgerService.get_daily_amounts(current_user.user_id, start_date, end_date)
+    return jsonify({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'days': [{'date': day.isoformat(), 'amount': amount} for day, amount in daily.items()]
+    })
+
+@main_bp.route('/api/family/category_matrix')
+@login_required
+def family_category_matrix():
+    """Participant x category expense shares for ?start=&end= (end exclusive, default all time)"""
+    try:
+        start_date = _date_arg('start', None)
+        end_date = _date_arg('end', None)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD.'}), 400
+
+    matrix = FamilyExpenseService.get_participant_category_matrix(current_user.user_id, start_date, end_date)
+    return jsonify({
+        'categories': matrix['categories'],
+        'rows': [dict(row, name=row['name'] if row['member_id'] is not None else current_user.user_name)
+                 for row in matrix['rows']]
+    })
+
+@main_bp.route('/api/family/monthly_shares')
+@login_required
+def family_monthly_shares():
+    """Household total and each participant's share for the last ?months= calendar months"""
+    months = request.args.get('months', 6, type=int)
+    if months is None or not 1 <= months <= 120:
+        return jsonify({'success': False, 'message': 'months must be between 1 and 120.'}), 400
+
+    series = FamilyExpenseService.get_participant_monthly_series(current_user.user_id, months)
+    series['participants'][0]['name'] = current_user.user_name
+    return jsonify(series)
+
+@main_bp.route('/api/family/expenses')
+@login_required
+def family_expense_timeline():
+    """Shared expenses newest first, ?cursor= paginated, filtered by ?member_id=&category_id=&start=&end="""
+    limit = request.args.get('limit', 20, type=int)
+    if limit is None or not 1 <= limit <= 100:
+        return jsonify({'success': False, 'message': 'limit must be between 1 and 100.'}), 400
+    try:
+        start_date = _date_arg('start', None)
+        end_date = _date_arg('end', None)
+        timeline = FamilyExpenseService.get_expense_timeline(
+            current_user.user_id, current_user.user_name,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            member_id=request.args.get('member_id', type=int),
+            category_id=request.args.get('category_id', type=int),
+            start_date=start_date,
+            end_date=end_date
+        )
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid cursor or date.'}), 400
+    return jsonify(timeline)
+
+@main_bp.route('/api/budgets/members')
+@login_required
+def member_budget_statuses():
+    """Month-to-date alert status of every active member budget"""
+    return jsonify({'budgets': BudgetService.get_member_budget_statuses(current_user.user_id)})
+
+@main_bp.route('/api/budgets/history')
+@login_required
+def budget_history():
+    """Budget vs actual per category for the last ?months= closed-month snapshots"""
+    months = request.args.get('months', 12, type=int)
+    if months is None or not 12 <= months <= 36:
+        return jsonify({'success': False, 'message': 'months must be between 12 and 36.'}), 400
+
+    return jsonify({'history': BudgetSnapshotService.get_budget_history(current_user.user_id, months)})
+
 @main_bp.route('/api/family_expense/<int:expense_id>', methods=['GET'])
 @login_required
 def get_family_expense_details(expense_id):
@@ -1307,6 +1202,7 @@ def get_family_expense_details(expense_id):
                 'transaction_date': transaction.transaction_date.strftime('%Y-%m-%d'), 
                 'category_id': transaction.category_id,
                 'user_participates': transaction.user_participates,
+                'description': transaction.description,
                 'member_ids': associated_member_ids
             }
         })
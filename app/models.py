@@ -1,8 +1,11 @@
 from datetime import datetime
 from . import db
-from sqlalchemy import func
+from sqlalchemy import DDL, event, func
+from sqlalchemy.ext.hybrid import hybrid_method
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from .utils import to_year_month, transaction_fingerprint, merchant_name
 
 class User(db.Model, UserMixin): 
     __tablename__ = 'users' 
@@ -19,6 +22,8 @@ class User(db.Model, UserMixin):
     transactions = db.relationship('Transaction', backref='user', cascade='all, delete-orphan')
     categories = db.relationship('Category', backref='user', cascade='all, delete-orphan')
     budgets = db.relationship('Budget', backref='user', cascade='all, delete-orphan')
+    tags = db.relationship('Tag', backref='user', cascade='all, delete-orphan')
+    recurring_rules = db.relationship('RecurringRule', backref='user', cascade='all, delete-orphan')
 
     # Flask-Login required method
     def get_id(self):
@@ -91,47 +96,27 @@ class Member(db.Model):
 
     # Relationships - members are linked to transactions via MembersTransaction junction table
     transactions = db.relationship('MembersTransaction', back_populates='member', cascade='all, delete-orphan')
+    recurring_rules = db.relationship('RecurringRuleMember', cascade='all, delete-orphan')
 
     def get_monthly_contribution(self, month, year):
         """Calculate this member's contribution for a specific month (user's perspective)"""
-        from datetime import datetime
-        from sqlalchemy import extract
-        
-        # Get transactions this member was involved in for the specified month
-        monthly_transactions = []
-        for mt in self.transactions:
-            transaction = mt.transaction
-            if (transaction.transaction_date.month == month and 
-                transaction.transaction_date.year == year and 
-                transaction.transaction_type == 'expense'):
-                monthly_transactions.append(transaction)
-        
-        # Calculate member's share using cost splitting logic
-        total_contribution = 0
-        for transaction in monthly_transactions:
-            total_contribution += transaction.get_cost_per_person()
-        
-        return total_contribution
+        from .services import MemberService
+        stats = MemberService.get_stats(self.user_id, [self.member_id], period=(year, month))
+        return stats[self.member_id]['total_contribution']
 
     def get_lifetime_stats(self):
         """Get lifetime statistics for this member (from user's tracking perspective)"""
-        total_transactions = len([mt for mt in self.transactions if mt.transaction.transaction_type == 'expense'])
-        total_contribution = 0
-        
-        for mt in self.transactions:
-            transaction = mt.transaction
-            if transaction.transaction_type == 'expense':
-                total_contribution += transaction.get_cost_per_person()
-        
-        return {
-            'total_transactions': total_transactions,
-            'total_contribution': total_contribution,
-            'average_per_transaction': total_contribution / total_transactions if total_transactions > 0 else 0
-        }
+        from .services import MemberService
+        return MemberService.get_stats(self.user_id, [self.member_id])[self.member_id]
 
-    def to_dict(self):
-        """Convert member to dictionary for user's family management interface"""
-        stats = self.get_lifetime_stats()
+    def to_dict(self, stats=None):
+        """Convert member to dictionary for user's family management interface
+
+        Pass stats from MemberService.get_stats when serializing several members,
+        so they share one query.
+        """
+        if stats is None:
+            stats = self.get_lifetime_stats()
         return {
             'member_id': self.member_id,
             'user_id': self.user_id,
@@ -146,6 +131,29 @@ class Member(db.Model):
     def __repr__(self):
         return f'Member {self.name} (managed by User {self.user_id})'
 
+def _transaction_date_bucket(bucket):
+    """Column default deriving year/year_month from transaction_date, for Core inserts"""
+    def default(context):
+        transaction_date = context.get_current_parameters()['transaction_date']
+        return transaction_date.year if bucket == 'year' else to_year_month(transaction_date)
+    return default
+
+def _default_user_share(context):
+    """A new transaction has no members yet, so the User bears the whole amount"""
+    return context.get_current_parameters()['amount']
+
+def _default_merchant(context):
+    """Merchant key of a Core-inserted transaction's description"""
+    return merchant_name(context.get_current_parameters().get('description'))
+
+def _default_fingerprint(context):
+    """Fingerprint of a Core-inserted transaction; ORM writes are kept by the session hooks"""
+    params = context.get_current_parameters()
+    if params.get('amount') is None or params.get('transaction_date') is None:
+        return ''  # leave the NOT NULL violation to the database
+    return transaction_fingerprint(params['transaction_type'], params['transaction_date'], params['amount'],
+                                   params.get('category_id'), params.get('description'))
+
 #Category set to nullable in case an user delete a category so the data is not automaticcaly deleted
 # User creates all transactions and assigns members as needed. Members are data entities only.
 # user_participates field controls whether User participates in cost splitting.
@@ -159,9 +167,47 @@ class Transaction(db.Model):
     transaction_date = db.Column(db.DateTime, nullable=False)  # for analytics
     created_at = db.Column(db.DateTime, nullable=False, server_default=func.now()) # for user behavior, monitoring for marketing(peak usage time), future features
     user_participates = db.Column(db.Boolean, nullable=False, default=True)  # Whether User participates in cost splitting
+    # Stored calendar buckets of transaction_date so per-year/per-month queries can use an index
+    year = db.Column(db.Integer, nullable=False, default=_transaction_date_bucket('year'))
+    year_month = db.Column(db.Integer, nullable=False, default=_transaction_date_bucket('year_month'))  # YYYYMM
+    # Penny-exact part of amount borne by the User, kept by TransactionService.update_shares
+    user_share_amount = db.Column(db.Numeric(8, 2), nullable=False, default=_default_user_share, server_default='0')
+    # Free-text description, or the payee/reference text of an imported bank statement;
+    # full-text searchable through transactions_fts (see TRANSACTION_SEARCH_DDL)
+    description = db.Column(db.String(255), nullable=True)
+    # merchant_name(description), stored so merchants group and autocomplete from an index
+    merchant = db.Column(db.String(64), nullable=True, default=_default_merchant)
+    # transaction_fingerprint() of type, day, amount, category and description: equal for
+    # re-imported or double-entered rows, but not unique, as genuine repeats happen
+    fingerprint = db.Column(db.String(32), nullable=False, default=_default_fingerprint, server_default='')
+
+    __table_args__ = (
+        db.Index('ix_transactions_user_year', 'user_id', 'year'),
+        db.Index('ix_transactions_user_year_month', 'user_id', 'year_month'),
+        db.Index('ix_transactions_user_date', 'user_id', 'transaction_date', 'transaction_id'),
+        db.Index('ix_transactions_user_fingerprint', 'user_id', 'fingerprint'),
+        # Covers top-merchant totals (optionally by date) and merchant prefix lookups
+        db.Index('ix_transactions_user_merchant', 'user_id', 'merchant', 'transaction_type',
+                 'transaction_date', 'amount'),
+    )
 
     # Relationships
     members = db.relationship('MembersTransaction', back_populates='transaction', cascade='all, delete-orphan')
+    tags = db.relationship('TransactionTag', back_populates='transaction', cascade='all, delete-orphan')
+    # No delete cascade: deleting the transaction nulls its occurrence's transaction_id (the FK's SET NULL)
+    occurrences = db.relationship('RecurringOccurrence')
+
+    @validates('transaction_date')
+    def _set_date_buckets(self, key, transaction_date):
+        if transaction_date is not None:
+            self.year = transaction_date.year
+            self.year_month = to_year_month(transaction_date)
+        return transaction_date
+
+    @validates('description')
+    def _set_merchant(self, key, description):
+        self.merchant = merchant_name(description)
+        return description
 
 
     # Helper methods for transaction categorization from USER's perspective
@@ -170,21 +216,40 @@ class Transaction(db.Model):
         """Get all family members the User assigned to this transaction for cost tracking"""
         return [mt.member for mt in self.members] 
 
+    # The cost-split helpers below are hybrid methods: on an instance they compute from
+    # the loaded row, on the class (Transaction.get_user_share()) they are SQL expressions
+    # usable in filter/order_by/sum. The SQL side reads the stored penny-exact shares, so
+    # it can differ from the instance's float split by a fraction of a penny.
+    @hybrid_method
     def is_personal_transaction(self):
         """Check if this is a personal expense (User only) vs family expense (User + members)"""
         return len(self.members) == 0
+
+    @is_personal_transaction.expression
+    def is_personal_transaction(cls):
+        return ~cls.members.any()
     
+    @hybrid_method
     def is_family_expense(self):
         """Check if this is a family/shared expense (has assigned members)"""
         return len(self.members) > 0
+
+    @is_family_expense.expression
+    def is_family_expense(cls):
+        return cls.members.any()
     
     def is_user_participating(self):
         """Check if User participates in the cost split (not just paying for it)"""
         return self.user_participates
     
+    @hybrid_method
     def is_members_only_expense(self):
         """Check if this is a members-only expense (User paid but doesn't participate in split)"""
         return len(self.members) > 0 and not self.user_participates
+
+    @is_members_only_expense.expression
+    def is_members_only_expense(cls):
+        return db.and_(cls.members.any(), cls.user_participates == False)
     
     def get_cost_per_person(self):
         """Calculate cost per person with proper participation logic"""
@@ -200,6 +265,7 @@ class Transaction(db.Model):
                 return 0  # Safety check
             return float(self.amount) / total_participants
     
+    @hybrid_method
     def get_user_share(self):
         """Get the User's portion of this expense (if participating)"""
         if self.is_personal_transaction():
@@ -208,7 +274,12 @@ class Transaction(db.Model):
             return self.get_cost_per_person()  # User's share of the split
         else:
             return 0  # User paid but doesn't participate in the split
+
+    @get_user_share.expression
+    def get_user_share(cls):
+        return cls.user_share_amount
     
+    @hybrid_method
     def get_members_total_share(self):
         """Get combined share of all assigned members"""
         if self.is_personal_transaction():
@@ -216,13 +287,23 @@ class Transaction(db.Model):
         else:
             cost_per_person = self.get_cost_per_person()
             return cost_per_person * len(self.members)
+
+    @get_members_total_share.expression
+    def get_members_total_share(cls):
+        # Member shares are whatever the User does not bear
+        return cls.amount - cls.user_share_amount
     
+    @hybrid_method
     def get_user_net_expense(self):
         """Get how much the User actually spent (amount paid - reimbursements from members)"""
         amount_paid = float(self.amount)  # User always pays the full amount
         members_owe = self.get_members_total_share()  # What members should pay back
         return amount_paid - members_owe
 
+    @get_user_net_expense.expression
+    def get_user_net_expense(cls):
+        return cls.amount - cls.get_members_total_share()
+
     # Data serialization from User's management perspective
     def to_dict(self):
         """Convert transaction to dictionary - shows User's expense tracking data"""
@@ -257,10 +338,44 @@ class Transaction(db.Model):
     def __repr__(self):
         return f'Transaction {self.transaction_id}: £{self.amount} ({self.transaction_type})'
 
+# SQLite full-text index over transaction descriptions. A regular (self-contained) FTS5 table
+# keyed by transaction_id: owner holds a 'u<user_id>' token so a search is narrowed to one user
+# inside the index, and prefix='2 3 4 5 6' turns autocomplete prefixes of up to six characters
+# into a single index lookup instead of a scan over every term they start.
+# Triggers keep it in step with every insert, update and delete, ORM or Core. Alembic batch
+# operations that recreate the transactions table drop these triggers and must recreate them.
+TRANSACTION_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5("
+    "description, owner, prefix='2 3 4 5 6', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions "
+    "WHEN new.description IS NOT NULL BEGIN "
+    "INSERT INTO transactions_fts(rowid, description, owner) "
+    "VALUES (new.transaction_id, new.description, 'u' || new.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions "
+    "WHEN old.description IS NOT NULL BEGIN "
+    "DELETE FROM transactions_fts WHERE rowid = old.transaction_id; END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, user_id ON transactions "
+    "BEGIN "
+    "DELETE FROM transactions_fts WHERE rowid = old.transaction_id; "
+    "INSERT INTO transactions_fts(rowid, description, owner) "
+    "SELECT new.transaction_id, new.description, 'u' || new.user_id WHERE new.description IS NOT NULL; END",
+)
+for statement in TRANSACTION_SEARCH_DDL:
+    event.listen(Transaction.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Transaction.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS transactions_fts').execute_if(dialect='sqlite'))
+
+
 class MembersTransaction(db.Model):
     __tablename__ = 'members_transaction'
     transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.transaction_id', ondelete='CASCADE'), primary_key=True)
     member_id = db.Column(db.Integer, db.ForeignKey('members.member_id', ondelete='CASCADE'), primary_key=True) # cascade will be triggered by sqlAlchemy when the parent will be deleted in the database
+    # Penny-exact part of the transaction amount borne by this member, kept by TransactionService.update_shares
+    share_amount = db.Column(db.Numeric(8, 2), nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_members_transaction_member_id', 'member_id'),
+    )
 
     # Relationships
     transaction = db.relationship('Transaction', back_populates='members')
@@ -271,12 +386,53 @@ class MembersTransaction(db.Model):
         return {
             'transaction_id': self.transaction_id,
             'member_id': self.member_id,
-            'member_name': self.member.name if self.member else None
+            'member_name': self.member.name if self.member else None,
+            'share_amount': float(self.share_amount or 0)
         }
 
     def __repr__(self):
         return f'MembersTransaction {self.member_id}-{self.transaction_id}'
 
+# Free-form labels on top of the fixed categories. Tag filters and per-tag totals are served
+# from in-memory bitsets (see TagBitmaps in app/columnar.py); these tables are the record.
+class Tag(db.Model):
+    """A user's transaction label, stored as normalize_tag() gives it"""
+    __tablename__ = 'tags'
+    tag_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(32), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'name', name='uq_tags_user_name'),
+    )
+
+    # Relationships
+    links = db.relationship('TransactionTag', back_populates='tag', cascade='all, delete-orphan')
+
+    def to_dict(self):
+        return {'tag_id': self.tag_id, 'name': self.name}
+
+    def __repr__(self):
+        return f'Tag {self.name}'
+
+
+class TransactionTag(db.Model):
+    __tablename__ = 'transaction_tags'
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.transaction_id', ondelete='CASCADE'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tags.tag_id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        # Covers loading a user's links through their tags (tag filters' bitset build)
+        db.Index('ix_transaction_tags_tag_id', 'tag_id', 'transaction_id'),
+    )
+
+    # Relationships
+    transaction = db.relationship('Transaction', back_populates='tags')
+    tag = db.relationship('Tag', back_populates='links')
+
+    def __repr__(self):
+        return f'TransactionTag {self.tag_id}-{self.transaction_id}'
+
 class Budget(db.Model):
     __tablename__ = 'budgets'
     
@@ -413,3 +569,141 @@ class Budget(db.Model):
         owner = "User" if self.is_user_budget() else f"Member-{self.member_id}" if self.member_id else "Unknown"
         category = self.category.category_name if self.category else 'Total Expenses'
         return f'Budget {owner} - {category}: £{self.budget_amount}'
+
+# At most one active budget per (user, member, category) scope. NULLs never compare equal in a
+# unique index, so each key is folded to 0 (ids start at 1). BudgetService.upsert_budget writes
+# through this index with INSERT ... ON CONFLICT DO UPDATE, naming the same expressions.
+BUDGET_SCOPE_KEY = tuple(
+    func.coalesce(column, db.literal_column('0'))
+    for column in (Budget.user_id, Budget.member_id, Budget.category_id)
+)
+db.Index(
+    'uq_budgets_active_scope',
+    *BUDGET_SCOPE_KEY,
+    unique=True,
+    sqlite_where=Budget.is_active == True,
+    postgresql_where=Budget.is_active == True
+)
+
+# Prefix-sum ledger: one row per (user, type, category, day) with activity, holding that day's
+# total and the running total up to and including it, both in integer pence. Any date-range
+# sum is then two point lookups. Rows are maintained by the flush hook in app/listeners.py.
+class DailyCumulative(db.Model):
+    __tablename__ = 'daily_cumulative'
+
+    UNCATEGORIZED = 0    # category_key for transactions without a category
+    ALL_CATEGORIES = -1  # category_key of the series summed over every category
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    transaction_type = db.Column(db.String(10), primary_key=True)
+    category_key = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    day_amount = db.Column(db.BigInteger, nullable=False, default=0)
+    cumulative_amount = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'DailyCumulative {self.user_id}/{self.transaction_type}/{self.category_key} {self.day}: {self.cumulative_amount}p'
+
+
+class BudgetSnapshot(db.Model):
+    """An active budget's amount as it stood when a month closed (see BudgetSnapshotService)"""
+    __tablename__ = 'budget_snapshots'
+
+    snapshot_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    budget_id = db.Column(db.Integer, db.ForeignKey('budgets.budget_id', ondelete='SET NULL'), nullable=True)  # kept after the budget is deleted
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)  # owner, also for member budgets
+    member_id = db.Column(db.Integer, db.ForeignKey('members.member_id', ondelete='CASCADE'), nullable=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id', ondelete='SET NULL'), nullable=True)  # NULL: total expenses
+    year_month = db.Column(db.Integer, nullable=False)  # YYYYMM of the closed month
+    budget_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    captured_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        db.UniqueConstraint('budget_id', 'year_month', name='uq_budget_snapshots_budget_month'),
+        db.Index('ix_budget_snapshots_user_month', 'user_id', 'year_month'),
+    )
+
+    def __repr__(self):
+        return f'BudgetSnapshot {self.budget_id} {self.year_month}: £{self.budget_amount}'
+
+
+class IdempotencyKey(db.Model):
+    """A client-supplied request key and the row its first request created (see IdempotencyService)"""
+    __tablename__ = 'idempotency_keys'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    endpoint = db.Column(db.String(32), primary_key=True)  # keys are scoped per endpoint
+    key = db.Column(db.String(64), primary_key=True)
+    resource_id = db.Column(db.Integer, nullable=False)  # e.g. the transaction_id created
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # purged by `flask idempotency purge`
+
+    def __repr__(self):
+        return f'IdempotencyKey {self.user_id}/{self.endpoint}/{self.key} -> {self.resource_id}'
+
+
+class RecurringRule(db.Model):
+    """A transaction entered on a schedule by RecurringService.materialize (rent, salary, subscriptions)"""
+    __tablename__ = 'recurring_rules'
+
+    INTERVAL_UNITS = ('day', 'week', 'month', 'year')
+
+    rule_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id', ondelete='SET NULL'), nullable=True)
+    transaction_type = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
+    amount = db.Column(db.Numeric(8, 2), nullable=False)
+    description = db.Column(db.String(255), nullable=True)
+    user_participates = db.Column(db.Boolean, nullable=False, default=True)
+    # Occurrence n falls on recurrence_date(anchor_date, interval_unit, interval_count, n)
+    interval_unit = db.Column(db.String(5), nullable=False)
+    interval_count = db.Column(db.Integer, nullable=False, default=1)
+    anchor_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=True)  # last day an occurrence may fall on
+    # Occurrences the materializer has passed, and the date of the next one (NULL once the rule
+    # has ended); due rules are found through the next_date index
+    occurrence_count = db.Column(db.Integer, nullable=False, default=0)
+    next_date = db.Column(db.Date, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+    # Relationships
+    category = db.relationship('Category')
+    members = db.relationship('RecurringRuleMember', cascade='all, delete-orphan')
+    occurrences = db.relationship('RecurringOccurrence', cascade='all, delete-orphan')
+
+    def to_dict(self):
+        return {
+            'rule_id': self.rule_id,
+            'type': self.transaction_type,
+            'amount': float(self.amount),
+            'category': self.category.category_name if self.category else None,
+            'description': self.description,
+            'interval_unit': self.interval_unit,
+            'interval_count': self.interval_count,
+            'anchor_date': self.anchor_date.isoformat(),
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'next_date': self.next_date.isoformat() if self.next_date else None,
+            'member_ids': sorted(link.member_id for link in self.members),
+            'user_participates': self.user_participates
+        }
+
+    def __repr__(self):
+        return f'RecurringRule {self.rule_id}: £{self.amount} every {self.interval_count} {self.interval_unit}'
+
+
+class RecurringRuleMember(db.Model):
+    """A member the occurrences of a recurring rule are split with"""
+    __tablename__ = 'recurring_rule_members'
+    rule_id = db.Column(db.Integer, db.ForeignKey('recurring_rules.rule_id', ondelete='CASCADE'), primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.member_id', ondelete='CASCADE'), primary_key=True)
+
+
+class RecurringOccurrence(db.Model):
+    """An occurrence a rule has entered; the key makes re-runs and overlapping runs enter it once"""
+    __tablename__ = 'recurring_occurrences'
+    rule_id = db.Column(db.Integer, db.ForeignKey('recurring_rules.rule_id', ondelete='CASCADE'), primary_key=True)
+    occurrence_date = db.Column(db.Date, primary_key=True)
+    # The transaction entered for it; deleting that transaction does not bring the occurrence back
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.transaction_id', ondelete='SET NULL'), nullable=True)
+
+    def __repr__(self):
+        return f'RecurringOccurrence {self.rule_id} {self.occurrence_date}'
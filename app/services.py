@@ -1,6 +1,22 @@
-from datetime import datetime, timedelta
+import re
+import threading
+from bisect import bisect_left
+from decimal import Decimal, ROUND_HALF_UP
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload, selectinload
 from . import db
-from .models import User, Category, Transaction, Member, Budget, MembersTransaction
+from .models import User, Category, Transaction, Member, Budget, MembersTransaction, DailyCumulative, BudgetSnapshot, BUDGET_SCOPE_KEY, IdempotencyKey, Tag, TransactionTag, RecurringRule, RecurringRuleMember, RecurringOccurrence
+from .utils import to_pence, allocate_pence, to_year_month, encode_cursor, decode_cursor, validate_transaction_amount, transaction_fingerprint, normalize_description, normalize_tag, merchant_name, recurrence_date
+from . import columnar
+from .columnar import ColumnarAnalytics
+from .events import event_hub, publish_bulk_change
+from .batcher import run_write
+from .importer import CategoryRules, StatementError
 
 class CategoryService:
     """Category management service"""
@@ -165,6 +181,131 @@ class TransactionService:
         TransactionService.add_member_to_transaction(transaction, member_id)
         return transaction
     
+    @staticmethod
+    def get_top_expenses_by_net_cost(user_id, year=None, limit=20):
+        """The user's expenses with the highest net cost to them, ranked in the database"""
+        query = Transaction.query.filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        )
+        if year is not None:
+            query = query.filter(Transaction.year == year)
+        return query.order_by(
+            Transaction.get_user_net_expense().desc(), Transaction.transaction_date.desc()
+        ).limit(limit).all()
+
+    @staticmethod
+    def set_members(transaction, member_ids):
+        """Link exactly member_ids to transaction, adding and removing only the links that change
+
+        Unchanged links are left alone, so the flush hooks re-split shares and publish a
+        change only when the participants (or the amount/participation) really changed.
+        Returns (added, removed) member id sets.
+        """
+        wanted = {int(member_id) for member_id in member_ids}
+        current = {link.member_id: link for link in transaction.members}
+        added = wanted - set(current)
+        removed = set(current) - wanted
+
+        for member_id in removed:
+            # Delete explicitly: orphans found during the flush never reach session.deleted,
+            # which is where the share and event hooks look
+            transaction.members.remove(current[member_id])
+            db.session.delete(current[member_id])
+        for member_id in sorted(added):
+            transaction.members.append(MembersTransaction(member_id=member_id))
+        return added, removed
+
+    @staticmethod
+    def split_shares(amount, member_count, user_participates):
+        """(user pence, [member pence]) for a transaction, mirroring get_user_share/get_cost_per_person
+
+        The User (when participating) comes first, then members in member_id order,
+        so the leftover pence of an uneven split go to them in that order.
+        """
+        pence = to_pence(amount)
+        if member_count == 0:
+            return pence, []
+        parts = allocate_pence(pence, member_count + (1 if user_participates else 0))
+        if user_participates:
+            return parts[0], parts[1:]
+        return 0, parts
+
+    @staticmethod
+    def update_shares(connection, transaction_ids):
+        """Recompute stored user_share_amount/share_amount of transactions on connection
+
+        Returns {transaction_id: (user share, {member_id: share})} in pounds (Decimal).
+        """
+        transaction_ids = list(set(transaction_ids))
+        if not transaction_ids:
+            return {}
+        transactions = Transaction.__table__
+        links = MembersTransaction.__table__
+
+        member_ids = {}
+        for transaction_id, member_id in connection.execute(
+            db.select(links.c.transaction_id, links.c.member_id)
+            .where(links.c.transaction_id.in_(transaction_ids))
+            .order_by(links.c.transaction_id, links.c.member_id)
+        ):
+            member_ids.setdefault(transaction_id, []).append(member_id)
+
+        shares = {}
+        for transaction_id, amount, user_participates in connection.execute(
+            db.select(transactions.c.transaction_id, transactions.c.amount, transactions.c.user_participates)
+            .where(transactions.c.transaction_id.in_(transaction_ids))
+        ):
+            members = member_ids.get(transaction_id, [])
+            user_pence, member_pence = TransactionService.split_shares(amount, len(members), user_participates)
+            shares[transaction_id] = (
+                Decimal(user_pence) / 100,
+                {member_id: Decimal(pence) / 100 for member_id, pence in zip(members, member_pence)}
+            )
+
+        if shares:
+            connection.execute(
+                transactions.update()
+                .where(transactions.c.transaction_id == db.bindparam('row_transaction_id'))
+                .values(user_share_amount=db.bindparam('row_share')),
+                [{'row_transaction_id': transaction_id, 'row_share': user_share}
+                 for transaction_id, (user_share, _) in shares.items()]
+            )
+        member_rows = [{'row_transaction_id': transaction_id, 'row_member_id': member_id, 'row_share': share}
+                       for transaction_id, (_, member_shares) in shares.items()
+                       for member_id, share in member_shares.items()]
+        if member_rows:
+            connection.execute(
+                links.update()
+                .where(links.c.transaction_id == db.bindparam('row_transaction_id'),
+                       links.c.member_id == db.bindparam('row_member_id'))
+                .values(share_amount=db.bindparam('row_share')),
+                member_rows
+            )
+        return shares
+
+    @staticmethod
+    def update_fingerprints(connection, transaction_ids):
+        """Recompute the stored duplicate fingerprint of transactions on connection"""
+        transactions = Transaction.__table__
+        rows = [{'row_transaction_id': transaction_id,
+                 'row_fingerprint': transaction_fingerprint(transaction_type, transaction_date, amount,
+                                                            category_id, description)}
+                for transaction_id, transaction_type, transaction_date, amount, category_id, description
+                in connection.execute(
+                    db.select(transactions.c.transaction_id, transactions.c.transaction_type,
+                              transactions.c.transaction_date, transactions.c.amount,
+                              transactions.c.category_id, transactions.c.description)
+                    .where(transactions.c.transaction_id.in_(list(transaction_ids)))
+                )]
+        if rows:
+            connection.execute(
+                transactions.update()
+                .where(transactions.c.transaction_id == db.bindparam('row_transaction_id'))
+                .values(fingerprint=db.bindparam('row_fingerprint')),
+                rows
+            )
+
     @staticmethod
     def add_member_to_transaction(transaction, member_id):
         member_transaction = MembersTransaction(
@@ -223,41 +364,83 @@ class SimpleAnalyticsService:
         else:
             end_date = datetime(year, month + 1, 1)
         
-        monthly_income = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_type == 'income',
-            Transaction.transaction_date >= start_date,
-            Transaction.transaction_date < end_date
-        ).scalar() or 0
-        
-        monthly_expenses = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_type == 'expense',
-            Transaction.transaction_date >= start_date,
-            Transaction.transaction_date < end_date
-        ).scalar() or 0
+        # Two point lookups per type on the prefix-sum ledger instead of a range scan
+        monthly_income = LedgerService.get_range_total(user_id, start_date, end_date, 'income')
+        monthly_expenses = LedgerService.get_range_total(user_id, start_date, end_date, 'expense')
         
         return {
-            'income': float(monthly_income),
-            'expenses': float(monthly_expenses),
-            'balance': float(monthly_income) - float(monthly_expenses)
+            'income': monthly_income,
+            'expenses': monthly_expenses,
+            'balance': monthly_income - monthly_expenses
         }
     
     @staticmethod
-    def get_total_income(user_id):
-        total = db.session.query(db.func.sum(Transaction.amount)).filter(
+    def get_monthly_series(user_id, start_date, end_date):
+        """Income and expenses per calendar month in [start_date, end_date) from one grouped query"""
+        rows = db.session.query(
+            Transaction.year_month, Transaction.transaction_type, db.func.sum(Transaction.amount)
+        ).filter(
             Transaction.user_id == user_id,
-            Transaction.transaction_type == 'income'
-        ).scalar() or 0
-        return float(total)
+            Transaction.transaction_date >= start_date,
+            Transaction.transaction_date < end_date
+        ).group_by(Transaction.year_month, Transaction.transaction_type).all()
+
+        series = {}
+        for year_month, transaction_type, total in rows:
+            totals = series.setdefault(divmod(year_month, 100), {'income': 0.0, 'expenses': 0.0})
+            if transaction_type == 'income':
+                totals['income'] += float(total or 0)
+            elif transaction_type == 'expense':
+                totals['expenses'] += float(total or 0)
+        return series
+
+    @staticmethod
+    def get_available_years(user_id):
+        """Years with at least one transaction, oldest first (served by ix_transactions_user_year)"""
+        rows = db.session.query(Transaction.year).filter(
+            Transaction.user_id == user_id
+        ).distinct().order_by(Transaction.year).all()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def get_available_months(user_id):
+        """(year, month) pairs with at least one transaction, oldest first"""
+        rows = db.session.query(Transaction.year_month).filter(
+            Transaction.user_id == user_id
+        ).distinct().order_by(Transaction.year_month).all()
+        return [divmod(row[0], 100) for row in rows]
+
+    @staticmethod
+    def get_yearly_totals(user_id):
+        """Income, expenses and balance per year with activity, from one grouped query"""
+        rows = db.session.query(
+            Transaction.year, Transaction.transaction_type, db.func.sum(Transaction.amount)
+        ).filter(
+            Transaction.user_id == user_id
+        ).group_by(Transaction.year, Transaction.transaction_type).all()
+
+        totals = {}
+        for year, transaction_type, total in rows:
+            year_totals = totals.setdefault(year, {'year': year, 'income': 0.0, 'expenses': 0.0})
+            if transaction_type == 'income':
+                year_totals['income'] += float(total or 0)
+            elif transaction_type == 'expense':
+                year_totals['expenses'] += float(total or 0)
+
+        yearly_data = []
+        for year in sorted(totals):
+            year_totals = totals[year]
+            year_totals['balance'] = year_totals['income'] - year_totals['expenses']
+            yearly_data.append(year_totals)
+        return yearly_data
+
+    @staticmethod
+    def get_total_income(user_id):
+        return LedgerService.get_cumulative(user_id, 'income', date.max) / 100
     
     @staticmethod
     def get_total_expenses(user_id):
-        total = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_type == 'expense'
-        ).scalar() or 0
-        return float(total)
+        return LedgerService.get_cumulative(user_id, 'expense', date.max) / 100
     
     @staticmethod
     def get_monthly_spending_by_category(user_id, year, month):
@@ -418,49 +601,60 @@ class BudgetService:
         return alerts
     
     @staticmethod
-    def create_or_update_budget(user_id, budget_amount, category_id=None):
-        existing_budget = Budget.query.filter_by(
-            user_id=user_id,
-            category_id=category_id,
-            is_active=True
-        ).first()
-        
-        if existing_budget:
-            existing_budget.budget_amount = budget_amount
-            existing_budget.updated_at = datetime.now()
-        else:
-            budget = Budget(
-                user_id=user_id,
-                budget_amount=budget_amount,
-                category_id=category_id,
-                is_active=True
-            )
-            db.session.add(budget)
-        
-        db.session.commit()
+    def upsert_budget(budget_amount, user_id=None, member_id=None, category_id=None,
+                      alert_threshold=None, notifications_enabled=None):
+        """Create the active budget for a (user, member, category) scope, or update it
+
+        On SQLite and PostgreSQL this is a single INSERT ... ON CONFLICT DO UPDATE against
+        the uq_budgets_active_scope partial index, so concurrent submits cannot create
+        duplicate active budgets. alert_threshold/notifications_enabled are only changed
+        on an existing budget when given. Returns the budget_id.
+        """
+        values = {'user_id': user_id, 'member_id': member_id, 'category_id': category_id,
+                  'budget_amount': budget_amount}
+        updates = {'budget_amount': budget_amount, 'updated_at': datetime.now()}
+        for name, value in (('alert_threshold', alert_threshold), ('notifications_enabled', notifications_enabled)):
+            if value is not None:
+                values[name] = updates[name] = value
+
+        dialect = db.session.get_bind().dialect.name
+        if dialect not in ('sqlite', 'postgresql'):
+            budget = Budget.query.filter_by(user_id=user_id, member_id=member_id,
+                                            category_id=category_id, is_active=True).first()
+            if budget:
+                for name, value in updates.items():
+                    setattr(budget, name, value)
+            else:
+                budget = Budget(**values)
+                db.session.add(budget)
+            db.session.commit()
+            return budget.budget_id
+
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        statement = insert(Budget).values(**values).on_conflict_do_update(
+            index_elements=list(BUDGET_SCOPE_KEY),
+            index_where=Budget.is_active == True,
+            set_=updates
+        ).returning(Budget.budget_id)
+        budget_id = run_write(lambda session: session.execute(statement).scalar_one())
+
+        # Core writes bypass the session hooks that announce budget changes
+        owner_id = user_id if user_id is not None else db.session.query(Member.user_id).filter(
+            Member.member_id == member_id
+        ).scalar()
+        if owner_id is not None:
+            publish_bulk_change(owner_id, ['budgets'])
+        return budget_id
+
+    @staticmethod
+    def create_or_update_budget(user_id, budget_amount, category_id=None, alert_threshold=None):
+        BudgetService.upsert_budget(budget_amount, user_id=user_id, category_id=category_id,
+                                    alert_threshold=alert_threshold)
         return True
     
     @staticmethod
-    def create_or_update_total_budget(user_id, budget_amount):
-        existing_budget = Budget.query.filter_by(
-            user_id=user_id,
-            category_id=None,
-            is_active=True
-        ).first()
-        
-        if existing_budget:
-            existing_budget.budget_amount = budget_amount
-            existing_budget.updated_at = datetime.now()
-        else:
-            budget = Budget(
-                user_id=user_id,
-                budget_amount=budget_amount,
-                category_id=None,
-                is_active=True
-            )
-            db.session.add(budget)
-        
-        db.session.commit()
+    def create_or_update_total_budget(user_id, budget_amount, alert_threshold=None):
+        BudgetService.upsert_budget(budget_amount, user_id=user_id, alert_threshold=alert_threshold)
         return True
     
     @staticmethod
@@ -509,6 +703,1054 @@ class BudgetService:
         }
 
 
+    @staticmethod
+    def get_member_budget_statuses(user_id, now=None):
+        """Alert status of every active member budget from each member's month-to-date shares
+
+        Shares come from one grouped query over the stored member shares of the current
+        month (indexed by user_id/year_month), split by member and category; a member's
+        total-expenses budget uses the sum over all categories. Highest usage first.
+        """
+        now = now or datetime.now()
+        budgets = Budget.query.options(
+            joinedload(Budget.member), joinedload(Budget.category)
+        ).join(Member, Budget.member_id == Member.member_id).filter(
+            Member.user_id == user_id,
+            Budget.is_active == True
+        ).all()
+        if not budgets:
+            return []
+
+        spent = {}  # (member_id, category_id) -> share
+        member_totals = {}  # member_id -> share over all categories
+        for member_id, category_id, total in db.session.query(
+            MembersTransaction.member_id,
+            Transaction.category_id,
+            db.func.sum(MembersTransaction.share_amount)
+        ).join(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.year_month == to_year_month(now),
+            MembersTransaction.member_id.in_({budget.member_id for budget in budgets})
+        ).group_by(MembersTransaction.member_id, Transaction.category_id):
+            amount = float(total or 0)
+            spent[(member_id, category_id)] = amount
+            member_totals[member_id] = member_totals.get(member_id, 0) + amount
+
+        statuses = []
+        for budget in budgets:
+            if budget.category_id is None:
+                member_spent = round(member_totals.get(budget.member_id, 0), 2)
+            else:
+                member_spent = round(spent.get((budget.member_id, budget.category_id), 0), 2)
+            statuses.append({
+                'budget_id': budget.budget_id,
+                'member_id': budget.member_id,
+                'member_name': budget.member.name,
+                'category_id': budget.category_id,
+                'category_name': budget.category.category_name if budget.category else 'Total Expenses',
+                'budget_amount': float(budget.budget_amount),
+                'spent': member_spent,
+                **budget.get_alert_status(member_spent)
+            })
+        statuses.sort(key=lambda status: status['percentage_used'], reverse=True)
+        return statuses
+
+class BudgetSnapshotService:
+    """Month-close budget snapshots and budget-vs-actual history"""
+
+    @staticmethod
+    def capture_month(year, month):
+        """Snapshot every active budget of every user for a closed month in one INSERT ... SELECT
+
+        Budgets already captured for that month are skipped, so the job can be re-run.
+        Returns the number of snapshots written.
+        """
+        year_month = to_year_month(date(year, month, 1))
+        budgets = Budget.__table__
+        members = Member.__table__
+        snapshots = BudgetSnapshot.__table__
+
+        already_captured = db.select(snapshots.c.snapshot_id).where(
+            snapshots.c.budget_id == budgets.c.budget_id,
+            snapshots.c.year_month == year_month
+        ).exists()
+        source = db.select(
+            budgets.c.budget_id,
+            db.func.coalesce(budgets.c.user_id, members.c.user_id),
+            budgets.c.member_id,
+            budgets.c.category_id,
+            db.literal(year_month),
+            budgets.c.budget_amount
+        ).select_from(
+            budgets.outerjoin(members, budgets.c.member_id == members.c.member_id)
+        ).where(
+            budgets.c.is_active == True,
+            db.func.coalesce(budgets.c.user_id, members.c.user_id).isnot(None),
+            ~already_captured
+        )
+
+        result = db.session.execute(snapshots.insert().from_select(
+            ['budget_id', 'user_id', 'member_id', 'category_id', 'year_month', 'budget_amount'], source
+        ))
+        db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def get_budget_history(user_id, months=12, now=None):
+        """Budget vs actual per category for the user's own budgets over the last `months` months
+
+        Snapshots are joined to monthly spend grouped by (year_month, category) in one
+        query; total-expenses budgets are matched against the month's overall spend.
+        Returns [{'category_id', 'category_name', 'months': [{'month', 'budget_amount',
+        'actual', 'percentage_used'}]}], months oldest first.
+        """
+        now = now or datetime.now()
+        first_year, first_month = AnalyticsBatchService.shift_month(now.year, now.month, -(months - 1))
+        first_bucket = to_year_month(date(first_year, first_month, 1))
+        last_bucket = to_year_month(now)
+
+        in_window = db.and_(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.year_month.between(first_bucket, last_bucket)
+        )
+        # Category -1 carries each month's spend over all categories, for total budgets
+        spend = db.union_all(
+            db.select(Transaction.year_month, Transaction.category_id.label('category_key'),
+                      db.func.sum(Transaction.amount).label('actual'))
+            .where(in_window, Transaction.category_id.isnot(None))
+            .group_by(Transaction.year_month, Transaction.category_id),
+            db.select(Transaction.year_month, db.literal(-1).label('category_key'),
+                      db.func.sum(Transaction.amount).label('actual'))
+            .where(in_window)
+            .group_by(Transaction.year_month)
+        ).subquery()
+
+        rows = db.session.execute(db.select(
+            BudgetSnapshot.category_id,
+            Category.category_name,
+            BudgetSnapshot.year_month,
+            db.func.sum(BudgetSnapshot.budget_amount),
+            spend.c.actual
+        ).outerjoin(
+            Category, Category.category_id == BudgetSnapshot.category_id
+        ).outerjoin(spend, db.and_(
+            spend.c.year_month == BudgetSnapshot.year_month,
+            spend.c.category_key == db.func.coalesce(BudgetSnapshot.category_id, -1)
+        )).where(
+            BudgetSnapshot.user_id == user_id,
+            BudgetSnapshot.member_id.is_(None),
+            BudgetSnapshot.year_month.between(first_bucket, last_bucket)
+        ).group_by(
+            BudgetSnapshot.category_id, Category.category_name, BudgetSnapshot.year_month, spend.c.actual
+        ).order_by(BudgetSnapshot.year_month)).all()
+
+        history = {}
+        for category_id, category_name, year_month, budget_amount, actual in rows:
+            entry = history.setdefault(category_id, {
+                'category_id': category_id,
+                'category_name': category_name or 'Total Expenses',
+                'months': []
+            })
+            year, month = divmod(year_month, 100)
+            budget_amount = float(budget_amount)
+            actual = float(actual or 0)
+            entry['months'].append({
+                'month': f'{year:04d}-{month:02d}',
+                'budget_amount': budget_amount,
+                'actual': actual,
+                'percentage_used': round(actual / budget_amount * 100, 2) if budget_amount > 0 else 0
+            })
+        return sorted(history.values(), key=lambda entry: (entry['category_id'] is not None, entry['category_name']))
+
+class IdempotencyService:
+    """Replay-safe creation: one row per client-supplied Idempotency-Key"""
+
+    MAX_KEY_LENGTH = 64
+
+    @staticmethod
+    def request_key(request):
+        """Idempotency-Key header or idempotency_key form field, None when absent
+
+        Raises ValueError for keys longer than MAX_KEY_LENGTH.
+        """
+        key = (request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or '').strip()
+        if len(key) > IdempotencyService.MAX_KEY_LENGTH:
+            raise ValueError(f'Idempotency key must be at most {IdempotencyService.MAX_KEY_LENGTH} characters.')
+        return key or None
+
+    @staticmethod
+    def run_once(user_id, endpoint, key, create):
+        """Run create(session) -> resource id once per (user, endpoint, key) until the key expires
+
+        The key row is inserted in the same transaction as the created rows (through
+        run_write), so a concurrent duplicate fails on the primary key and is answered
+        from the winner's row. Returns (resource_id, replayed).
+        """
+        if key is None:
+            return run_write(create), False
+
+        def write(session):
+            now = datetime.now()
+            record = session.get(IdempotencyKey, (user_id, endpoint, key))
+            if record is not None:
+                if record.expires_at > now:
+                    return record.resource_id, True
+                session.delete(record)
+                session.flush()
+
+            resource_id = create(session)
+            ttl = timedelta(hours=current_app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+            session.add(IdempotencyKey(user_id=user_id, endpoint=endpoint, key=key,
+                                       resource_id=resource_id, expires_at=now + ttl))
+            session.flush()
+            return resource_id, False
+
+        try:
+            return run_write(write)
+        except IntegrityError:
+            db.session.rollback()
+            record = db.session.get(IdempotencyKey, (user_id, endpoint, key))
+            if record is None:
+                raise
+            return record.resource_id, True
+
+    @staticmethod
+    def purge_expired(now=None):
+        """Delete expired keys; returns how many were removed"""
+        result = db.session.execute(
+            db.delete(IdempotencyKey).where(IdempotencyKey.expires_at <= (now or datetime.now()))
+        )
+        db.session.commit()
+        return result.rowcount
+
+class BulkTransactionService:
+    """Set-based delete/recategorize/redate/member assignment of many transactions"""
+
+    ACTIONS = ('delete', 'recategorize', 'set_date', 'assign_members')
+    FILTER_KEYS = ('transaction_type', 'category_id', 'start', 'end', 'min_amount', 'max_amount', 'member_id')
+    MAX_IDS = 1000
+    CHUNK_SIZE = 500  # ids per statement, well under SQLite's bound-parameter limit
+
+    @staticmethod
+    def selection(user_id, ids=None, filters=None):
+        """WHERE clause for the user's transactions picked by explicit ids or a filter dict
+
+        Filters: transaction_type, category_id (null: uncategorized), start/end
+        (YYYY-MM-DD, both inclusive), min_amount, max_amount, member_id.
+        Raises ValueError for a missing, oversized or malformed selection.
+        """
+        clauses = [Transaction.user_id == user_id]
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                raise ValueError('ids must be a non-empty list.')
+            if len(ids) > BulkTransactionService.MAX_IDS:
+                raise ValueError(f'At most {BulkTransactionService.MAX_IDS} ids per request.')
+            clauses.append(Transaction.transaction_id.in_([int(transaction_id) for transaction_id in ids]))
+            return db.and_(*clauses)
+
+        if not isinstance(filters, dict) or not filters:
+            raise ValueError('Provide ids or a non-empty filter.')
+        unknown = set(filters) - set(BulkTransactionService.FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))}.")
+
+        if 'transaction_type' in filters:
+            clauses.append(Transaction.transaction_type == filters['transaction_type'])
+        if 'category_id' in filters:
+            category_id = filters['category_id']
+            clauses.append(Transaction.category_id.is_(None) if category_id is None
+                           else Transaction.category_id == int(category_id))
+        if filters.get('start'):
+            clauses.append(Transaction.transaction_date >= datetime.strptime(filters['start'], '%Y-%m-%d'))
+        if filters.get('end'):
+            clauses.append(Transaction.transaction_date
+                           < datetime.strptime(filters['end'], '%Y-%m-%d') + timedelta(days=1))
+        if filters.get('min_amount') is not None:
+            clauses.append(Transaction.amount >= Decimal(str(filters['min_amount'])))
+        if filters.get('max_amount') is not None:
+            clauses.append(Transaction.amount <= Decimal(str(filters['max_amount'])))
+        if filters.get('member_id') is not None:
+            clauses.append(Transaction.members.any(MembersTransaction.member_id == int(filters['member_id'])))
+        return db.and_(*clauses)
+
+    @staticmethod
+    def apply(session, user_id, action, where, category_id=None, new_date=None, member_ids=None):
+        """Run action on the transactions matching where on session, without committing
+
+        Ledger rows, stored shares and member links are adjusted on the same
+        connection. Returns the number of transactions affected; callers publish
+        the change once committed (see run()).
+        """
+        if action not in BulkTransactionService.ACTIONS:
+            raise ValueError(f"action must be one of: {', '.join(BulkTransactionService.ACTIONS)}.")
+        if action == 'recategorize':
+            if category_id is not None and session.query(Category.category_id).filter(
+                Category.category_id == category_id,
+                db.or_(Category.user_id.is_(None), Category.user_id == user_id)
+            ).first() is None:
+                raise ValueError('Unknown category.')
+        elif action == 'set_date':
+            if new_date is None:
+                raise ValueError('date is required.')
+        elif action == 'assign_members':
+            member_ids = sorted({int(member_id) for member_id in member_ids or []})
+            owned = {member_id for (member_id,) in session.query(Member.member_id).filter(
+                Member.user_id == user_id, Member.member_id.in_(member_ids))}
+            if owned != set(member_ids):
+                raise ValueError('Unknown member.')
+            # Only expenses are split between participants
+            where = db.and_(where, Transaction.transaction_type == 'expense')
+
+        connection = session.connection()
+        transactions = Transaction.__table__
+        links = MembersTransaction.__table__
+        tag_links = TransactionTag.__table__
+        occurrences = RecurringOccurrence.__table__
+        ids = [transaction_id for (transaction_id,) in connection.execute(
+            db.select(transactions.c.transaction_id).where(where).order_by(transactions.c.transaction_id)
+        )]
+
+        deltas = {}
+        for start in range(0, len(ids), BulkTransactionService.CHUNK_SIZE):
+            chunk = ids[start:start + BulkTransactionService.CHUNK_SIZE]
+            in_chunk = transactions.c.transaction_id.in_(chunk)
+
+            if action == 'assign_members':
+                BulkTransactionService._replace_members(connection, chunk, member_ids)
+                TransactionService.update_shares(connection, chunk)
+                continue
+
+            for key, pence in LedgerService.transaction_totals(connection, in_chunk).items():
+                deltas[key] = deltas.get(key, 0) - pence
+            if action == 'delete':
+                # Foreign keys are not enforced on SQLite, and a freed id can be reused by the next insert
+                connection.execute(links.delete().where(links.c.transaction_id.in_(chunk)))
+                connection.execute(tag_links.delete().where(tag_links.c.transaction_id.in_(chunk)))
+                connection.execute(occurrences.update().where(occurrences.c.transaction_id.in_(chunk))
+                                   .values(transaction_id=None))
+                connection.execute(transactions.delete().where(in_chunk))
+                continue
+
+            if action == 'recategorize':
+                values = {'category_id': category_id}
+            else:
+                # Core updates skip the ORM validator that keeps the date buckets in step
+                transaction_date = datetime.combine(new_date, datetime.min.time())
+                values = {'transaction_date': transaction_date, 'year': transaction_date.year,
+                          'year_month': to_year_month(transaction_date)}
+            connection.execute(transactions.update().where(in_chunk).values(**values))
+            TransactionService.update_fingerprints(connection, chunk)
+            for key, pence in LedgerService.transaction_totals(connection, in_chunk).items():
+                deltas[key] = deltas.get(key, 0) + pence
+
+        LedgerService.apply_deltas(connection, {key: pence for key, pence in deltas.items() if pence})
+        return len(ids)
+
+    @staticmethod
+    def _replace_members(connection, transaction_ids, member_ids):
+        """Make member_ids the exact participant set of each transaction, touching only changed links"""
+        links = MembersTransaction.__table__
+        existing = {(row.transaction_id, row.member_id) for row in connection.execute(
+            db.select(links.c.transaction_id, links.c.member_id).where(links.c.transaction_id.in_(transaction_ids))
+        )}
+        wanted = {(transaction_id, member_id) for transaction_id in transaction_ids for member_id in member_ids}
+
+        stale = existing - wanted
+        if stale:
+            connection.execute(links.delete().where(
+                links.c.transaction_id.in_(transaction_ids),
+                links.c.member_id.notin_(member_ids) if member_ids else db.true()
+            ))
+        missing = wanted - existing
+        if missing:
+            connection.execute(links.insert(), [{'transaction_id': transaction_id, 'member_id': member_id}
+                                                for transaction_id, member_id in sorted(missing)])
+
+    @staticmethod
+    def run(user_id, action, where, idempotency_key=None, **params):
+        """apply() in its own committed write; returns (affected, replayed)"""
+        affected, replayed = IdempotencyService.run_once(
+            user_id, 'bulk_transactions', idempotency_key,
+            lambda session: BulkTransactionService.apply(session, user_id, action, where, **params)
+        )
+        if not replayed and affected:
+            # Core writes bypass the session hooks that announce changes
+            publish_bulk_change(user_id, ['transactions'])
+        return affected, replayed
+
+class DuplicateService:
+    """Exact (same fingerprint) and near (same amount within a few days) duplicate transactions"""
+
+    WINDOW_DAYS = 3
+
+    @staticmethod
+    def day_gap(later_day, earlier_day):
+        """SQL whole-day difference of two day_expression() values"""
+        if db.session.get_bind().dialect.name == 'sqlite':
+            return db.func.julianday(later_day) - db.func.julianday(earlier_day)
+        return later_day - earlier_day
+
+    @staticmethod
+    def find_near_duplicates(user_id, window_days=WINDOW_DAYS, limit=100):
+        """Transactions with an earlier one of the same type and amount at most window_days before
+
+        One sorted pass in SQL: LAG() over (type, amount) ordered by date pairs each
+        row with its closest earlier namesake, so a run of repeats shows up as a chain.
+        Newest first; exact marks pairs with the same fingerprint.
+        """
+        day = LedgerService.day_expression()
+        window = {'partition_by': (Transaction.transaction_type, Transaction.amount),
+                  'order_by': (Transaction.transaction_date, Transaction.transaction_id)}
+        ordered = db.select(
+            Transaction.transaction_id, Transaction.transaction_type, Transaction.amount,
+            Transaction.fingerprint, day.label('day'),
+            db.func.lag(Transaction.transaction_id).over(**window).label('previous_id'),
+            db.func.lag(day).over(**window).label('previous_day'),
+            db.func.lag(Transaction.fingerprint).over(**window).label('previous_fingerprint')
+        ).where(Transaction.user_id == user_id).subquery()
+        gap = DuplicateService.day_gap(ordered.c.day, ordered.c.previous_day)
+
+        rows = db.session.execute(
+            db.select(ordered.c.transaction_id, ordered.c.previous_id, ordered.c.transaction_type,
+                      ordered.c.amount, ordered.c.day, gap.label('gap'),
+                      ordered.c.fingerprint == ordered.c.previous_fingerprint)
+            .where(ordered.c.previous_id.isnot(None), gap <= window_days)
+            .order_by(ordered.c.day.desc(), ordered.c.transaction_id.desc())
+            .limit(limit)
+        )
+        return [{'transaction_id': transaction_id, 'duplicate_of': previous_id,
+                 'transaction_type': transaction_type, 'amount': float(amount), 'date': str(row_day),
+                 'days_apart': int(days_apart), 'exact': bool(exact)}
+                for transaction_id, previous_id, transaction_type, amount, row_day, days_apart, exact in rows]
+
+    @staticmethod
+    def match_batch(connection, user_id, rows, window_days=WINDOW_DAYS, max_transaction_id=None, consumed=None,
+                    stored_span=None):
+        """Match a batch of new transaction rows against the user's stored ones with one range query
+
+        rows are insert dicts carrying transaction_type, transaction_date, amount and
+        fingerprint. Each stored transaction absorbs at most one exact match (tracked
+        in consumed across batches), so genuine repeats beyond what is stored still
+        count as new. Only ids up to max_transaction_id are considered, to leave
+        out rows inserted by the same import; stored_span, the (first, last) date
+        of those rows, narrows the range query so it does not walk them either.
+        Returns ({row index: stored id} for exact matches, {row index: stored id}
+        for the nearest same-amount row within window_days of the others).
+        """
+        if not rows:
+            return {}, {}
+        consumed = set() if consumed is None else consumed
+        window = timedelta(days=window_days)
+        start = min(row['transaction_date'] for row in rows) - window
+        end = max(row['transaction_date'] for row in rows) + window + timedelta(days=1)
+        if stored_span is not None:
+            start, end = max(start, stored_span[0]), min(end, stored_span[1] + timedelta(days=1))
+            if start >= end:
+                return {}, {}
+        transactions = Transaction.__table__
+        query = db.select(transactions.c.transaction_id, transactions.c.transaction_type,
+                          transactions.c.transaction_date, transactions.c.amount, transactions.c.fingerprint
+                          ).where(
+            transactions.c.user_id == user_id,
+            transactions.c.transaction_date >= start,
+            transactions.c.transaction_date < end
+        )
+        if max_transaction_id is not None:
+            query = query.where(transactions.c.transaction_id <= max_transaction_id)
+
+        by_fingerprint = {}
+        by_amount = {}
+        for transaction_id, transaction_type, transaction_date, amount, fingerprint in connection.execute(
+            query.order_by(transactions.c.transaction_id)
+        ):
+            if transaction_id not in consumed:
+                by_fingerprint.setdefault(fingerprint, []).append(transaction_id)
+            by_amount.setdefault((transaction_type, to_pence(amount)), []).append(
+                (transaction_date.date(), transaction_id))
+        for stored in by_amount.values():
+            stored.sort()
+
+        exact, near = {}, {}
+        for index, row in enumerate(rows):
+            candidates = by_fingerprint.get(row['fingerprint'])
+            if candidates:
+                exact[index] = candidates.pop(0)
+                consumed.add(exact[index])
+                continue
+            stored = by_amount.get((row['transaction_type'], to_pence(row['amount'])))
+            if not stored:
+                continue
+            day = row['transaction_date'].date()
+            position = bisect_left(stored, (day, 0))
+            neighbours = stored[max(position - 1, 0):position + 1]
+            closest_day, closest_id = min(neighbours, key=lambda item: abs((item[0] - day).days))
+            if abs((closest_day - day).days) <= window_days:
+                near[index] = closest_id
+        return exact, near
+
+class TransactionSearchService:
+    """Description search (FTS5 on SQLite), merchant autocomplete and top merchants"""
+
+    MAX_LIMIT = 100
+
+    @staticmethod
+    def match_expression(user_id, text):
+        """FTS5 query for text within one user's rows, the last word as a prefix; None without words
+
+        Words are quoted, so FTS5 operators typed by the user are searched as text.
+        """
+        words = re.findall(r'\w+', text.lower())
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return f'owner : "u{int(user_id)}" AND description : ({" ".join(terms)})'
+
+    @staticmethod
+    def search(user_id, text, limit=20):
+        """The user's transactions whose description matches text, best match first
+
+        Ranked by bm25 over the description (ties: newest first). Other databases
+        fall back to a substring match per word, newest first.
+        """
+        limit = min(max(int(limit), 1), TransactionSearchService.MAX_LIMIT)
+        if db.session.get_bind().dialect.name != 'sqlite':
+            words = re.findall(r'\w+', text)
+            if not words:
+                return []
+            query = db.select(Transaction.transaction_id).where(
+                Transaction.user_id == user_id,
+                *(Transaction.description.ilike(f'%{word}%') for word in words)
+            ).order_by(Transaction.transaction_date.desc()).limit(limit)
+            ids = [transaction_id for (transaction_id,) in db.session.execute(query)]
+        else:
+            expression = TransactionSearchService.match_expression(user_id, text)
+            if expression is None:
+                return []
+            ids = [transaction_id for (transaction_id,) in db.session.execute(db.text(
+                'SELECT transactions_fts.rowid FROM transactions_fts '
+                'JOIN transactions ON transactions.transaction_id = transactions_fts.rowid '
+                'WHERE transactions_fts MATCH :expression '
+                'ORDER BY bm25(transactions_fts, 1.0, 0.0), transactions.transaction_date DESC '
+                'LIMIT :limit'
+            ), {'expression': expression, 'limit': limit})]
+
+        rows = {transaction.transaction_id: transaction for transaction in
+                Transaction.query.options(joinedload(Transaction.category))
+                .filter(Transaction.transaction_id.in_(ids))} if ids else {}
+        return [{
+            'transaction_id': transaction_id,
+            'description': rows[transaction_id].description,
+            'merchant': rows[transaction_id].merchant,
+            'amount': float(rows[transaction_id].amount),
+            'transaction_type': rows[transaction_id].transaction_type,
+            'date': rows[transaction_id].transaction_date.strftime('%Y-%m-%d'),
+            'category': rows[transaction_id].category.category_name if rows[transaction_id].category else None
+        } for transaction_id in ids]
+
+    @staticmethod
+    def suggest_merchants(user_id, prefix, limit=10):
+        """Merchants starting with prefix, most used first: a range scan of the merchant index"""
+        prefix = normalize_description(prefix)
+        if not prefix:
+            return []
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        uses = db.func.count(Transaction.transaction_id)
+        rows = db.session.query(Transaction.merchant, uses).filter(
+            Transaction.user_id == user_id,
+            Transaction.merchant >= prefix,
+            Transaction.merchant < upper
+        ).group_by(Transaction.merchant).order_by(uses.desc(), Transaction.merchant).limit(
+            min(max(int(limit), 1), TransactionSearchService.MAX_LIMIT)
+        )
+        return [{'merchant': merchant, 'count': count} for merchant, count in rows]
+
+    @staticmethod
+    def top_merchants(user_id, start_date=None, end_date=None, transaction_type='expense', limit=10):
+        """Merchants by total amount over [start_date, end_date), from the covering merchant index"""
+        total = db.func.sum(Transaction.amount)
+        query = db.session.query(Transaction.merchant, db.func.count(Transaction.transaction_id), total).filter(
+            Transaction.user_id == user_id,
+            Transaction.merchant.isnot(None),
+            Transaction.transaction_type == transaction_type
+        )
+        if start_date is not None:
+            query = query.filter(Transaction.transaction_date >= start_date)
+        if end_date is not None:
+            query = query.filter(Transaction.transaction_date < end_date)
+        rows = query.group_by(Transaction.merchant).order_by(total.desc()).limit(
+            min(max(int(limit), 1), TransactionSearchService.MAX_LIMIT)
+        )
+        return [{'merchant': merchant, 'count': count, 'total': float(amount)} for merchant, count, amount in rows]
+
+class TagService:
+    """Free-form transaction tags: assignment, AND/OR/NOT filters and per-tag totals
+
+    With COLUMNAR_ANALYTICS on, filters and totals are bitset operations over the
+    cached snapshot (ColumnarAnalytics.get_tag_index); otherwise, and as the
+    reference, they are EXISTS subqueries on transaction_tags.
+    """
+
+    MAX_TAGS = 10     # per transaction
+    MAX_LIMIT = 500   # transaction ids returned by a filter
+
+    @staticmethod
+    def parse_names(value):
+        """Normalized, de-duplicated tag names from a comma-separated string or a list"""
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = value.split(',')
+        if not isinstance(value, (list, tuple)) or not all(isinstance(name, str) for name in value):
+            raise ValueError('tags must be a list of names or a comma-separated string.')
+        names = []
+        for name in map(normalize_tag, value):
+            if name and name not in names:
+                names.append(name)
+        return names
+
+    @staticmethod
+    def set_tags(session, transaction, names):
+        """Give transaction exactly the tags names (from parse_names), creating tags it lacks"""
+        if len(names) > TagService.MAX_TAGS:
+            raise ValueError(f'A transaction can have at most {TagService.MAX_TAGS} tags.')
+        tags = {tag.name: tag for tag in session.query(Tag).filter(
+            Tag.user_id == transaction.user_id, Tag.name.in_(names)
+        )} if names else {}
+        for name in names:
+            if name not in tags:
+                tags[name] = Tag(user_id=transaction.user_id, name=name)
+                session.add(tags[name])
+
+        wanted = {tags[name] for name in names}
+        for link in list(transaction.tags):
+            if link.tag not in wanted:
+                transaction.tags.remove(link)
+        present = {link.tag for link in transaction.tags}
+        for name in names:
+            if tags[name] not in present:
+                transaction.tags.append(TransactionTag(tag=tags[name]))
+        return names
+
+    @staticmethod
+    def get_tag_names(transaction):
+        return sorted(link.tag.name for link in transaction.tags)
+
+    @staticmethod
+    def list_tags(user_id):
+        """The user's tags with how many transactions carry each, by name"""
+        uses = db.func.count(TransactionTag.transaction_id)
+        rows = db.session.query(Tag.tag_id, Tag.name, uses).outerjoin(
+            TransactionTag, TransactionTag.tag_id == Tag.tag_id
+        ).filter(Tag.user_id == user_id).group_by(Tag.tag_id, Tag.name).order_by(Tag.name)
+        return [{'tag_id': tag_id, 'name': name, 'count': count} for tag_id, name, count in rows]
+
+    @staticmethod
+    def resolve(user_id, names):
+        """name -> tag_id of the user's tags among names"""
+        if not names:
+            return {}
+        return dict(db.session.query(Tag.name, Tag.tag_id).filter(Tag.user_id == user_id, Tag.name.in_(names)))
+
+    @staticmethod
+    def filter_transactions(user_id, all_tags=(), any_tags=(), none_tags=(), start_date=None, end_date=None,
+                            limit=50):
+        """Count, income, expenses and latest entered ids of the transactions matching a tag filter
+
+        A transaction matches when it has every all_tags tag, at least one of
+        any_tags (when given) and none of none_tags. Names the user has never
+        used match nothing in all_tags and any_tags and exclude nothing in none_tags.
+        """
+        limit = min(max(int(limit), 1), TagService.MAX_LIMIT)
+        tag_ids = TagService.resolve(user_id, set(all_tags) | set(any_tags) | set(none_tags))
+        if any(name not in tag_ids for name in all_tags) or (
+                any_tags and not any(name in tag_ids for name in any_tags)):
+            return {'count': 0, 'income': 0.0, 'expenses': 0.0, 'transaction_ids': []}
+        all_ids = [tag_ids[name] for name in all_tags]
+        any_ids = [tag_ids[name] for name in any_tags if name in tag_ids]
+        none_ids = [tag_ids[name] for name in none_tags if name in tag_ids]
+
+        if AnalyticsBatchService.use_columnar():
+            return ColumnarAnalytics.get_tag_selection(user_id, all_ids, any_ids, none_ids,
+                                                       start_date, end_date, limit)
+
+        conditions = [Transaction.user_id == user_id]
+        conditions += [Transaction.tags.any(TransactionTag.tag_id == tag_id) for tag_id in all_ids]
+        if any_ids:
+            conditions.append(Transaction.tags.any(TransactionTag.tag_id.in_(any_ids)))
+        if none_ids:
+            conditions.append(~Transaction.tags.any(TransactionTag.tag_id.in_(none_ids)))
+        if start_date is not None:
+            conditions.append(Transaction.transaction_date >= start_date)
+        if end_date is not None:
+            conditions.append(Transaction.transaction_date < end_date)
+
+        count, income, expenses = db.session.query(
+            db.func.count(Transaction.transaction_id),
+            db.func.sum(db.case((Transaction.transaction_type == 'income', Transaction.amount), else_=0)),
+            db.func.sum(db.case((Transaction.transaction_type == 'expense', Transaction.amount), else_=0))
+        ).filter(*conditions).one()
+        transaction_ids = [transaction_id for (transaction_id,) in db.session.query(
+            Transaction.transaction_id
+        ).filter(*conditions).order_by(Transaction.transaction_id.desc()).limit(limit)]
+        return {'count': count, 'income': float(income or 0), 'expenses': float(expenses or 0),
+                'transaction_ids': transaction_ids}
+
+    @staticmethod
+    def tag_totals(user_id, start_date=None, end_date=None):
+        """Per-tag count, income and expenses over [start_date, end_date), most spent first"""
+        names = dict(db.session.query(Tag.tag_id, Tag.name).filter(Tag.user_id == user_id))
+        if AnalyticsBatchService.use_columnar():
+            totals = ColumnarAnalytics.get_tag_totals(user_id, start_date, end_date)
+        else:
+            query = db.session.query(
+                TransactionTag.tag_id,
+                db.func.count(Transaction.transaction_id),
+                db.func.sum(db.case((Transaction.transaction_type == 'income', Transaction.amount), else_=0)),
+                db.func.sum(db.case((Transaction.transaction_type == 'expense', Transaction.amount), else_=0))
+            ).join(Transaction, Transaction.transaction_id == TransactionTag.transaction_id).filter(
+                Transaction.user_id == user_id
+            )
+            if start_date is not None:
+                query = query.filter(Transaction.transaction_date >= start_date)
+            if end_date is not None:
+                query = query.filter(Transaction.transaction_date < end_date)
+            totals = {tag_id: {'count': count, 'income': float(income or 0), 'expenses': float(expenses or 0)}
+                      for tag_id, count, income, expenses in query.group_by(TransactionTag.tag_id)}
+        rows = [{'tag': names[tag_id], **total} for tag_id, total in totals.items() if tag_id in names]
+        return sorted(rows, key=lambda row: (-row['expenses'], row['tag']))
+
+class StatementImportService:
+    """Bank statement (CSV/OFX/QIF) import: streamed, auto-categorized, de-duplicated, inserted in batches"""
+
+    BATCH_SIZE = 5000  # rows per executemany INSERT
+    MAX_AMOUNT = Decimal('999999.99')  # Numeric(8, 2)
+    MAX_ERRORS = 50  # row errors and possible duplicates echoed back; the rest are only counted
+    LEDGER_REBUILD_KEYS = 200  # more ledger days than this: rebuild the user's ledger instead
+
+    @staticmethod
+    def category_ids(session, user_id):
+        """{lowercase name: category_id} of the categories the user can pick, own ones first"""
+        categories = session.query(Category.category_name, Category.category_id).filter(
+            db.or_(Category.user_id.is_(None), Category.user_id == user_id)
+        ).order_by(Category.user_id.is_(None)).all()
+        ids = {}
+        for name, category_id in categories:
+            ids.setdefault(name.lower(), category_id)
+        return ids
+
+    @staticmethod
+    def import_rows(session, user_id, rows, rules, skip_duplicates=True):
+        """Validate, categorize and insert parsed statement rows on session, without committing
+
+        rows yields StatementRow (or StatementError for unreadable records); amounts
+        below zero become expenses, the rest income. Expenses no rule matches go to
+        the user's 'Other' category. Rows failing the transaction form's rules are
+        reported, not inserted. Each batch is matched against the
+        stored transactions (DuplicateService.match_batch): exact duplicates, as
+        from an overlapping statement, are skipped unless skip_duplicates is off;
+        near duplicates are imported and listed. Returns a report dict.
+        """
+        category_ids = StatementImportService.category_ids(session, user_id)
+        unknown = sorted({name for name in rules.categories if name.lower() not in category_ids})
+        if unknown:
+            raise ValueError(f"Unknown categories in rules: {', '.join(unknown)}.")
+        # The transaction form requires a category for expenses
+        other_category_id = category_ids.get('other')
+
+        connection = session.connection()
+        transactions = Transaction.__table__
+        max_transaction_id, first_date, last_date = connection.execute(
+            db.select(db.func.max(transactions.c.transaction_id), db.func.min(transactions.c.transaction_date),
+                      db.func.max(transactions.c.transaction_date))
+            .where(transactions.c.user_id == user_id)
+        ).one()
+        consumed = set()
+        report = {'imported': 0, 'categorized': 0, 'rejected': 0, 'duplicates': 0,
+                  'errors': [], 'possible_duplicates': []}
+        deltas = {}
+        batch, lines, matched = [], [], []
+
+        def reject(message):
+            report['rejected'] += 1
+            if len(report['errors']) < StatementImportService.MAX_ERRORS:
+                report['errors'].append(message)
+
+        def insert_batch():
+            exact, near = {}, {}
+            if max_transaction_id is not None:
+                exact, near = DuplicateService.match_batch(
+                    connection, user_id, batch, max_transaction_id=max_transaction_id, consumed=consumed,
+                    stored_span=(first_date, last_date)
+                )
+            if not skip_duplicates:
+                near.update(exact)
+                exact = {}
+            kept_indexes = [index for index in range(len(batch)) if index not in exact]
+            kept = [batch[index] for index in kept_indexes]
+            report['duplicates'] += len(exact)
+            for index, transaction_id in sorted(near.items()):
+                if len(report['possible_duplicates']) < StatementImportService.MAX_ERRORS:
+                    report['possible_duplicates'].append({'line': lines[index], 'duplicate_of': transaction_id})
+            if kept:
+                connection.execute(transactions.insert(), kept)
+            for row in kept:
+                key = LedgerService.transaction_key(user_id, row['transaction_type'], row['category_id'],
+                                                    row['transaction_date'])
+                deltas[key] = deltas.get(key, 0) + to_pence(row['amount'])
+            report['categorized'] += sum(matched[index] for index in kept_indexes)
+            report['imported'] += len(kept)
+
+        for row in rows:
+            if isinstance(row, StatementError):
+                reject(str(row))
+                continue
+            amount = abs(row.amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            if not validate_transaction_amount(amount) or amount > StatementImportService.MAX_AMOUNT:
+                reject(f'Line {row.line}: amount must be between 0.01 and {StatementImportService.MAX_AMOUNT}')
+                continue
+
+            category_name = rules.match(row.description)
+            category_id = category_ids[category_name.lower()] if category_name else None
+            transaction_type = 'expense' if row.amount < 0 else 'income'
+            if category_id is None and transaction_type == 'expense':
+                if other_category_id is None:
+                    reject(f'Line {row.line}: no rule matches and there is no Other category for the expense')
+                    continue
+                category_id = other_category_id
+            description = row.description[:255] or None
+            batch.append({
+                'user_id': user_id, 'category_id': category_id, 'amount': amount,
+                'transaction_type': transaction_type, 'transaction_date': row.date,
+                'year': row.date.year, 'year_month': to_year_month(row.date),
+                # Imported rows have no members yet, so the whole amount is the user's share
+                'user_participates': True, 'user_share_amount': amount, 'description': description,
+                'fingerprint': transaction_fingerprint(transaction_type, row.date, amount, category_id, description)
+            })
+            lines.append(row.line)
+            matched.append(category_name is not None)
+
+            if len(batch) >= StatementImportService.BATCH_SIZE:
+                insert_batch()
+                batch, lines, matched = [], [], []
+        if batch:
+            insert_batch()
+
+        if len(deltas) > StatementImportService.LEDGER_REBUILD_KEYS:
+            LedgerService.rebuild(user_id, commit=False)
+        else:
+            LedgerService.apply_deltas(connection, deltas)
+        return report
+
+    @staticmethod
+    def run(user_id, read_rows, rules=None, idempotency_key=None, skip_duplicates=True):
+        """import_rows() in its own committed write; returns (report, replayed)
+
+        read_rows() must return a fresh row iterator each call: a batched write may
+        be re-run. rules are extra (pattern, category name) pairs tried before the
+        built-in keywords. A replayed import reports only the imported count.
+        """
+        rules = CategoryRules.default(rules or [])
+        reports = []
+
+        def create(session):
+            report = StatementImportService.import_rows(session, user_id, read_rows(), rules, skip_duplicates)
+            reports[:] = [report]
+            return report['imported']
+
+        imported, replayed = IdempotencyService.run_once(user_id, 'statement_import', idempotency_key, create)
+        if replayed:
+            return {'imported': imported}, True
+        if imported:
+            # Core writes bypass the session hooks that announce changes
+            publish_bulk_change(user_id, ['transactions'])
+        return reports[0], False
+
+class RecurringService:
+    """Recurring transaction rules and the batch job that enters their due occurrences"""
+
+    MAX_INTERVAL = 365      # interval_count bound
+    MAX_CATCH_UP = 1000     # occurrences entered per rule and run; a rule further behind continues next run
+    CHUNK_SIZE = 500        # ids per IN (...) statement
+    LEDGER_REBUILD_KEYS = 10   # more ledger days than this for a user: rebuild their ledger from the first one
+
+    @staticmethod
+    def create_rule(user_id, transaction_type, amount, interval_unit, anchor_date, interval_count=1,
+                    category_id=None, description=None, member_ids=(), user_participates=True, end_date=None):
+        """Validate and store a rule; its first occurrence is anchor_date (past dates are caught up)"""
+        if transaction_type not in ('income', 'expense'):
+            raise ValueError("type must be 'income' or 'expense'.")
+        amount = Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        if not validate_transaction_amount(amount) or amount > StatementImportService.MAX_AMOUNT:
+            raise ValueError(f'amount must be between 0.01 and {StatementImportService.MAX_AMOUNT}.')
+        if interval_unit not in RecurringRule.INTERVAL_UNITS:
+            raise ValueError(f"interval_unit must be one of: {', '.join(RecurringRule.INTERVAL_UNITS)}.")
+        if not 1 <= int(interval_count) <= RecurringService.MAX_INTERVAL:
+            raise ValueError(f'interval_count must be between 1 and {RecurringService.MAX_INTERVAL}.')
+        if end_date is not None and end_date < anchor_date:
+            raise ValueError('end_date must not be before anchor_date.')
+        if transaction_type == 'expense' and not category_id:
+            raise ValueError('Category is required for expenses.')
+        if category_id and Category.query.filter(
+                Category.category_id == category_id,
+                db.or_(Category.user_id.is_(None), Category.user_id == user_id)).first() is None:
+            raise ValueError('Unknown category.')
+        member_ids = sorted(set(int(member_id) for member_id in member_ids))
+        if member_ids and Member.query.filter(Member.user_id == user_id,
+                                              Member.member_id.in_(member_ids)).count() != len(member_ids):
+            raise ValueError('Unknown member.')
+
+        rule = RecurringRule(user_id=user_id, transaction_type=transaction_type, amount=amount,
+                             category_id=category_id or None, description=(description or '').strip()[:255] or None,
+                             user_participates=bool(user_participates) if member_ids else True,
+                             interval_unit=interval_unit, interval_count=int(interval_count),
+                             anchor_date=anchor_date, end_date=end_date, next_date=anchor_date,
+                             members=[RecurringRuleMember(member_id=member_id) for member_id in member_ids])
+        db.session.add(rule)
+        db.session.commit()
+        return rule
+
+    @staticmethod
+    def list_rules(user_id):
+        return [rule.to_dict() for rule in RecurringRule.query.options(
+            joinedload(RecurringRule.category), selectinload(RecurringRule.members)
+        ).filter_by(user_id=user_id).order_by(RecurringRule.next_date, RecurringRule.rule_id)]
+
+    @staticmethod
+    def delete_rule(user_id, rule_id):
+        """Stop a rule; the transactions it already entered are kept. False if it is not the user's"""
+        rule = RecurringRule.query.filter_by(rule_id=rule_id, user_id=user_id).first()
+        if rule is None:
+            return False
+        db.session.delete(rule)
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def materialize(today=None):
+        """Enter every user's occurrences due up to today in one committed write
+
+        Due rules come from the next_date index. Each one's occurrences from its
+        next date up to today (at most MAX_CATCH_UP) are generated in memory, so a
+        run after downtime catches up in one pass; all of them, for all users, go
+        in with a single executemany INSERT, followed by their member links,
+        shares, ledger updates (a rebuild from the earliest new day for users
+        with many) and the rules' new next dates. An occurrence already
+        recorded for (rule, date) is never entered again, and an overlapping run
+        fails on that key instead of entering it twice.
+        Returns {'transactions', 'rules', 'users', 'behind'}.
+        """
+        today = today or date.today()
+        connection = db.session.connection()
+        rules = RecurringRule.__table__
+        occurrences = RecurringOccurrence.__table__
+        rule_members = RecurringRuleMember.__table__
+        transactions = Transaction.__table__
+        report = {'transactions': 0, 'rules': 0, 'users': 0, 'behind': 0}
+
+        due = connection.execute(
+            db.select(rules).where(rules.c.next_date <= today).order_by(rules.c.rule_id)
+        ).all()
+        if not due:
+            return report
+
+        member_ids, entered = {}, set()
+        rule_ids = [rule.rule_id for rule in due]
+        earliest = min(rule.next_date for rule in due)
+        for start in range(0, len(rule_ids), RecurringService.CHUNK_SIZE):
+            chunk = rule_ids[start:start + RecurringService.CHUNK_SIZE]
+            # Through members, so a link left behind by a member deleted out of band is ignored
+            for rule_id, member_id in connection.execute(
+                db.select(rule_members.c.rule_id, rule_members.c.member_id)
+                .join(Member.__table__, Member.__table__.c.member_id == rule_members.c.member_id)
+                .where(rule_members.c.rule_id.in_(chunk)).order_by(rule_members.c.rule_id, rule_members.c.member_id)
+            ):
+                member_ids.setdefault(rule_id, []).append(member_id)
+            entered.update(tuple(row) for row in connection.execute(
+                db.select(occurrences.c.rule_id, occurrences.c.occurrence_date).where(
+                    occurrences.c.rule_id.in_(chunk), occurrences.c.occurrence_date >= earliest
+                )
+            ))
+
+        rows, keys, progress = [], [], []
+        for rule in due:
+            day, index, generated = rule.next_date, rule.occurrence_count, 0
+            merchant = merchant_name(rule.description)
+            while day is not None and day <= today and generated < RecurringService.MAX_CATCH_UP:
+                if (rule.rule_id, day) not in entered:
+                    when = datetime.combine(day, datetime.min.time())
+                    rows.append({
+                        'user_id': rule.user_id, 'category_id': rule.category_id, 'amount': rule.amount,
+                        'transaction_type': rule.transaction_type, 'transaction_date': when,
+                        'year': day.year, 'year_month': to_year_month(day),
+                        'user_participates': rule.user_participates,
+                        # Shared occurrences get their split from update_shares below
+                        'user_share_amount': rule.amount, 'description': rule.description,
+                        'merchant': merchant,
+                        'fingerprint': transaction_fingerprint(rule.transaction_type, when, rule.amount,
+                                                               rule.category_id, rule.description)
+                    })
+                    keys.append(rule.rule_id)
+                index += 1
+                generated += 1
+                day = recurrence_date(rule.anchor_date, rule.interval_unit, rule.interval_count, index)
+                if rule.end_date is not None and day > rule.end_date:
+                    day = None
+            report['behind'] += day is not None and day <= today
+            progress.append({'row_rule_id': rule.rule_id, 'row_count': index, 'row_next': day})
+
+        transaction_ids = []
+        if rows and connection.dialect.name == 'sqlite':
+            # Ordered RETURNING runs row by row on SQLite; a plain executemany in this
+            # write transaction takes consecutive rowids after the current largest one
+            connection.execute(transactions.insert(), rows)
+            last_id = connection.execute(db.select(db.func.max(transactions.c.transaction_id))).scalar()
+            transaction_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+        elif rows:
+            transaction_ids = connection.execute(
+                transactions.insert().returning(transactions.c.transaction_id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+        if rows:
+            connection.execute(occurrences.insert(), [
+                {'rule_id': rule_id, 'occurrence_date': row['transaction_date'].date(), 'transaction_id': transaction_id}
+                for rule_id, row, transaction_id in zip(keys, rows, transaction_ids)
+            ])
+        links = [{'transaction_id': transaction_id, 'member_id': member_id}
+                 for rule_id, transaction_id in zip(keys, transaction_ids) for member_id in member_ids.get(rule_id, ())]
+        if links:
+            connection.execute(MembersTransaction.__table__.insert(), links)
+            shared = sorted({link['transaction_id'] for link in links})
+            for start in range(0, len(shared), RecurringService.CHUNK_SIZE):
+                TransactionService.update_shares(connection, shared[start:start + RecurringService.CHUNK_SIZE])
+
+        deltas = {}
+        for row in rows:
+            key = LedgerService.transaction_key(row['user_id'], row['transaction_type'], row['category_id'],
+                                                row['transaction_date'])
+            user_deltas = deltas.setdefault(row['user_id'], {})
+            user_deltas[key] = user_deltas.get(key, 0) + to_pence(row['amount'])
+        for user_id, user_deltas in deltas.items():
+            if len(user_deltas) > RecurringService.LEDGER_REBUILD_KEYS:
+                # A catch-up touches recent days only, so this costs the window, not the history
+                LedgerService.rebuild(user_id, commit=False, since=min(key[3] for key in user_deltas))
+            else:
+                LedgerService.apply_deltas(connection, user_deltas)
+
+        connection.execute(
+            rules.update().where(rules.c.rule_id == db.bindparam('row_rule_id'))
+            .values(occurrence_count=db.bindparam('row_count'), next_date=db.bindparam('row_next')),
+            progress
+        )
+        db.session.commit()
+
+        for user_id in deltas:
+            # Core writes bypass the session hooks that announce changes
+            publish_bulk_change(user_id, ['transactions'])
+        report.update(transactions=len(rows), rules=len(set(keys)), users=len(deltas))
+        return report
+
 class MemberService:
     """Member management service"""
     
@@ -531,10 +1773,304 @@ class MemberService:
     def get_member_by_id(member_id):
         return Member.query.get(member_id)
 
+    @staticmethod
+    def get_stats(user_id, member_ids=None, period=None):
+        """Expense statistics for a user's members from one grouped query
+
+        period is None for lifetime figures or (year, month) for one calendar month.
+        Returns {member_id: {'total_transactions', 'total_contribution',
+        'average_per_transaction'}}, including members with no expenses.
+        Contributions are sums of the stored per-member shares.
+        """
+        expense_links = db.session.query(
+            MembersTransaction.member_id, MembersTransaction.share_amount
+        ).join(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        )
+        if period is not None:
+            year, month = period
+            expense_links = expense_links.filter(Transaction.year_month == to_year_month(date(year, month, 1)))
+        expense_links = expense_links.subquery()
+
+        query = db.session.query(
+            Member.member_id,
+            db.func.count(expense_links.c.member_id),
+            db.func.sum(expense_links.c.share_amount)
+        ).outerjoin(
+            expense_links, expense_links.c.member_id == Member.member_id
+        ).filter(Member.user_id == user_id)
+        if member_ids is not None:
+            query = query.filter(Member.member_id.in_(member_ids))
+
+        stats = {}
+        for member_id, total_transactions, total_contribution in query.group_by(Member.member_id):
+            total_contribution = float(total_contribution or 0)
+            stats[member_id] = {
+                'total_transactions': total_transactions,
+                'total_contribution': total_contribution,
+                'average_per_transaction': total_contribution / total_transactions if total_transactions > 0 else 0
+            }
+        return stats
+
+
+_dashboard_executors = {}
+_dashboard_executor_lock = threading.Lock()
+
+
+def _get_dashboard_executor(max_workers):
+    """Shared bounded pool for dashboard panels, one per pool size (created on first use)"""
+    with _dashboard_executor_lock:
+        executor = _dashboard_executors.get(max_workers)
+        if executor is None:
+            executor = _dashboard_executors[max_workers] = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='dashboard-panel'
+            )
+        return executor
+
 
 class DashboardService:
     """Dashboard data service"""
-    
+
+    # Values used when a panel fails or misses the request deadline
+    PANEL_DEFAULTS = {
+        'monthly_totals': {'income': 0, 'expenses': 0, 'balance': 0},
+        'budget_alerts': [],
+        'monthly_comparison': [],
+        'category_spending': {},
+        'total_budget_status': None,
+        'all_time_totals': {'balance': 0, 'income': 0, 'expenses': 0}
+    }
+
+    # Panels rendered with the page itself; the rest are lazy-loaded fragments
+    SHELL_PANELS = ('monthly_totals', 'total_budget_status')
+
+    @staticmethod
+    def get_personal_budget_alerts(user_id, start_of_month):
+        """Personal budget alerts (member_id is NULL) for the current month, highest usage first"""
+        budget_alerts = []
+        personal_budgets = Budget.query.filter_by(
+            user_id=user_id,
+            member_id=None,  # Personal budgets only
+            is_active=True
+        ).all()
+
+        for budget in personal_budgets:
+            if budget.category:
+                # Personal expenses only: user participates and no family members
+                category_spent_query = db.session.query(db.func.sum(Transaction.amount)).filter(
+                    Transaction.user_id == user_id,
+                    Transaction.transaction_type == 'expense',
+                    Transaction.category_id == budget.category_id,
+                    Transaction.transaction_date >= start_of_month,
+                    Transaction.user_participates == True,
+                    ~Transaction.members.any()
+                ).scalar()
+
+                category_spent = float(category_spent_query) if category_spent_query else 0
+                budget_amount = float(budget.budget_amount)
+
+                if budget_amount > 0:
+                    budget_alerts.append({
+                        'category_name': budget.category.category_name,
+                        'budget_amount': budget_amount,
+                        'spent': category_spent,
+                        'percentage': (category_spent / budget_amount * 100)
+                    })
+
+        budget_alerts.sort(key=lambda x: x['percentage'], reverse=True)
+        return budget_alerts
+
+    @staticmethod
+    def get_comparison_start_date(user_id, time_range, now):
+        """First day of the income vs expenses series for the selected time range"""
+        oldest_transaction = Transaction.query.filter_by(
+            user_id=user_id
+        ).order_by(Transaction.transaction_date.asc()).first()
+
+        if not oldest_transaction:
+            start_date = now - timedelta(days=150)  # ~5 months
+        elif time_range == '3months':
+            start_date = now - timedelta(days=90)   # ~3 months
+        elif time_range == '1year':
+            start_date = now - timedelta(days=330)  # ~11 months
+        elif time_range == '2years':
+            start_date = now - timedelta(days=690)  # ~23 months
+        elif time_range == 'all':
+            start_date = oldest_transaction.transaction_date.replace(day=1)
+        else:
+            start_date = now - timedelta(days=150)  # ~5 months (default: 6months)
+
+        return start_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def get_monthly_comparison(user_id, time_range, now):
+        """Income vs expenses per month for the selected time range (max 24 months)"""
+        monthly_comparison = []
+        current_date = DashboardService.get_comparison_start_date(user_id, time_range, now)
+        end_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        _, series_end = UtilityService.get_date_range_for_month(end_date.year, end_date.month)
+
+        # One grouped query for the whole range instead of two per month
+        series = SimpleAnalyticsService.get_monthly_series(user_id, current_date, series_end)
+        empty_month = {'income': 0.0, 'expenses': 0.0}
+
+        while current_date <= end_date:
+            year = current_date.year
+            month = current_date.month
+
+            monthly_data = series.get((year, month), empty_month)
+            monthly_comparison.append({
+                'month': f"{year}-{month:02d}",
+                'month_name': datetime(year, month, 1).strftime('%b %Y'),
+                'month_short': datetime(year, month, 1).strftime('%b'),
+                'income': monthly_data['income'],
+                'expenses': monthly_data['expenses']
+            })
+
+            if current_date.month == 12:
+                current_date = current_date.replace(year=current_date.year + 1, month=1)
+            else:
+                current_date = current_date.replace(month=current_date.month + 1)
+
+        return monthly_comparison[-24:]
+
+    @staticmethod
+    def get_all_time_totals(user_id):
+        """All-time income, expenses and balance"""
+        income = SimpleAnalyticsService.get_total_income(user_id)
+        expenses = SimpleAnalyticsService.get_total_expenses(user_id)
+        return {
+            'balance': income - expenses,
+            'income': income,
+            'expenses': expenses
+        }
+
+    @staticmethod
+    def get_live_snapshot(user_id, now=None):
+        """Balance, this month's totals and every active budget's alert status for live updates"""
+        now = now or datetime.now()
+        start_of_month = datetime(now.year, now.month, 1)
+        all_time = DashboardService.get_all_time_totals(user_id)
+        monthly = SimpleAnalyticsService.get_monthly_totals(user_id, now.year, now.month)
+
+        # Personal spending this month (user participates, no family members) per category
+        personal_spent = dict(db.session.query(
+            Transaction.category_id,
+            db.func.sum(Transaction.amount)
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.transaction_date >= start_of_month,
+            Transaction.user_participates == True,
+            ~Transaction.members.any()
+        ).group_by(Transaction.category_id).all())
+
+        # Household spending per category, as shown on the family page
+        family_spent = dict(db.session.query(
+            Transaction.category_id,
+            db.func.sum(Transaction.amount)
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        ).group_by(Transaction.category_id).all())
+
+        budgets = []
+        for budget in Budget.query.filter_by(user_id=user_id, is_active=True).order_by(Budget.budget_id):
+            if budget.member_id is not None:
+                scope = 'family'
+                spent = float(family_spent.get(budget.category_id) or 0)
+            elif budget.category_id is None:
+                scope = 'total'
+                spent = monthly['expenses']
+            else:
+                scope = 'personal'
+                spent = float(personal_spent.get(budget.category_id) or 0)
+
+            budgets.append({
+                'budget_id': budget.budget_id,
+                'category_name': budget.category.category_name if budget.category else 'Total Expenses',
+                'scope': scope,
+                'spent': spent,
+                'budget_amount': float(budget.budget_amount),
+                **budget.get_alert_status(spent)
+            })
+
+        return {
+            'balance': all_time['balance'],
+            'monthly_income': monthly['income'],
+            'monthly_expenses': monthly['expenses'],
+            'budgets': budgets
+        }
+
+    @staticmethod
+    def get_panel_jobs(user_id, time_range, now, names=None):
+        """Independent, read-only dashboard panels as name -> (callable, args)"""
+        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        jobs = {
+            'monthly_totals': (SimpleAnalyticsService.get_monthly_totals, (user_id, now.year, now.month)),
+            'budget_alerts': (DashboardService.get_personal_budget_alerts, (user_id, start_of_month)),
+            'monthly_comparison': (DashboardService.get_monthly_comparison, (user_id, time_range, now)),
+            'category_spending': (SimpleAnalyticsService.get_spending_by_category, (user_id,)),
+            'total_budget_status': (BudgetService.get_total_budget_status, (user_id,)),
+            'all_time_totals': (DashboardService.get_all_time_totals, (user_id,))
+        }
+        if names is None:
+            return jobs
+        return {name: jobs[name] for name in names}
+
+    @staticmethod
+    def get_dashboard_panels(user_id, time_range, now=None, names=None):
+        """Compute the dashboard panels (all, or only names) one after another in the current session"""
+        now = now or datetime.now()
+        panels = {}
+        for name, (func, args) in DashboardService.get_panel_jobs(user_id, time_range, now, names).items():
+            try:
+                panels[name] = func(*args)
+            except Exception as e:
+                print(f"Dashboard panel {name} error: {e}")
+                panels[name] = DashboardService.PANEL_DEFAULTS[name]
+        return panels, []
+
+    @staticmethod
+    def get_dashboard_panels_concurrent(app, user_id, time_range, now=None, max_workers=4, deadline=2.0, names=None):
+        """
+        Compute the dashboard panels concurrently on a bounded thread pool.
+        Each panel runs in its own app context, so it gets its own scoped session
+        that is removed when the panel finishes. Panels that fail or are not done
+        by the deadline (seconds) fall back to PANEL_DEFAULTS and are reported
+        in the returned list of degraded panel names.
+        """
+        now = now or datetime.now()
+        executor = _get_dashboard_executor(max_workers)
+
+        def run_panel(func, args):
+            with app.app_context():
+                return func(*args)
+
+        futures = {
+            name: executor.submit(run_panel, func, args)
+            for name, (func, args) in DashboardService.get_panel_jobs(user_id, time_range, now, names).items()
+        }
+        wait(futures.values(), timeout=deadline)
+
+        panels = {}
+        degraded = []
+        for name, future in futures.items():
+            if future.done() and future.exception() is None:
+                panels[name] = future.result()
+                continue
+
+            if future.done():
+                print(f"Dashboard panel {name} error: {future.exception()}")
+            else:
+                future.cancel()  # Only stops panels that have not started yet
+            panels[name] = DashboardService.PANEL_DEFAULTS[name]
+            degraded.append(name)
+
+        return panels, degraded
+
     @staticmethod
     def get_dashboard_summary(user_id):
         now = datetime.now()
@@ -559,6 +2095,364 @@ class DashboardService:
         }
 
 
+class AnalyticsBatchService:
+    """Several dashboard widgets computed in one request from shared intermediate results"""
+
+    WIDGETS = ('transaction_stats', 'category_spending', 'monthly_comparison',
+               'budget_alerts', 'annual_data')
+
+    @staticmethod
+    def shift_month(year, month, offset):
+        """(year, month) moved by offset calendar months"""
+        index = year * 12 + (month - 1) + offset
+        return index // 12, index % 12 + 1
+
+    @staticmethod
+    def use_columnar():
+        """Whether COLUMNAR_ANALYTICS is on and NumPy is installed"""
+        return current_app.config.get('COLUMNAR_ANALYTICS') and columnar.is_available()
+
+    @staticmethod
+    def get_monthly_rollup(user_id, now):
+        """Per-month income/expenses covering the last 6 months and the whole current year"""
+        oldest_year, oldest_month = AnalyticsBatchService.shift_month(now.year, now.month, -5)
+        start_date = min(datetime(oldest_year, oldest_month, 1), datetime(now.year, 1, 1))
+        end_date = datetime(now.year + 1, 1, 1)
+        if AnalyticsBatchService.use_columnar():
+            return ColumnarAnalytics.get_monthly_series(user_id, start_date, end_date)
+        return SimpleAnalyticsService.get_monthly_series(user_id, start_date, end_date)
+
+    @staticmethod
+    def get_transaction_stats(user_id, now):
+        """All-time totals and the last 30 days' transaction count from one query"""
+        thirty_days_ago = now.date() - timedelta(days=30)
+        if AnalyticsBatchService.use_columnar():
+            totals = ColumnarAnalytics.get_totals(user_id)
+            return {
+                'total_income': totals['income'],
+                'total_expenses': totals['expenses'],
+                'current_balance': totals['income'] - totals['expenses'],
+                'recent_transactions': ColumnarAnalytics.get_recent_count(user_id, thirty_days_ago)
+            }
+
+        total_income, total_expenses, recent_count = db.session.query(
+            db.func.sum(db.case((Transaction.transaction_type == 'income', Transaction.amount), else_=0)),
+            db.func.sum(db.case((Transaction.transaction_type == 'expense', Transaction.amount), else_=0)),
+            db.func.sum(db.case((Transaction.transaction_date >= thirty_days_ago, 1), else_=0))
+        ).filter(Transaction.user_id == user_id).one()
+
+        total_income = float(total_income or 0)
+        total_expenses = float(total_expenses or 0)
+        return {
+            'total_income': total_income,
+            'total_expenses': total_expenses,
+            'current_balance': total_income - total_expenses,
+            'recent_transactions': int(recent_count or 0)
+        }
+
+    @staticmethod
+    def get_category_spending(user_id):
+        """All-time expenses per category"""
+        category_data = db.session.query(
+            Category.category_name,
+            db.func.sum(Transaction.amount).label('total')
+        ).join(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        ).group_by(Category.category_name).all()
+
+        return [{'category': cat, 'amount': float(amount)} for cat, amount in category_data]
+
+    @staticmethod
+    def get_monthly_comparison(rollup, now):
+        """Last 6 months, oldest first"""
+        empty_month = {'income': 0.0, 'expenses': 0.0}
+        monthly_data = []
+        for offset in range(-5, 1):
+            year, month = AnalyticsBatchService.shift_month(now.year, now.month, offset)
+            data = rollup.get((year, month), empty_month)
+            monthly_data.append({
+                'month': f"{year}-{month:02d}",
+                'income': data['income'],
+                'expenses': data['expenses']
+            })
+        return monthly_data
+
+    @staticmethod
+    def get_annual_data(rollup, now):
+        """Every month of the current year"""
+        empty_month = {'income': 0.0, 'expenses': 0.0}
+        annual_data = []
+        for month in range(1, 13):
+            data = rollup.get((now.year, month), empty_month)
+            annual_data.append({
+                'month': month,
+                'income': data['income'],
+                'expenses': data['expenses'],
+                'balance': data['income'] - data['expenses']
+            })
+        return annual_data
+
+    @staticmethod
+    def get_budget_alerts(user_id, now):
+        """Over-budget alerts for this month using one grouped spending query"""
+        start_of_month = datetime(now.year, now.month, 1)
+        spent_by_category = dict(db.session.query(
+            Transaction.category_id,
+            db.func.sum(Transaction.amount)
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.transaction_date >= start_of_month
+        ).group_by(Transaction.category_id).all())
+
+        budgets = Budget.query.filter_by(user_id=user_id, is_active=True).order_by(Budget.budget_id).all()
+
+        # Like BudgetService.check_budget_status, the first active budget per category sets the limit
+        limits = {}
+        for budget in budgets:
+            limits.setdefault(budget.category_id, float(budget.budget_amount))
+
+        alerts = []
+        for budget in budgets:
+            budget_amount = limits[budget.category_id]
+            spent = float(spent_by_category.get(budget.category_id) or 0)
+            if spent > budget_amount:
+                category_name = budget.category.category_name if budget.category else None
+                alerts.append({
+                    'budget_id': budget.budget_id,
+                    'category_name': category_name or 'Unknown',
+                    'message': f"Over budget in {category_name or 'category'}",
+                    'spent': spent,
+                    'budget_amount': budget_amount,
+                    'percentage_used': (spent / budget_amount * 100) if budget_amount > 0 else 0
+                })
+        return alerts
+
+    @staticmethod
+    def get_widgets(user_id, widgets, now=None):
+        """Compute the requested widgets; raises ValueError for unknown widget names"""
+        unknown = [name for name in widgets if name not in AnalyticsBatchService.WIDGETS]
+        if unknown:
+            raise ValueError(f"Unknown widgets: {', '.join(unknown)}")
+
+        now = now or datetime.now()
+        rollup = None
+        if 'monthly_comparison' in widgets or 'annual_data' in widgets:
+            rollup = AnalyticsBatchService.get_monthly_rollup(user_id, now)
+
+        result = {}
+        for name in widgets:
+            if name == 'transaction_stats':
+                result[name] = AnalyticsBatchService.get_transaction_stats(user_id, now)
+            elif name == 'category_spending':
+                result[name] = AnalyticsBatchService.get_category_spending(user_id)
+            elif name == 'monthly_comparison':
+                result[name] = AnalyticsBatchService.get_monthly_comparison(rollup, now)
+            elif name == 'budget_alerts':
+                result[name] = AnalyticsBatchService.get_budget_alerts(user_id, now)
+            elif name == 'annual_data':
+                result[name] = AnalyticsBatchService.get_annual_data(rollup, now)
+        return result
+
+
+class LedgerService:
+    """Date-range totals from the daily_cumulative prefix-sum ledger"""
+
+    @staticmethod
+    def transaction_key(user_id, transaction_type, category_id, transaction_date):
+        """Ledger series/day a transaction falls into"""
+        if isinstance(transaction_date, datetime):
+            transaction_date = transaction_date.date()
+        category_key = int(category_id) if category_id else DailyCumulative.UNCATEGORIZED
+        return (user_id, transaction_type, category_key, transaction_date)
+
+    @staticmethod
+    def apply_deltas(connection, deltas):
+        """Add {(user_id, type, category_key, day): pence} to the ledger on connection
+
+        Each delta updates (or creates) its day row and shifts every later running
+        total of the series with one set-based UPDATE; the all-categories series
+        receives the same deltas.
+        """
+        table = DailyCumulative.__table__
+        combined = {}
+        for (user_id, transaction_type, category_key, day), pence in deltas.items():
+            for key in ((user_id, transaction_type, category_key, day),
+                        (user_id, transaction_type, DailyCumulative.ALL_CATEGORIES, day)):
+                combined[key] = combined.get(key, 0) + pence
+
+        for (user_id, transaction_type, category_key, day), pence in sorted(combined.items()):
+            if not pence:
+                continue
+            series = db.and_(table.c.user_id == user_id,
+                             table.c.transaction_type == transaction_type,
+                             table.c.category_key == category_key)
+
+            day_amount = connection.execute(
+                db.select(table.c.day_amount).where(series, table.c.day == day)
+            ).scalar()
+            if day_amount is None:
+                previous = connection.execute(
+                    db.select(table.c.cumulative_amount).where(series, table.c.day < day)
+                    .order_by(table.c.day.desc()).limit(1)
+                ).scalar() or 0
+                connection.execute(table.insert().values(
+                    user_id=user_id, transaction_type=transaction_type, category_key=category_key,
+                    day=day, day_amount=pence, cumulative_amount=previous + pence
+                ))
+            elif day_amount + pence == 0:
+                # Nothing left on that day; the previous row already carries the running total
+                connection.execute(table.delete().where(series, table.c.day == day))
+            else:
+                connection.execute(table.update().where(series, table.c.day == day).values(
+                    day_amount=table.c.day_amount + pence,
+                    cumulative_amount=table.c.cumulative_amount + pence
+                ))
+
+            connection.execute(table.update().where(series, table.c.day > day).values(
+                cumulative_amount=table.c.cumulative_amount + pence
+            ))
+
+    @staticmethod
+    def day_expression():
+        """SQL expression for a transaction's calendar day (a 'YYYY-MM-DD' string on SQLite)"""
+        if db.session.get_bind().dialect.name == 'sqlite':
+            return db.func.date(Transaction.transaction_date)
+        return db.cast(Transaction.transaction_date, db.Date)
+
+    @staticmethod
+    def transaction_totals(connection, where):
+        """{ledger key: pence} contributed by the transactions matching where, in one grouped query"""
+        totals = {}
+        day = LedgerService.day_expression()
+        for user_id, transaction_type, category_id, row_day, amount in connection.execute(
+            db.select(Transaction.user_id, Transaction.transaction_type, Transaction.category_id,
+                      day, db.func.sum(Transaction.amount))
+            .where(where)
+            .group_by(Transaction.user_id, Transaction.transaction_type, Transaction.category_id, day)
+        ):
+            if isinstance(row_day, str):
+                row_day = datetime.strptime(row_day, '%Y-%m-%d').date()
+            key = LedgerService.transaction_key(user_id, transaction_type, category_id, row_day)
+            totals[key] = totals.get(key, 0) + to_pence(amount)
+        return totals
+
+    @staticmethod
+    def rebuild(user_id=None, commit=True, since=None):
+        """Recompute the ledger from transactions (one user, or everyone)
+
+        With since, only the days from that date on are recomputed; each series
+        continues from its last running total before since.
+        """
+        table = DailyCumulative.__table__
+        delete = table.delete()
+        if user_id is not None:
+            delete = delete.where(table.c.user_id == user_id)
+        if since is not None:
+            delete = delete.where(table.c.day >= since)
+        db.session.execute(delete)
+
+        running = {}
+        if since is not None:
+            series_columns = (table.c.user_id, table.c.transaction_type, table.c.category_key)
+            last = db.select(*series_columns, db.func.max(table.c.day).label('day')).where(table.c.day < since)
+            if user_id is not None:
+                last = last.where(table.c.user_id == user_id)
+            last = last.group_by(*series_columns).subquery()
+            for row_user_id, transaction_type, category_key, cumulative in db.session.execute(
+                db.select(*series_columns, table.c.cumulative_amount).join(last, db.and_(
+                    table.c.user_id == last.c.user_id, table.c.transaction_type == last.c.transaction_type,
+                    table.c.category_key == last.c.category_key, table.c.day == last.c.day
+                ))
+            ):
+                running[(row_user_id, transaction_type, category_key)] = cumulative
+
+        day = LedgerService.day_expression()
+        query = db.session.query(
+            Transaction.user_id,
+            Transaction.transaction_type,
+            Transaction.category_id,
+            day,
+            db.func.sum(Transaction.amount)
+        ).group_by(Transaction.user_id, Transaction.transaction_type, Transaction.category_id, day)
+        if user_id is not None:
+            query = query.filter(Transaction.user_id == user_id)
+        if since is not None:
+            query = query.filter(Transaction.transaction_date >= datetime.combine(since, datetime.min.time()))
+
+        daily = {}
+        for row_user_id, transaction_type, category_id, row_day, amount in query:
+            if isinstance(row_day, str):
+                row_day = datetime.strptime(row_day, '%Y-%m-%d').date()
+            for category_key in (category_id or DailyCumulative.UNCATEGORIZED, DailyCumulative.ALL_CATEGORIES):
+                key = (row_user_id, transaction_type, category_key, row_day)
+                daily[key] = daily.get(key, 0) + to_pence(amount)
+
+        rows = []
+        for (row_user_id, transaction_type, category_key, row_day), pence in sorted(daily.items()):
+            if not pence:
+                continue
+            series = (row_user_id, transaction_type, category_key)
+            running[series] = running.get(series, 0) + pence
+            rows.append({'user_id': row_user_id, 'transaction_type': transaction_type,
+                         'category_key': category_key, 'day': row_day,
+                         'day_amount': pence, 'cumulative_amount': running[series]})
+        if rows:
+            db.session.execute(table.insert(), rows)
+        if commit:
+            db.session.commit()
+        return len(rows)
+
+    @staticmethod
+    def get_cumulative(user_id, transaction_type, as_of, category_key=DailyCumulative.ALL_CATEGORIES):
+        """Running total in pence up to and including the day as_of"""
+        if isinstance(as_of, datetime):
+            as_of = as_of.date()
+        return db.session.query(DailyCumulative.cumulative_amount).filter(
+            DailyCumulative.user_id == user_id,
+            DailyCumulative.transaction_type == transaction_type,
+            DailyCumulative.category_key == category_key,
+            DailyCumulative.day <= as_of
+        ).order_by(DailyCumulative.day.desc()).limit(1).scalar() or 0
+
+    @staticmethod
+    def get_range_total(user_id, start_date, end_date, transaction_type='expense',
+                        category_key=DailyCumulative.ALL_CATEGORIES):
+        """Total for days in [start_date, end_date) from two point lookups"""
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        if isinstance(end_date, datetime):
+            end_date = end_date.date()
+        before_end = LedgerService.get_cumulative(user_id, transaction_type, end_date - timedelta(days=1), category_key)
+        before_start = LedgerService.get_cumulative(user_id, transaction_type, start_date - timedelta(days=1), category_key)
+        return (before_end - before_start) / 100
+
+    @staticmethod
+    def get_balance_as_of(user_id, as_of):
+        """Income minus expenses for every transaction dated up to and including as_of"""
+        income = LedgerService.get_cumulative(user_id, 'income', as_of)
+        expenses = LedgerService.get_cumulative(user_id, 'expense', as_of)
+        return (income - expenses) / 100
+
+    @staticmethod
+    def get_daily_amounts(user_id, start_date, end_date, transaction_type='expense',
+                          category_key=DailyCumulative.ALL_CATEGORIES):
+        """{day: total} for days with activity in [start_date, end_date), e.g. for a heatmap"""
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        if isinstance(end_date, datetime):
+            end_date = end_date.date()
+        rows = db.session.query(DailyCumulative.day, DailyCumulative.day_amount).filter(
+            DailyCumulative.user_id == user_id,
+            DailyCumulative.transaction_type == transaction_type,
+            DailyCumulative.category_key == category_key,
+            DailyCumulative.day >= start_date,
+            DailyCumulative.day < end_date
+        ).order_by(DailyCumulative.day).all()
+        return {day: pence / 100 for day, pence in rows}
+
+
 class ExportService:
     """Data export service"""
     
@@ -630,6 +2524,25 @@ class ReportingService:
             'total_expenses_formatted': UtilityService.format_currency(total_expenses)
         }
     
+    @staticmethod
+    def get_members_share_by_category(user_id, start_date=None, end_date=None):
+        """Members' combined share of family expenses per category, aggregated in SQL"""
+        query = db.session.query(
+            db.func.coalesce(Category.category_name, 'Other'),
+            db.func.sum(Transaction.get_members_total_share())
+        ).outerjoin(Category, Transaction.category_id == Category.category_id).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.is_family_expense()
+        )
+        if start_date is not None:
+            query = query.filter(Transaction.transaction_date >= start_date)
+        if end_date is not None:
+            query = query.filter(Transaction.transaction_date < end_date)
+
+        rows = query.group_by(db.func.coalesce(Category.category_name, 'Other')).all()
+        return {name: float(total) for name, total in rows if total}
+
     @staticmethod
     def get_monthly_report(user_id, year, month):
         monthly_data = SimpleAnalyticsService.get_monthly_totals(user_id, year, month)
@@ -678,6 +2591,341 @@ class CashFlowService:
 
 class FamilyExpenseService:
     """Family expense tracking service"""
+
+    @staticmethod
+    def get_family_summary(user_id):
+        """Totals shown in the family page stat and member cards"""
+        total_expenses_query = db.session.query(db.func.sum(Transaction.amount)).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        ).scalar()
+        total_family_expenses = float(total_expenses_query) if total_expenses_query else 0
+
+        # Family budgets are the ones linked to a member
+        family_budget_total = db.session.query(db.func.sum(Budget.budget_amount)).filter(
+            Budget.user_id == user_id,
+            Budget.is_active == True,
+            Budget.member_id != None
+        ).scalar()
+        family_budget_total = float(family_budget_total) if family_budget_total else 0
+        budget_percentage = (total_family_expenses / family_budget_total * 100) if family_budget_total > 0 else 0
+
+        # Contributions are plain SUMs over the stored per-participant shares
+        user_contribution = db.session.query(db.func.sum(Transaction.user_share_amount)).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.user_participates == True
+        ).scalar()
+        user_contribution = float(user_contribution) if user_contribution else 0
+
+        member_stats = MemberService.get_stats(user_id)
+        member_contributions = {member_id: stats['total_contribution'] for member_id, stats in member_stats.items()}
+
+        return {
+            'total_family_expenses': total_family_expenses,
+            'family_budget_total': family_budget_total,
+            'budget_percentage': budget_percentage,
+            'user_contribution': user_contribution,
+            'member_contributions': member_contributions,
+            'member_stats': member_stats
+        }
+
+    _matrix_lock = threading.Lock()
+    _matrix_cache = {}       # (user_id, start_date, end_date) -> (data version, matrix)
+    MATRIX_CACHE_SIZE = 256
+
+    @staticmethod
+    def get_participant_category_matrix(user_id, start_date=None, end_date=None):
+        """Expense shares per participant (the user, then members) and category for [start_date, end_date)
+
+        One UNION ALL of the user's and the members' stored shares, grouped by participant
+        and category; uncategorized spending counts as Other. The result is cached until
+        the user's next published data change. Returns {'categories': [names by total],
+        'rows': [{'member_id' (None for the user), 'name', 'amounts', 'total'}]}.
+        """
+        key = (user_id, start_date, end_date)
+        version = event_hub.version(user_id)
+        with FamilyExpenseService._matrix_lock:
+            cached = FamilyExpenseService._matrix_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        def in_window(query):
+            if start_date is not None:
+                query = query.where(Transaction.transaction_date >= start_date)
+            if end_date is not None:
+                query = query.where(Transaction.transaction_date < end_date)
+            return query
+
+        user_shares = in_window(db.select(
+            db.cast(db.null(), db.Integer).label('member_id'),
+            Transaction.category_id.label('category_id'),
+            Transaction.user_share_amount.label('share')
+        ).where(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.user_participates == True
+        ))
+        member_shares = in_window(db.select(
+            MembersTransaction.member_id,
+            Transaction.category_id,
+            MembersTransaction.share_amount
+        ).join(Transaction).where(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        ))
+        shares = db.union_all(user_shares, member_shares).subquery()
+
+        category_name = db.func.coalesce(Category.category_name, 'Other')
+        rows = db.session.execute(db.select(
+            shares.c.member_id, Member.name, category_name, db.func.sum(shares.c.share)
+        ).select_from(shares).outerjoin(
+            Category, Category.category_id == shares.c.category_id
+        ).outerjoin(
+            Member, Member.member_id == shares.c.member_id
+        ).group_by(shares.c.member_id, Member.name, category_name)).all()
+
+        participants = {}
+        category_totals = {}
+        for member_id, member_name, category, total in rows:
+            amount = float(total or 0)
+            if not amount:
+                continue
+            row = participants.setdefault(member_id, {'member_id': member_id, 'name': member_name,
+                                                      'amounts': {}, 'total': 0.0})
+            row['amounts'][category] = amount
+            row['total'] += amount
+            category_totals[category] = category_totals.get(category, 0) + amount
+
+        matrix = {
+            'categories': sorted(category_totals, key=lambda category: (-category_totals[category], category)),
+            'rows': sorted(participants.values(), key=lambda row: (row['member_id'] is not None, row['member_id'] or 0))
+        }
+        with FamilyExpenseService._matrix_lock:
+            cache = FamilyExpenseService._matrix_cache
+            cache.pop(key, None)
+            if len(cache) >= FamilyExpenseService.MATRIX_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+            cache[key] = (version, matrix)
+        return matrix
+
+    @staticmethod
+    def clear_matrix_cache():
+        """Forget cached matrices (e.g. after out-of-band writes or a database reset)"""
+        with FamilyExpenseService._matrix_lock:
+            FamilyExpenseService._matrix_cache.clear()
+
+    @staticmethod
+    def get_category_chart_data(user_id, user_name):
+        """Household spending per category plus each participant's share per category"""
+        category_data = db.session.query(
+            Category.category_name,
+            db.func.sum(Transaction.amount).label('total_amount')
+        ).join(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        ).group_by(Category.category_name).all()
+
+        category_chart_data = [{'category': cat[0], 'amount': float(cat[1])} for cat in category_data]
+
+        per_member_category_data = {}
+        for row in FamilyExpenseService.get_participant_category_matrix(user_id)['rows']:
+            name = row['name'] if row['member_id'] is not None else (user_name or 'You')
+            per_member_category_data[name] = [{'category': category, 'amount': amount}
+                                              for category, amount in row['amounts'].items()]
+
+        return {
+            'family': category_chart_data,
+            'per_member': per_member_category_data
+        }
+
+    @staticmethod
+    def get_family_budgets_with_spent(user_id):
+        """Family category budgets with household spending, highest usage first"""
+        family_budget_records = Budget.query.filter(
+            Budget.user_id == user_id,
+            Budget.is_active == True,
+            Budget.member_id != None
+        ).all()
+
+        category_expenses = dict(db.session.query(
+            Category.category_name,
+            db.func.sum(Transaction.amount)
+        ).join(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        ).group_by(Category.category_name).all())
+
+        family_budgets_with_spent = []
+        for budget in family_budget_records:
+            if budget.category:
+                category_name = budget.category.category_name
+                budget_amount = float(budget.budget_amount)
+                spent = float(category_expenses.get(category_name, 0))
+                percentage = (spent / budget_amount * 100) if budget_amount > 0 else 0
+
+                family_budgets_with_spent.append({
+                    'budget_id': budget.budget_id,
+                    'category_name': category_name,
+                    'budget_amount': budget_amount,
+                    'spent': spent,
+                    'percentage': percentage,
+                    'alert_level': 'over-budget' if percentage >= 100 else ('near-limit' if percentage >= 75 else 'within-budget')
+                })
+
+        family_budgets_with_spent.sort(key=lambda x: x['percentage'], reverse=True)
+        return family_budgets_with_spent
+
+    @staticmethod
+    def get_recent_expenses(user_id, user_name, limit=10):
+        """Most recent expenses with the people sharing each one"""
+        return FamilyExpenseService.get_expense_timeline(user_id, user_name, limit=limit,
+                                                         shared_only=False)['expenses']
+
+    @staticmethod
+    def get_expense_timeline(user_id, user_name, cursor=None, limit=20, member_id=None, category_id=None,
+                             start_date=None, end_date=None, shared_only=True):
+        """One page of expenses, newest first, with keyset pagination on (date, id)
+
+        cursor is the next_cursor of the previous page (ValueError when malformed).
+        Members and categories of the page are fetched in one batched load, not per row.
+        Returns {'expenses': [...], 'next_cursor': str or None}.
+        """
+        query = Transaction.query.options(
+            joinedload(Transaction.category),
+            selectinload(Transaction.members).joinedload(MembersTransaction.member)
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense'
+        )
+        if shared_only:
+            query = query.filter(Transaction.is_family_expense())
+        if member_id is not None:
+            query = query.filter(Transaction.members.any(MembersTransaction.member_id == member_id))
+        if category_id is not None:
+            query = query.filter(Transaction.category_id == category_id)
+        if start_date is not None:
+            query = query.filter(Transaction.transaction_date >= start_date)
+        if end_date is not None:
+            query = query.filter(Transaction.transaction_date < end_date)
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            query = query.filter(db.or_(
+                Transaction.transaction_date < cursor_date,
+                db.and_(Transaction.transaction_date == cursor_date, Transaction.transaction_id < cursor_id)
+            ))
+
+        page = query.order_by(
+            Transaction.transaction_date.desc(), Transaction.transaction_id.desc()
+        ).limit(limit + 1).all()
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        expenses = []
+        for transaction in page:
+            shared_with = []
+            if transaction.user_participates:
+                shared_with.append(user_name or "You")
+            for member_transaction in transaction.members:
+                if member_transaction.member:
+                    shared_with.append(member_transaction.member.name)
+
+            expenses.append({
+                'id': transaction.transaction_id,
+                'date': transaction.transaction_date.strftime('%b %d, %Y'),
+                'iso_date': transaction.transaction_date.isoformat(),
+                'description': 'Family Expense',
+                'category': transaction.category.category_name if transaction.category else 'Other',
+                'amount': float(transaction.amount),
+                'cost_per_person': transaction.get_cost_per_person(),
+                'user_share': float(transaction.user_share_amount),
+                'member_ids': [member_transaction.member_id for member_transaction in transaction.members],
+                'shared_with': shared_with
+            })
+
+        next_cursor = None
+        if has_more:
+            last = page[-1]
+            next_cursor = encode_cursor(last.transaction_date, last.transaction_id)
+        return {'expenses': expenses, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def get_participant_monthly_series(user_id, months=6, now=None):
+        """Household expenses and each participant's share for the last `months` calendar months
+
+        One grouped UNION ALL of the stored user and member shares per year_month; the
+        household total of a month is the sum of its shares. Returns {'participants':
+        [{'member_id' (None for the user), 'name'}], 'months': [{'month', 'month_name',
+        'month_short', 'expenses', 'shares': amounts in participants order}]}, oldest first.
+        """
+        now = now or datetime.now()
+        first_year, first_month = AnalyticsBatchService.shift_month(now.year, now.month, -(months - 1))
+        first_bucket = to_year_month(date(first_year, first_month, 1))
+        last_bucket = to_year_month(now)
+
+        user_shares = db.select(
+            Transaction.year_month,
+            db.cast(db.null(), db.Integer).label('member_id'),
+            Transaction.user_share_amount.label('share')
+        ).where(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.year_month.between(first_bucket, last_bucket)
+        )
+        member_shares = db.select(
+            Transaction.year_month,
+            MembersTransaction.member_id,
+            MembersTransaction.share_amount
+        ).join(Transaction).where(
+            Transaction.user_id == user_id,
+            Transaction.transaction_type == 'expense',
+            Transaction.year_month.between(first_bucket, last_bucket)
+        )
+        shares = db.union_all(user_shares, member_shares).subquery()
+        rows = db.session.execute(db.select(
+            shares.c.year_month, shares.c.member_id, db.func.sum(shares.c.share)
+        ).group_by(shares.c.year_month, shares.c.member_id)).all()
+
+        participants = [{'member_id': None, 'name': None}] + [
+            {'member_id': member.member_id, 'name': member.name}
+            for member in sorted(MemberService.get_user_members(user_id), key=lambda member: member.member_id)
+        ]
+        position = {participant['member_id']: index for index, participant in enumerate(participants)}
+
+        series = []
+        buckets = {}
+        for offset in range(months):
+            year, month = AnalyticsBatchService.shift_month(first_year, first_month, offset)
+            month_date = date(year, month, 1)
+            entry = {
+                'month': month_date.strftime('%Y-%m'),
+                'month_name': month_date.strftime('%B %Y'),
+                'month_short': month_date.strftime('%b'),
+                'expenses': 0.0,
+                'shares': [0.0] * len(participants)
+            }
+            series.append(entry)
+            buckets[to_year_month(month_date)] = entry
+
+        for year_month, member_id, total in rows:
+            entry = buckets.get(year_month)
+            amount = float(total or 0)
+            if entry is None or not amount:
+                continue
+            entry['expenses'] += amount
+            if member_id in position:
+                entry['shares'][position[member_id]] += amount
+
+        for entry in series:
+            entry['expenses'] = round(entry['expenses'], 2)
+        return {'participants': participants, 'months': series}
+
+    @staticmethod
+    def get_monthly_comparison(user_id, now=None):
+        """Household expenses for the last 6 calendar months"""
+        series = FamilyExpenseService.get_participant_monthly_series(user_id, 6, now)
+        return [{key: entry[key] for key in ('month', 'month_name', 'month_short', 'expenses')}
+                for entry in series['months']]
     
     @staticmethod
     def get_family_dashboard(user_id):
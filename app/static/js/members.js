@@ -585,3 +585,91 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   });
 });
+
+// Lazy-loaded family page fragments
+function formatPounds(amount) {
+  return "£" + Math.round(amount);
+}
+
+function renderFamilySummary(summary) {
+  document.getElementById("familyExpensesTotal").textContent = formatPounds(summary.total_family_expenses);
+  document.getElementById("familyBudgetTotal").textContent = formatPounds(summary.family_budget_total);
+
+  const budgetUsed = document.getElementById("familyBudgetUsed");
+  budgetUsed.textContent = Math.round(summary.budget_percentage || 0) + "%";
+  budgetUsed.classList.toggle("negative", summary.budget_percentage >= 75);
+  budgetUsed.classList.toggle("positive", summary.budget_percentage < 75);
+
+  document.getElementById("userContribution").textContent = formatPounds(summary.user_contribution);
+  document.querySelectorAll(".member-contribution").forEach((element) => {
+    element.textContent = formatPounds(summary.member_contributions[element.dataset.memberId] || 0);
+  });
+}
+
+// Expense row buttons (re-bound after the recent expenses fragment loads)
+function setupExpenseEventListeners() {
+  document.querySelectorAll(".edit-expense").forEach((button) => {
+    button.addEventListener("click", function () {
+      openEditExpenseModal(this.getAttribute("data-expense-id"));
+    });
+  });
+
+  document.querySelectorAll(".delete-expense").forEach((button) => {
+    button.addEventListener("click", function () {
+      const expenseId = this.getAttribute("data-expense-id");
+      if (!confirm("Are you sure you want to delete this expense?")) return;
+
+      fetch(`/delete_expense/${expenseId}`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+      })
+        .then((response) => response.json())
+        .then((data) => {
+          if (data.status === "success") {
+            location.reload();
+          } else {
+            alert("Error deleting expense");
+          }
+        })
+        .catch((error) => {
+          console.error("Error:", error);
+          alert("Error deleting expense");
+        });
+    });
+  });
+}
+
+function loadFamilyFragments() {
+  const container = document.getElementById("familyFragments");
+  if (!container) return;
+
+  fetch(container.dataset.summaryUrl, { headers: { Accept: "application/json" } })
+    .then((response) => response.json())
+    .then(renderFamilySummary)
+    .catch((error) => console.error("Error loading family summary:", error));
+
+  fetch(container.dataset.categoryChartUrl, { headers: { Accept: "application/json" } })
+    .then((response) => response.json())
+    .then((data) => {
+      familyData = data.family || [];
+      memberData = data.per_member || {};
+      updateChartView("family");
+    })
+    .catch((error) => console.error("Error loading category chart:", error));
+
+  fetch(container.dataset.budgetAlertsUrl)
+    .then((response) => response.text())
+    .then((html) => {
+      document.getElementById("familyBudgetsFragment").innerHTML = html;
+      setupFamilyBudgetEventListeners();
+    })
+    .catch((error) => console.error("Error loading family budgets:", error));
+
+  fetch(container.dataset.recentExpensesUrl)
+    .then((response) => response.text())
+    .then((html) => {
+      document.getElementById("recentExpensesFragment").innerHTML = html;
+      setupExpenseEventListeners();
+    })
+    .catch((error) => console.error("Error loading recent expenses:", error));
+}
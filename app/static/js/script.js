@@ -56,3 +56,205 @@ document.addEventListener("DOMContentLoaded", () => {
         }, 5000);
     });
 });
+
+/* ================================
+   DASHBOARD: lazy-loaded panels
+   ================================ */
+
+// Charts, comparison series and budget alerts load after the page shell
+function initDashboard(container) {
+    const CHART_COLORS = [
+        '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0',
+        '#9966FF', '#FF9F40', '#C9CBCF', '#FF6384'
+    ];
+    let categoryChartInstance = null;
+    let monthlyChartInstance = null;
+
+    function drawEmptyChart(canvasId, message) {
+        const ctx = document.getElementById(canvasId).getContext('2d');
+        ctx.font = '14px Arial';
+        ctx.fillStyle = '#666';
+        ctx.textAlign = 'center';
+        ctx.fillText(message, 200, 150);
+    }
+
+    function renderCategoryChart(categorySpending) {
+        const labels = Object.keys(categorySpending);
+        if (categoryChartInstance) {
+            categoryChartInstance.destroy();
+            categoryChartInstance = null;
+        }
+        if (labels.length === 0) {
+            drawEmptyChart('categoryChart', 'No spending data for ' + container.dataset.currentMonth);
+            return;
+        }
+
+        categoryChartInstance = new Chart(document.getElementById('categoryChart').getContext('2d'), {
+            type: 'pie',
+            data: {
+                labels: labels,
+                datasets: [{
+                    data: labels.map(label => categorySpending[label]),
+                    backgroundColor: CHART_COLORS
+                }]
+            },
+            options: {
+                responsive: true,
+                plugins: {
+                    legend: {
+                        position: 'bottom'
+                    },
+                    tooltip: {
+                        callbacks: {
+                            label: function(context) {
+                                const label = context.label || '';
+                                const value = context.raw || 0;
+                                const total = context.dataset.data.reduce((a, b) => a + b, 0);
+                                const percentage = Math.round((value / total) * 100);
+                                return `${label}: £${value.toFixed(2)} (${percentage}%)`;
+                            }
+                        }
+                    }
+                }
+            }
+        });
+    }
+
+    function renderMonthlyComparisonChart(months) {
+        if (monthlyChartInstance) {
+            monthlyChartInstance.destroy();
+            monthlyChartInstance = null;
+        }
+        if (months.length === 0) {
+            drawEmptyChart('monthlyComparisonChart', 'No monthly comparison data available');
+            return;
+        }
+
+        monthlyChartInstance = new Chart(document.getElementById('monthlyComparisonChart').getContext('2d'), {
+            type: 'line',
+            data: {
+                labels: months.map(month => month.month_short),
+                datasets: [
+                    {
+                        label: 'Income',
+                        data: months.map(month => month.income),
+                        borderColor: '#10B981',
+                        backgroundColor: 'rgba(16, 185, 129, 0.1)',
+                        tension: 0.4,
+                        fill: true
+                    },
+                    {
+                        label: 'Expenses',
+                        data: months.map(month => month.expenses),
+                        borderColor: '#EF4444',
+                        backgroundColor: 'rgba(239, 68, 68, 0.1)',
+                        tension: 0.4,
+                        fill: true
+                    }
+                ]
+            },
+            options: {
+                responsive: true,
+                plugins: {
+                    legend: {
+                        position: 'top'
+                    }
+                },
+                scales: {
+                    y: {
+                        beginAtZero: true,
+                        ticks: {
+                            callback: function(value) {
+                                return '£' + value;
+                            }
+                        }
+                    }
+                }
+            }
+        });
+    }
+
+    function loadComparison(range) {
+        const url = new URL(container.dataset.comparisonUrl, window.location.origin);
+        url.searchParams.set('range', range);
+
+        return fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(data => {
+                renderMonthlyComparisonChart(data.months);
+                document.getElementById('comparisonMonthsLabel').textContent =
+                    data.months.length > 0 ? `- ${data.months.length} months` : '';
+            })
+            .catch(error => console.error('Error loading monthly comparison:', error));
+    }
+
+    // Switching range only refetches the comparison series, not the whole page
+    function changeTimeRange(range) {
+        const select = document.getElementById('timeRangeSelect');
+        const option = select.querySelector(`option[value="${range}"]`);
+        if (option) {
+            document.getElementById('categoryRangeLabel').textContent = '- ' + option.textContent;
+        }
+
+        const url = new URL(window.location.href);
+        url.searchParams.set('range', range);
+        window.history.replaceState(null, '', url.toString());
+        loadComparison(range);
+    }
+
+    function loadBudgetAlerts() {
+        fetch(container.dataset.budgetAlertsUrl)
+            .then(response => response.text())
+            .then(html => {
+                document.getElementById('budgetAlertsSlider').innerHTML = html;
+            })
+            .catch(error => console.error('Error loading budget alerts:', error));
+    }
+
+    // Live totals and budget alerts pushed by the server after each change
+    function connectLiveUpdates() {
+        if (!window.EventSource) return;
+        const source = new EventSource(container.dataset.liveUrl);
+        let connected = false;
+
+        source.addEventListener('snapshot', function(event) {
+            const snapshot = JSON.parse(event.data);
+            document.getElementById('monthlyIncomeAmount').textContent = '+£' + snapshot.monthly_income.toFixed(2);
+            document.getElementById('monthlyExpensesAmount').textContent = '-£' + snapshot.monthly_expenses.toFixed(2);
+
+            const totalBudget = snapshot.budgets.find(budget => budget.scope === 'total');
+            if (totalBudget) {
+                const remaining = document.getElementById('remainingBudgetAmount');
+                remaining.textContent = '£' + totalBudget.amount_remaining.toFixed(2);
+                remaining.classList.toggle('positive', totalBudget.amount_remaining >= 0);
+                remaining.classList.toggle('negative', totalBudget.amount_remaining < 0);
+            }
+
+            // The first snapshot matches what the page already shows
+            if (connected) {
+                loadBudgetAlerts();
+            }
+            connected = true;
+        });
+    }
+
+    document.getElementById('timeRangeSelect').addEventListener('change', function() {
+        changeTimeRange(this.value);
+    });
+
+    loadComparison(container.dataset.range);
+    fetch(container.dataset.categoriesUrl, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(renderCategoryChart)
+        .catch(error => console.error('Error loading category spending:', error));
+
+    loadBudgetAlerts();
+    connectLiveUpdates();
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    const container = document.getElementById("dashboardFragments");
+    if (container) {
+        initDashboard(container);
+    }
+});
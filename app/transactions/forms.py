@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
-from wtforms import DecimalField, SelectField, DateField, SubmitField
-from wtforms.validators import DataRequired, NumberRange, Optional
+from wtforms import DecimalField, SelectField, DateField, SubmitField, HiddenField, StringField, TextAreaField
+from wtforms.validators import DataRequired, NumberRange, Optional, Length
 from datetime import datetime
+from uuid import uuid4
 
 class TransactionForm(FlaskForm):
     amount = DecimalField('Amount', 
@@ -20,6 +21,15 @@ class TransactionForm(FlaskForm):
                                 validators=[DataRequired()],
                                 default=datetime.today)
     
+    description = StringField('Description',
+                              validators=[Optional(), Length(max=255)])
+    
+    tags = StringField('Tags',
+                       validators=[Optional(), Length(max=255)])
+    
+    # Fresh per rendered form; a double-submit replays instead of adding a second row
+    idempotency_key = HiddenField(default=lambda: uuid4().hex)
+    
     submit = SubmitField('Add Transaction')
 
 class EditTransactionForm(FlaskForm):
@@ -38,4 +48,10 @@ class EditTransactionForm(FlaskForm):
     transaction_date = DateField('Date', 
                                 validators=[DataRequired()])
     
+    description = TextAreaField('Description',
+                                validators=[Optional(), Length(max=255)])
+    
+    tags = StringField('Tags',
+                       validators=[Optional(), Length(max=255)])
+    
     submit = SubmitField('Update Transaction')
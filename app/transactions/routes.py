@@ -1,10 +1,13 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, make_response, send_file
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, make_response, send_file, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
 from app import db
 from app.models import Transaction, Category, Budget
+from app.events import event_hub, format_sse
 from datetime import datetime, timedelta
-from app.services import BudgetService, SimpleAnalyticsService, ExportService, CategoryService
+from app.services import BudgetService, SimpleAnalyticsService, ExportService, CategoryService, DashboardService, IdempotencyService, BulkTransactionService, StatementImportService, DuplicateService, TransactionSearchService, TagService, RecurringService
+from app.importer import detect_format, iter_stream_lines, parse_statement, FORMATS
 import json
+import queue
 
 transactions_bp = Blueprint('transactions', __name__)
 
@@ -56,20 +59,33 @@ def add_transaction():
                     return redirect(url_for('transactions.transactions'))
             
             category_id = form.category_id.data if form.category_id.data != 0 else None
+            tag_names = TagService.parse_names(form.tags.data)
             
-            transaction = Transaction(
+            values = dict(
                 user_id=current_user.user_id,
                 amount=form.amount.data,
                 transaction_type=form.transaction_type.data,
                 category_id=category_id,
-                transaction_date=form.transaction_date.data
+                transaction_date=form.transaction_date.data,
+                description=(form.description.data or '').strip() or None
             )
             
-            db.session.add(transaction)
-            db.session.commit()
+            def write(session):
+                transaction = Transaction(**values)
+                session.add(transaction)
+                TagService.set_tags(session, transaction, tag_names)
+                session.flush()
+                return transaction.transaction_id
+            
+            # A replayed form token / Idempotency-Key returns the first result without a second row
+            IdempotencyService.run_once(current_user.user_id, 'add_transaction',
+                                        IdempotencyService.request_key(request), write)
             flash('Transaction added successfully!', 'success')
             return redirect(url_for('transactions.transactions'))
             
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
         except Exception as e:
             db.session.rollback()
             flash('Error adding transaction. Please try again.', 'error')
@@ -94,7 +110,9 @@ def edit_transaction(transaction_id):
         'amount': transaction.amount,
         'transaction_type': transaction.transaction_type,
         'transaction_date': transaction.transaction_date,
-        'category_id': transaction.category_id if transaction.category_id is not None else 0
+        'category_id': transaction.category_id if transaction.category_id is not None else 0,
+        'description': transaction.description,
+        'tags': ', '.join(TagService.get_tag_names(transaction))
     }
 
     form = EditTransactionForm(data=initial_data)
@@ -113,11 +131,16 @@ def edit_transaction(transaction_id):
             transaction.transaction_type = form.transaction_type.data
             transaction.category_id = form.category_id.data if form.category_id.data != 0 else None
             transaction.transaction_date = form.transaction_date.data
+            transaction.description = (form.description.data or '').strip() or None
+            TagService.set_tags(db.session, transaction, TagService.parse_names(form.tags.data))
             
             db.session.commit()
             flash('Transaction updated successfully!', 'success')
             return redirect(url_for('transactions.transactions'))
             
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
         except Exception as e:
             db.session.rollback()
             flash('Error updating transaction.', 'error')
@@ -148,6 +171,203 @@ def delete_transaction(transaction_id):
     
     return redirect(url_for('transactions.transactions'))
 
+@transactions_bp.route('/api/bulk', methods=['POST'])
+@login_required
+def bulk_transactions():
+    """Delete, recategorize, redate or reassign members of many transactions in one write
+
+    JSON body: {"action": "delete" | "recategorize" | "set_date" | "assign_members",
+    "ids": [...] or "filter": {...}, plus "category_id" / "date" (YYYY-MM-DD) /
+    "member_ids" for the action}. Honours an Idempotency-Key header.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        where = BulkTransactionService.selection(current_user.user_id, data.get('ids'), data.get('filter'))
+        params = {}
+        if data.get('action') == 'recategorize':
+            params['category_id'] = int(data['category_id']) if data.get('category_id') is not None else None
+        elif data.get('action') == 'set_date':
+            params['new_date'] = datetime.strptime(data.get('date') or '', '%Y-%m-%d').date()
+        elif data.get('action') == 'assign_members':
+            params['member_ids'] = data.get('member_ids') or []
+        affected, replayed = BulkTransactionService.run(
+            current_user.user_id, data.get('action'), where,
+            idempotency_key=IdempotencyService.request_key(request), **params
+        )
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'affected': affected, 'replayed': replayed})
+
+@transactions_bp.route('/api/import', methods=['POST'])
+@login_required
+def import_statement():
+    """Import a bank statement upload (CSV, OFX or QIF) as transactions
+
+    Multipart form: "statement" file, optional "format" (else taken from the file
+    extension) and optional "rules", a JSON list of {"pattern", "category"} tried
+    before the built-in keyword rules ("re:" prefix for a regular expression).
+    Rows already stored are skipped unless "keep_duplicates" is "true".
+    Honours an Idempotency-Key header.
+    """
+    upload = request.files.get('statement')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'message': 'Choose a statement file to import.'}), 400
+    try:
+        statement_format = (request.form.get('format') or '').lower() or detect_format(upload.filename)
+        if statement_format not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}.")
+        rules = [(rule['pattern'], rule['category']) for rule in json.loads(request.form.get('rules') or '[]')]
+        report, replayed = StatementImportService.run(
+            current_user.user_id,
+            lambda: parse_statement(iter_stream_lines(upload.stream), statement_format),
+            rules=rules,
+            idempotency_key=IdempotencyService.request_key(request),
+            skip_duplicates=request.form.get('keep_duplicates') != 'true'
+        )
+    except (ValueError, TypeError, KeyError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'replayed': replayed, **report})
+
+@transactions_bp.route('/api/search')
+@login_required
+def search_transactions():
+    """Full-text search of descriptions: ?q= words (the last one may be partial), ?limit= (max 100)"""
+    return jsonify({'success': True, 'results': TransactionSearchService.search(
+        current_user.user_id, request.args.get('q', ''), request.args.get('limit', 20, type=int)
+    )})
+
+@transactions_bp.route('/api/merchants/suggest')
+@login_required
+def suggest_merchants():
+    """Merchant autocomplete for ?prefix=, most used first"""
+    return jsonify({'success': True, 'merchants': TransactionSearchService.suggest_merchants(
+        current_user.user_id, request.args.get('prefix', ''), request.args.get('limit', 10, type=int)
+    )})
+
+def _date_range_args():
+    """(start, end) datetimes from ?start=/?end= (YYYY-MM-DD, end inclusive); ValueError if malformed"""
+    start = request.args.get('start')
+    end = request.args.get('end')
+    return (datetime.strptime(start, '%Y-%m-%d') if start else None,
+            datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None)
+
+@transactions_bp.route('/api/merchants/top')
+@login_required
+def top_merchants():
+    """Merchants by total spent: optional ?start=/?end= (YYYY-MM-DD, inclusive), ?type=, ?limit="""
+    transaction_type = request.args.get('type', 'expense')
+    try:
+        start_date, end_date = _date_range_args()
+        if transaction_type not in ('income', 'expense'):
+            raise ValueError('type must be income or expense.')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'merchants': TransactionSearchService.top_merchants(
+        current_user.user_id, start_date, end_date, transaction_type, request.args.get('limit', 10, type=int)
+    )})
+
+@transactions_bp.route('/api/<int:transaction_id>/tags', methods=['PUT'])
+@login_required
+def set_transaction_tags(transaction_id):
+    """Replace a transaction's tags: JSON {"tags": ["holiday", ...]} or {"tags": "holiday, spain"}"""
+    transaction = Transaction.query.filter_by(
+        transaction_id=transaction_id,
+        user_id=current_user.user_id
+    ).first_or_404()
+    try:
+        names = TagService.set_tags(db.session, transaction,
+                                    TagService.parse_names((request.get_json(silent=True) or {}).get('tags')))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'tags': sorted(names)})
+
+@transactions_bp.route('/api/tags')
+@login_required
+def list_tags():
+    """The user's tags and how many transactions carry each"""
+    return jsonify({'success': True, 'tags': TagService.list_tags(current_user.user_id)})
+
+@transactions_bp.route('/api/tags/filter')
+@login_required
+def filter_by_tags():
+    """Totals of transactions tagged ?all=a,b (every one), ?any=c,d (at least one), ?none=e (none)
+
+    Optional ?start=/?end= (YYYY-MM-DD, inclusive) and ?limit= ids to return (max 500).
+    """
+    try:
+        start_date, end_date = _date_range_args()
+        selection = {key: TagService.parse_names(request.args.get(key, '')) for key in ('all', 'any', 'none')}
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, **TagService.filter_transactions(
+        current_user.user_id, selection['all'], selection['any'], selection['none'],
+        start_date, end_date, request.args.get('limit', 50, type=int)
+    )})
+
+@transactions_bp.route('/api/tags/totals')
+@login_required
+def tag_totals():
+    """Count, income and expenses per tag, most spent first: optional ?start=/?end= (YYYY-MM-DD, inclusive)"""
+    try:
+        start_date, end_date = _date_range_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'tags': TagService.tag_totals(current_user.user_id, start_date, end_date)})
+
+@transactions_bp.route('/api/recurring', methods=['GET', 'POST'])
+@login_required
+def recurring_rules():
+    """List the user's recurring rules, or create one
+
+    JSON body: {"type", "amount", "interval_unit": "day" | "week" | "month" | "year",
+    "interval_count" (default 1), "anchor_date" (YYYY-MM-DD, first occurrence),
+    optional "end_date", "category_id", "description", "member_ids", "user_participates"}.
+    Occurrences are entered by the `flask recurring run` job, not by requests.
+    """
+    if request.method == 'GET':
+        return jsonify({'success': True, 'rules': RecurringService.list_rules(current_user.user_id)})
+
+    data = request.get_json(silent=True) or {}
+    try:
+        rule = RecurringService.create_rule(
+            current_user.user_id, data.get('type'), data.get('amount'), data.get('interval_unit'),
+            datetime.strptime(data.get('anchor_date') or '', '%Y-%m-%d').date(),
+            interval_count=data.get('interval_count', 1),
+            category_id=data.get('category_id'),
+            description=data.get('description'),
+            member_ids=data.get('member_ids') or [],
+            user_participates=data.get('user_participates', True),
+            end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+        )
+    except (ValueError, TypeError, ArithmeticError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'rule': rule.to_dict()}), 201
+
+@transactions_bp.route('/api/recurring/<int:rule_id>', methods=['DELETE'])
+@login_required
+def delete_recurring_rule(rule_id):
+    """Stop a recurring rule; transactions it already entered stay"""
+    if not RecurringService.delete_rule(current_user.user_id, rule_id):
+        return jsonify({'success': False, 'message': 'Recurring rule not found.'}), 404
+    return jsonify({'success': True})
+
+@transactions_bp.route('/api/duplicates')
+@login_required
+def possible_duplicates():
+    """Transactions repeating the amount of an earlier one within ?days= days (default 3, max 31)"""
+    days = request.args.get('days', DuplicateService.WINDOW_DAYS, type=int)
+    if not 0 <= days <= 31:
+        return jsonify({'success': False, 'message': 'days must be between 0 and 31.'}), 400
+    return jsonify({'success': True,
+                    'duplicates': DuplicateService.find_near_duplicates(current_user.user_id, days)})
+
 @transactions_bp.route('/api/transaction_stats')
 @login_required
 def transaction_stats():
@@ -276,6 +496,55 @@ def monthly_comparison():
     monthly_data.reverse()
     return jsonify(monthly_data)
 
+@transactions_bp.route('/api/live')
+@login_required
+def live_updates():
+    """Server-Sent Events: a snapshot on connect, then totals and budget alert changes after each write"""
+    user_id = current_user.user_id
+    heartbeat = current_app.config['LIVE_HEARTBEAT_SECONDS']
+    subscription = event_hub.subscribe(user_id)
+
+    def stream():
+        try:
+            version = event_hub.version(user_id)
+            snapshot = DashboardService.get_live_snapshot(user_id)
+            # Don't hold a pooled connection while the stream sits idle
+            db.session.remove()
+            yield format_sse(snapshot, 'snapshot', version)
+
+            while True:
+                try:
+                    message = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+
+                # Coalesce a burst of writes into one recomputation
+                while True:
+                    try:
+                        message = subscription.get_nowait()
+                    except queue.Empty:
+                        break
+
+                previous = {budget['budget_id']: budget['status'] for budget in snapshot['budgets']}
+                new_snapshot = DashboardService.get_live_snapshot(user_id)
+                db.session.remove()
+                if new_snapshot == snapshot:
+                    continue
+                snapshot = new_snapshot
+
+                for budget in snapshot['budgets']:
+                    if previous.get(budget['budget_id']) != budget['status']:
+                        yield format_sse(budget, 'budget_alert', message['version'])
+                yield format_sse(snapshot, 'snapshot', message['version'])
+        finally:
+            event_hub.unsubscribe(user_id, subscription)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @transactions_bp.route('/export/csv')
 @login_required
 def export_csv():
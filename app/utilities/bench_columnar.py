@@ -0,0 +1,59 @@
+"""
+Columnar Analytics Benchmark
+Compares SimpleAnalyticsService with the cached NumPy snapshots for a
+heavy user on a SQLite file database.
+
+Usage: python -m app.utilities.bench_columnar [transactions] [iterations]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from app import create_app, db
+from app.columnar import ColumnarAnalytics, is_available
+from app.services import SimpleAnalyticsService
+from app.utilities.bench_dashboard import seed_heavy_user, time_runs
+
+
+def main():
+    if not is_available():
+        print(" numpy is not installed; nothing to compare")
+        return
+
+    transaction_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        })
+
+        with app.app_context():
+            db.create_all()
+            user_id = seed_heavy_user(transaction_count)
+            print(f" Seeded {transaction_count} transactions")
+
+            now = datetime.now()
+            start, end = datetime(now.year - 2, 1, 1), datetime(now.year + 1, 1, 1)
+
+            time_runs('snapshot load', lambda: (ColumnarAnalytics.invalidate(user_id),
+                                                ColumnarAnalytics.get_columns(user_id)), iterations)
+
+            print("\n Monthly series (3 years)")
+            time_runs('sql grouped', lambda: SimpleAnalyticsService.get_monthly_series(
+                user_id, start, end), iterations)
+            time_runs('columnar', lambda: ColumnarAnalytics.get_monthly_series(
+                user_id, start, end), iterations)
+
+            print("\n Spending by category")
+            time_runs('orm', lambda: SimpleAnalyticsService.get_spending_by_category(user_id), iterations)
+            time_runs('columnar', lambda: ColumnarAnalytics.get_spending_by_category(user_id), iterations)
+
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Dashboard Panel Benchmark
+Compares serial and concurrent dashboard panel computation on a WAL-mode
+SQLite file database seeded with a heavy user.
+
+Usage: python -m app.utilities.bench_dashboard [transactions] [iterations]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.models import User, Category, Transaction, Budget
+from app.services import DashboardService, LedgerService
+
+CATEGORIES = ['Transport', 'Utilities', 'Entertainment', 'Food', 'Healthcare', 'Shopping', 'Other']
+
+
+def seed_heavy_user(transaction_count):
+    """Create one user with a few years of transactions and a budget per category"""
+    categories = [Category(category_name=name, user_id=None) for name in CATEGORIES]
+    user = User(user_name='Benchmark User', email='bench@example.com')
+    user.set_password('Password123!')
+    db.session.add_all(categories + [user])
+    db.session.commit()
+
+    now = datetime.now()
+    rows = []
+    for _ in range(transaction_count):
+        rows.append({
+            'user_id': user.user_id,
+            'category_id': random.choice(categories).category_id,
+            'amount': round(random.uniform(1, 300), 2),
+            'transaction_type': 'income' if random.random() < 0.1 else 'expense',
+            'transaction_date': now - timedelta(days=random.randint(0, 730)),
+            'user_participates': True
+        })
+    db.session.execute(Transaction.__table__.insert(), rows)
+
+    for category in categories:
+        db.session.add(Budget(user_id=user.user_id, category_id=category.category_id,
+                              budget_amount=500, is_active=True,
+                              alert_threshold=80.0, notifications_enabled=True))
+    db.session.commit()
+    # The Core insert bypasses the ledger hooks
+    LedgerService.rebuild(user.user_id)
+    return user.user_id
+
+
+def time_runs(label, func, iterations):
+    """Run func repeatedly and print mean/best wall time"""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    print(f"  {label:<28} mean {sum(timings) / len(timings) * 1000:8.1f} ms   "
+          f"best {min(timings) * 1000:8.1f} ms")
+
+
+def main():
+    transaction_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        })
+
+        with app.app_context():
+            db.create_all()
+            # WAL lets the panel threads read concurrently; the mode persists in the file
+            db.session.execute(db.text('PRAGMA journal_mode=WAL'))
+            user_id = seed_heavy_user(transaction_count)
+            print(f" Seeded {transaction_count} transactions (WAL-mode SQLite file)")
+
+            for time_range in ('6months', 'all'):
+                print(f"\n Range: {time_range}")
+                time_runs('serial', lambda: DashboardService.get_dashboard_panels(
+                    user_id, time_range), iterations)
+                for workers in (2, 4, 6):
+                    time_runs(f'concurrent ({workers} workers)',
+                              lambda: DashboardService.get_dashboard_panels_concurrent(
+                                  app, user_id, time_range,
+                                  max_workers=workers, deadline=30.0),
+                              iterations)
+
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Statement Import Benchmark
+Generates a large CSV bank statement and measures parse + categorize throughput,
+end-to-end import throughput into a SQLite file database, a re-import of the
+same file (all rows caught as duplicates), and peak memory (Python heap via
+tracemalloc, process RSS via getrusage).
+
+Usage: python -m app.utilities.bench_import [lines]
+"""
+
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from app import create_app, db
+from app.importer import CategoryRules, StatementError, iter_file_lines, parse_statement
+from app.models import User, Category, Transaction
+from app.services import CategoryService, StatementImportService
+
+PAYEES = ('TESCO STORES {n}', 'UBER *TRIP {n}', 'NETFLIX.COM', 'AMAZON MKTPLACE {n}', 'BOOTS {n}',
+          'BRITISH GAS', 'Card payment {n}', 'Transfer ref {n}', 'SALARY ACME LTD')
+
+
+def write_statement(path, lines):
+    """CSV statement of lines rows spread over the last five years, oldest first like a bank export"""
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=5 * 365)
+    with open(path, 'w', newline='') as handle:
+        handle.write('Date,Description,Amount\n')
+        for line in range(lines):
+            payee = rng.choice(PAYEES).format(n=rng.randint(1, 9999))
+            amount = rng.randint(100, 500000) if payee.startswith('SALARY') else -rng.randint(1, 20000)
+            day = start + timedelta(days=line * 5 * 365 // lines)
+            handle.write(f'{day:%d/%m/%Y},{payee},{amount / 100:.2f}\n')
+
+
+def parse_pass(path, rules):
+    """Parse and categorize every row without touching the database; returns (rows, matched)"""
+    rows = matched = 0
+    for row in parse_statement(iter_file_lines(path), 'csv'):
+        if isinstance(row, StatementError):
+            continue
+        rows += 1
+        matched += rules.match(row.description) is not None
+    return rows, matched
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rules = CategoryRules.default()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        statement = os.path.join(tmp_dir, 'statement.csv')
+        write_statement(statement, lines)
+        print(f" {lines:,} lines, {os.path.getsize(statement) / 2 ** 20:.1f} MiB, "
+              f"{len(rules.keywords)} keyword rules in one trie pattern")
+        rss_before = peak_rss_mb()
+
+        start = time.perf_counter()
+        rows, matched = parse_pass(statement, rules)
+        elapsed = time.perf_counter() - start
+        print(f"  parse + categorize   {rows / elapsed:10,.0f} rows/s   {elapsed:7.2f} s   "
+              f"{matched / rows:.0%} categorized")
+
+        tracemalloc.start()
+        parse_pass(statement, rules)
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  parse heap peak      {heap_peak / 2 ** 20:10.2f} MiB (tracemalloc)")
+
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"})
+        with app.app_context():
+            db.create_all()
+            CategoryService.initialize_system_categories()
+            user = User(user_name='Benchmark User', email='bench@example.com')
+            user.set_password('Password123!')
+            db.session.add(user)
+            db.session.commit()
+
+            start = time.perf_counter()
+            report, _ = StatementImportService.run(
+                user.user_id, lambda: parse_statement(iter_file_lines(statement), 'csv'))
+            elapsed = time.perf_counter() - start
+            print(f"  full import          {report['imported'] / elapsed:10,.0f} rows/s   {elapsed:7.2f} s   "
+                  f"batches of {StatementImportService.BATCH_SIZE}")
+            assert Transaction.query.count() == report['imported'] == lines
+
+            # Same statement again: every row is matched against the stored ones, batch by batch
+            start = time.perf_counter()
+            report, _ = StatementImportService.run(
+                user.user_id, lambda: parse_statement(iter_file_lines(statement), 'csv'))
+            elapsed = time.perf_counter() - start
+            print(f"  re-import            {lines / elapsed:10,.0f} rows/s   {elapsed:7.2f} s   "
+                  f"{report['duplicates']:,} duplicates skipped")
+            print(f"  process peak RSS     {peak_rss_mb():10.1f} MiB (was {rss_before:.1f} MiB before parsing)")
+
+            assert Transaction.query.count() == lines
+            assert Category.query.count() > 0
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Recurring Transaction Benchmark
+Creates many users with daily, weekly and monthly rules anchored some days in
+the past, then times the materializer catching all of them up in one run and
+the no-op run that follows, on a SQLite file database.
+
+Usage: python -m app.utilities.bench_recurring [users] [rules_per_user] [days_behind]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from app import create_app, db
+from app.models import Category, Member, RecurringRule, RecurringRuleMember, User
+from app.services import RecurringService
+
+
+def seed_rules(users, rules_per_user, days_behind):
+    """users users, each with rules_per_user rules; a third of them shared with a member"""
+    rng = random.Random(7)
+    category = Category(category_name='Bills', user_id=None)
+    db.session.add(category)
+    anchor = date.today() - timedelta(days=days_behind)
+    for index in range(users):
+        user = User(user_name=f'User {index}', email=f'user{index}@example.com')
+        user.set_password('Password123!')
+        member = Member(name='Partner', relationship='Spouse', user=user)
+        db.session.add_all([user, member])
+        db.session.flush()
+        for number in range(rules_per_user):
+            rule = RecurringRule(user_id=user.user_id, category_id=category.category_id,
+                                 transaction_type='expense', amount=rng.randint(100, 50000) / 100,
+                                 description=f'Subscription {number}', user_participates=True,
+                                 interval_unit=rng.choice(('day', 'week', 'month')), interval_count=1,
+                                 anchor_date=anchor + timedelta(days=rng.randint(0, 6)),
+                                 occurrence_count=0)
+            rule.next_date = rule.anchor_date
+            if number % 3 == 0:
+                rule.members = [RecurringRuleMember(member_id=member.member_id)]
+            db.session.add(rule)
+    db.session.commit()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rules_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    days_behind = int(sys.argv[3]) if len(sys.argv) > 3 else 90
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"})
+        with app.app_context():
+            db.create_all()
+            seed_rules(users, rules_per_user, days_behind)
+            print(f" {users * rules_per_user:,} rules over {users} users, anchored ~{days_behind} days ago")
+
+            for label in ('catch-up run', 'next run (nothing due)'):
+                start = time.perf_counter()
+                report = RecurringService.materialize()
+                print(f"  {label:<24} {(time.perf_counter() - start) * 1000:9.1f} ms   "
+                      f"{report['transactions']:,} transactions from {report['rules']:,} rules")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
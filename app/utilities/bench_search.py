@@ -0,0 +1,95 @@
+"""
+Transaction Search Benchmark
+Loads a SQLite file database with many described transactions spread over many
+users, then times full-text search, merchant autocomplete and top merchants for
+one user (median of repeated calls).
+
+Usage: python -m app.utilities.bench_search [rows] [users]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.models import User, Transaction
+from app.services import TransactionSearchService
+from app.utils import merchant_name, to_year_month
+
+MERCHANTS = ('Tesco Stores', 'Tesco Express', 'Sainsbury Local', 'Uber Trip', 'Uber Eats', 'Netflix',
+             'Amazon Marketplace', 'Boots Pharmacy', 'British Gas', 'Trainline', 'Pret A Manger',
+             'Deliveroo', 'Costa Coffee', 'Shell Petrol', 'Argos', 'Spotify')
+REPEATS = 20
+
+
+def load(rows, users):
+    """Bulk-insert rows described transactions (the FTS triggers index each one)"""
+    rng = random.Random(7)
+    user_ids = []
+    for index in range(users):
+        user = User(user_name=f'User {index}', email=f'user{index}@example.com')
+        user.set_password('Password123!')
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.user_id)
+    db.session.commit()
+
+    start = datetime.now() - timedelta(days=3 * 365)
+    batch = []
+    for _ in range(rows):
+        description = f'{rng.choice(MERCHANTS)} {rng.randint(1, 9999)}'
+        amount = rng.randint(100, 20000) / 100
+        when = start + timedelta(days=rng.randint(0, 3 * 365))
+        batch.append({'user_id': rng.choice(user_ids), 'amount': amount, 'transaction_type': 'expense',
+                      'transaction_date': when, 'year': when.year, 'year_month': to_year_month(when),
+                      'user_share_amount': amount, 'description': description,
+                      'merchant': merchant_name(description)})
+        if len(batch) == 10000:
+            db.session.execute(Transaction.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Transaction.__table__.insert(), batch)
+    db.session.commit()
+    return user_ids[0]
+
+
+def timed(label, call):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"  {label:<32} {statistics.median(timings):8.2f} ms   {len(result)} results")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"})
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            user_id = load(rows, users)
+            print(f" {rows:,} transactions over {users} users loaded in {time.perf_counter() - start:.1f} s "
+                  f"(~{rows // users:,} per user)")
+
+            timed('search "tesco"', lambda: TransactionSearchService.search(user_id, 'tesco'))
+            timed('search "uber ea" (prefix)', lambda: TransactionSearchService.search(user_id, 'uber ea'))
+            timed('search "te" (2-char prefix)', lambda: TransactionSearchService.search(user_id, 'te'))
+            timed('suggest merchants "tes"', lambda: TransactionSearchService.suggest_merchants(user_id, 'tes'))
+            timed('top merchants (all time)', lambda: TransactionSearchService.top_merchants(user_id))
+            last_month = datetime.now() - timedelta(days=30)
+            timed('top merchants (last 30 days)',
+                  lambda: TransactionSearchService.top_merchants(user_id, start_date=last_month))
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Tag Filter Benchmark
+Seeds a heavy user whose transactions carry random tags, then compares tag
+filters and per-tag totals answered by EXISTS subqueries with the same answered
+by the cached tag bitsets (COLUMNAR_ANALYTICS), on a SQLite file database.
+
+Usage: python -m app.utilities.bench_tags [transactions] [tags] [iterations]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+from app import create_app, db
+from app.columnar import ColumnarAnalytics, is_available
+from app.models import Tag, TransactionTag, Transaction
+from app.services import TagService
+from app.utilities.bench_dashboard import seed_heavy_user, time_runs
+
+
+def seed_tags(user_id, tag_count):
+    """tag_count tags; each transaction gets up to three, the first tags far more often"""
+    tags = [Tag(user_id=user_id, name=f'tag-{index}') for index in range(tag_count)]
+    db.session.add_all(tags)
+    db.session.flush()
+    weights = [1 / (rank + 1) for rank in range(tag_count)]
+    links = []
+    for (transaction_id,) in db.session.query(Transaction.transaction_id).filter_by(user_id=user_id):
+        for tag in set(random.choices(tags, weights, k=random.randint(0, 3))):
+            links.append({'transaction_id': transaction_id, 'tag_id': tag.tag_id})
+    db.session.execute(TransactionTag.__table__.insert(), links)
+    db.session.commit()
+    return len(links)
+
+
+def main():
+    if not is_available():
+        print(" numpy is not installed; nothing to compare")
+        return
+
+    transaction_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tag_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        })
+
+        with app.app_context():
+            db.create_all()
+            user_id = seed_heavy_user(transaction_count)
+            links = seed_tags(user_id, tag_count)
+            print(f" Seeded {transaction_count} transactions, {tag_count} tags, {links} tag links")
+
+            filters = {
+                'all=tag-0,tag-1': (['tag-0', 'tag-1'], [], []),
+                'any=tag-2..tag-9 none=tag-0': ([], [f'tag-{n}' for n in range(2, 10)], ['tag-0']),
+                'all=tag-0 none=tag-1,tag-2': (['tag-0'], [], ['tag-1', 'tag-2']),
+            }
+            for columnar in (False, True):
+                app.config['COLUMNAR_ANALYTICS'] = columnar
+                print(f"\n {'Bitsets' if columnar else 'SQL'}")
+                if columnar:
+                    time_runs('bitmap build', lambda: (ColumnarAnalytics.invalidate(user_id),
+                                                       ColumnarAnalytics.get_tag_index(user_id)), iterations)
+                for label, (all_tags, any_tags, none_tags) in filters.items():
+                    time_runs(label, lambda: TagService.filter_transactions(
+                        user_id, all_tags, any_tags, none_tags), iterations)
+                time_runs('totals per tag', lambda: TagService.tag_totals(user_id), iterations)
+
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Write Batching Benchmark
+Compares per-request commits with the group-commit write batcher for bursts
+of concurrent writers adding transactions to a SQLite file database.
+
+Usage: python -m app.utilities.bench_writes [writes_per_writer] [window_ms]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from app import create_app, db
+from app.batcher import run_write
+from app.models import User, Category, Transaction
+
+WRITER_COUNTS = (8, 32, 128)
+
+
+def make_app(path, writers, batching, window_ms):
+    """App on a fresh database file with one user; one pooled connection per writer"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        # Plenty of busy-wait so unbatched writers queue on the lock instead of failing
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': writers + 1, 'max_overflow': 0,
+                                      'connect_args': {'timeout': 120}},
+        'WRITE_BATCHING': batching,
+        'WRITE_BATCH_WINDOW_MS': window_ms
+    })
+    with app.app_context():
+        db.create_all()
+        category = Category(category_name='Food', user_id=None)
+        user = User(user_name='Benchmark User', email='bench@example.com')
+        user.set_password('Password123!')
+        db.session.add_all([category, user])
+        db.session.commit()
+        return app, user.user_id, category.category_id
+
+
+def run_writers(app, writers, writes_per_writer, user_id, category_id):
+    """Start all writers together; return elapsed seconds"""
+    barrier = threading.Barrier(writers + 1)
+
+    def writer():
+        with app.app_context():
+            barrier.wait()
+            for index in range(writes_per_writer):
+                def write(session):
+                    session.add(Transaction(user_id=user_id, category_id=category_id,
+                                            amount=index + 1, transaction_type='expense',
+                                            transaction_date=datetime.now()))
+                run_write(write)
+            db.session.remove()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    writes_per_writer = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    window_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    print(f" {writes_per_writer} transactions per writer, batch window {window_ms} ms")
+    for writers in WRITER_COUNTS:
+        print(f"\n Writers: {writers}")
+        for batching in (False, True):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                app, user_id, category_id = make_app(os.path.join(tmp_dir, 'bench.db'),
+                                                     writers, batching, window_ms)
+                elapsed = run_writers(app, writers, writes_per_writer, user_id, category_id)
+
+                total = writers * writes_per_writer
+                label = 'group commit' if batching else 'commit per write'
+                line = f"  {label:<18} {total / elapsed:9.0f} writes/s   {elapsed * 1000:8.1f} ms"
+                batcher = app.extensions.get('write_batcher')
+                if batcher is not None:
+                    batcher.close()
+                    line += f"   {batcher.units / max(batcher.batches, 1):6.1f} writes/commit"
+                print(line)
+
+                with app.app_context():
+                    assert Transaction.query.count() == total
+                    db.session.remove()
+                    db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
 # Utility functions - Pure helper functions only
 # Business logic should be in services.py
+import base64
+import calendar
+import hashlib
 import re
 import validators
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 
 def format_currency(amount):
     """Format amount as currency string"""
@@ -29,6 +33,79 @@ def validate_transaction_amount(amount):
     except (ValueError, TypeError):
         return False
 
+def to_pence(amount):
+    """Exact integer pence for a Decimal, float, int or numeric string amount"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def allocate_pence(total_pence, parts):
+    """Split total_pence into parts whole-penny shares by largest remainder
+
+    Shares differ by at most a penny and always add up to total_pence; the
+    leftover pence go to the earliest parts.
+    """
+    base, remainder = divmod(total_pence, parts)
+    return [base + 1 if index < remainder else base for index in range(parts)]
+
+def to_year_month(value):
+    """Month bucket of a date or datetime as YYYYMM (e.g. 202510)"""
+    return value.year * 100 + value.month
+
+def recurrence_date(anchor, unit, count, index):
+    """Date of occurrence index (0: the anchor) of a schedule repeating every count days/weeks/months/years
+
+    Months and years are counted from the anchor and clamped to the month's last
+    day, so a schedule anchored on 31 January falls on 28/29 February, then 31 March.
+    """
+    if unit == 'day':
+        return anchor + timedelta(days=count * index)
+    if unit == 'week':
+        return anchor + timedelta(weeks=count * index)
+    months = anchor.month - 1 + count * index * (12 if unit == 'year' else 1)
+    year, month = anchor.year + months // 12, months % 12 + 1
+    return date(year, month, min(anchor.day, calendar.monthrange(year, month)[1]))
+
+_NOT_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+def normalize_description(description):
+    """Lowercase words of a payee/reference text, punctuation and spacing collapsed"""
+    return _NOT_ALPHANUMERIC.sub(' ', (description or '').lower()).strip()
+
+def merchant_name(description):
+    """Grouping key for a description: its normalized words without reference numbers, or None
+
+    'TESCO STORES 2231' and 'Tesco Stores 1874' both give 'tesco stores'.
+    """
+    words = [word for word in normalize_description(description).split() if not any(c.isdigit() for c in word)]
+    return ' '.join(words)[:64] or None
+
+def normalize_tag(name):
+    """Canonical form of a tag: its lowercase words joined by '-', at most 32 characters
+
+    ' Holiday 2025 ' and 'holiday-2025' are the same tag; '' when nothing is left.
+    """
+    return '-'.join(re.findall(r'[^\W_]+', (name or '').lower()))[:32].strip('-')
+
+def transaction_fingerprint(transaction_type, transaction_date, amount, category_id, description):
+    """Hash of what makes two entries the same transaction: day, signed pence, category, description"""
+    sign = '-' if transaction_type == 'expense' else '+'
+    key = (f"{transaction_date:%Y-%m-%d}|{sign}{to_pence(amount)}|{category_id or 0}|"
+           f"{normalize_description(description)}")
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+def encode_cursor(transaction_date, transaction_id):
+    """Opaque keyset cursor for a (transaction_date, transaction_id) position"""
+    raw = f"{transaction_date.isoformat()}|{transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(transaction_date, transaction_id) from encode_cursor(); ValueError when malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        transaction_date, transaction_id = raw.split('|')
+        return datetime.fromisoformat(transaction_date), int(transaction_id)
+    except ValueError as e:  # bad base64, text or field values
+        raise ValueError('Invalid cursor') from e
+
 def get_date_range_filter(start_date, end_date):
     """Helper to create date range filters for queries"""
     filters = []
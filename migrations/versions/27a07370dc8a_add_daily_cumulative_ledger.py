@@ -0,0 +1,56 @@
+"""Add daily_cumulative prefix-sum ledger
+
+Revision ID: 27a07370dc8a
+Revises: 178f48f7c8e8
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '27a07370dc8a'
+down_revision = '178f48f7c8e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_cumulative',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('transaction_type', sa.String(length=10), nullable=False),
+    sa.Column('category_key', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('day_amount', sa.BigInteger(), nullable=False),
+    sa.Column('cumulative_amount', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'transaction_type', 'category_key', 'day')
+    )
+
+    # Backfill: per-day totals in pence for each category (0 = uncategorized) and for
+    # all categories (-1), with running totals from a window function
+    op.execute("""
+        INSERT INTO daily_cumulative
+            (user_id, transaction_type, category_key, day, day_amount, cumulative_amount)
+        SELECT user_id, transaction_type, category_key, day, day_amount,
+               SUM(day_amount) OVER (PARTITION BY user_id, transaction_type, category_key ORDER BY day)
+        FROM (
+            SELECT user_id, transaction_type, COALESCE(category_id, 0) AS category_key,
+                   DATE(transaction_date) AS day,
+                   SUM(CAST(ROUND(amount * 100) AS BIGINT)) AS day_amount
+            FROM transactions
+            GROUP BY user_id, transaction_type, COALESCE(category_id, 0), DATE(transaction_date)
+            UNION ALL
+            SELECT user_id, transaction_type, -1 AS category_key,
+                   DATE(transaction_date) AS day,
+                   SUM(CAST(ROUND(amount * 100) AS BIGINT)) AS day_amount
+            FROM transactions
+            GROUP BY user_id, transaction_type, DATE(transaction_date)
+        ) daily
+        WHERE day_amount <> 0
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_cumulative')
@@ -0,0 +1,26 @@
+"""Add transaction description for imported statements
+
+Revision ID: 3a9d6c1f0e58
+Revises: 7c2f5e8b1a94
+Create Date: 2026-10-19 19:02:37.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9d6c1f0e58'
+down_revision = '7c2f5e8b1a94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('description', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_column('description')
@@ -0,0 +1,44 @@
+"""Add month-close budget snapshots
+
+Revision ID: 5d0e6b3f7a21
+Revises: c11cc2352022
+Create Date: 2026-10-19 16:05:41.208337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0e6b3f7a21'
+down_revision = 'c11cc2352022'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('budget_snapshots',
+    sa.Column('snapshot_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('budget_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=True),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('year_month', sa.Integer(), nullable=False),
+    sa.Column('budget_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('captured_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['budget_id'], ['budgets.budget_id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['member_id'], ['members.member_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('snapshot_id'),
+    sa.UniqueConstraint('budget_id', 'year_month', name='uq_budget_snapshots_budget_month')
+    )
+    with op.batch_alter_table('budget_snapshots', schema=None) as batch_op:
+        batch_op.create_index('ix_budget_snapshots_user_month', ['user_id', 'year_month'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('budget_snapshots', schema=None) as batch_op:
+        batch_op.drop_index('ix_budget_snapshots_user_month')
+
+    op.drop_table('budget_snapshots')
@@ -0,0 +1,50 @@
+"""Add stored year/year_month buckets to transactions
+
+Revision ID: 896a43fdd98d
+Revises: 27a07370dc8a
+Create Date: 2026-10-19 11:02:17.540913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '896a43fdd98d'
+down_revision = '27a07370dc8a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('year', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('year_month', sa.Integer(), nullable=True))
+
+    # Backfill from transaction_date; year_month is YYYYMM
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("""
+            UPDATE transactions
+            SET year = CAST(strftime('%Y', transaction_date) AS INTEGER),
+                year_month = CAST(strftime('%Y%m', transaction_date) AS INTEGER)
+        """)
+    else:
+        op.execute("""
+            UPDATE transactions
+            SET year = EXTRACT(YEAR FROM transaction_date),
+                year_month = EXTRACT(YEAR FROM transaction_date) * 100 + EXTRACT(MONTH FROM transaction_date)
+        """)
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.alter_column('year', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('year_month', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index('ix_transactions_user_year', ['user_id', 'year'], unique=False)
+        batch_op.create_index('ix_transactions_user_year_month', ['user_id', 'year_month'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_user_year_month')
+        batch_op.drop_index('ix_transactions_user_year')
+        batch_op.drop_column('year_month')
+        batch_op.drop_column('year')
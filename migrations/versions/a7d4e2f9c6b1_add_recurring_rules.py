@@ -0,0 +1,65 @@
+"""Add recurring transaction rules
+
+Revision ID: a7d4e2f9c6b1
+Revises: f5a2c8d7e9b3
+Create Date: 2026-10-19 23:02:41.530271
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e2f9c6b1'
+down_revision = 'f5a2c8d7e9b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recurring_rules',
+    sa.Column('rule_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('transaction_type', sa.String(length=10), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=8, scale=2), nullable=False),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.Column('user_participates', sa.Boolean(), nullable=False),
+    sa.Column('interval_unit', sa.String(length=5), nullable=False),
+    sa.Column('interval_count', sa.Integer(), nullable=False),
+    sa.Column('anchor_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=True),
+    sa.Column('occurrence_count', sa.Integer(), nullable=False),
+    sa.Column('next_date', sa.Date(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('rule_id')
+    )
+    with op.batch_alter_table('recurring_rules', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_recurring_rules_next_date'), ['next_date'], unique=False)
+
+    op.create_table('recurring_rule_members',
+    sa.Column('rule_id', sa.Integer(), nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['member_id'], ['members.member_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['rule_id'], ['recurring_rules.rule_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('rule_id', 'member_id')
+    )
+    op.create_table('recurring_occurrences',
+    sa.Column('rule_id', sa.Integer(), nullable=False),
+    sa.Column('occurrence_date', sa.Date(), nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['rule_id'], ['recurring_rules.rule_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transactions.transaction_id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('rule_id', 'occurrence_date')
+    )
+
+
+def downgrade():
+    op.drop_table('recurring_occurrences')
+    op.drop_table('recurring_rule_members')
+    with op.batch_alter_table('recurring_rules', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recurring_rules_next_date'))
+
+    op.drop_table('recurring_rules')
@@ -0,0 +1,74 @@
+"""Add stored participant shares to transactions and members_transaction
+
+Revision ID: a8ae4de6c2f9
+Revises: 896a43fdd98d
+Create Date: 2026-10-19 11:48:05.117342
+
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8ae4de6c2f9'
+down_revision = '896a43fdd98d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_share_amount', sa.Numeric(precision=8, scale=2), server_default='0', nullable=False))
+
+    with op.batch_alter_table('members_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('share_amount', sa.Numeric(precision=8, scale=2), server_default='0', nullable=False))
+        batch_op.create_index('ix_members_transaction_member_id', ['member_id'], unique=False)
+
+    # Backfill with the same largest-remainder split as TransactionService.split_shares:
+    # the User (when participating) first, then members by member_id, take the leftover pence
+    connection = op.get_bind()
+    member_ids = {}
+    for transaction_id, member_id in connection.execute(sa.text(
+        'SELECT transaction_id, member_id FROM members_transaction ORDER BY transaction_id, member_id'
+    )):
+        member_ids.setdefault(transaction_id, []).append(member_id)
+
+    user_rows, member_rows = [], []
+    for transaction_id, amount, user_participates in connection.execute(sa.text(
+        'SELECT transaction_id, amount, user_participates FROM transactions'
+    )):
+        pence = int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+        members = member_ids.get(transaction_id, [])
+        if not members:
+            user_pence, member_pence = pence, []
+        else:
+            parts = len(members) + (1 if user_participates else 0)
+            base, remainder = divmod(pence, parts)
+            split = [base + 1 if index < remainder else base for index in range(parts)]
+            user_pence, member_pence = (split[0], split[1:]) if user_participates else (0, split)
+
+        user_rows.append({'transaction_id': transaction_id, 'share': Decimal(user_pence) / 100})
+        member_rows.extend({'transaction_id': transaction_id, 'member_id': member_id, 'share': Decimal(share) / 100}
+                           for member_id, share in zip(members, member_pence))
+
+    share_param = sa.bindparam('share', type_=sa.Numeric(precision=8, scale=2))
+    if user_rows:
+        connection.execute(sa.text(
+            'UPDATE transactions SET user_share_amount = :share WHERE transaction_id = :transaction_id'
+        ).bindparams(share_param), user_rows)
+    if member_rows:
+        connection.execute(sa.text(
+            'UPDATE members_transaction SET share_amount = :share '
+            'WHERE transaction_id = :transaction_id AND member_id = :member_id'
+        ).bindparams(share_param), member_rows)
+
+
+def downgrade():
+    with op.batch_alter_table('members_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_members_transaction_member_id')
+        batch_op.drop_column('share_amount')
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_column('user_share_amount')
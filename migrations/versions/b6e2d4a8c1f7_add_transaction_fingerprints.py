@@ -0,0 +1,51 @@
+"""Add transaction fingerprints for duplicate detection
+
+Revision ID: b6e2d4a8c1f7
+Revises: 3a9d6c1f0e58
+Create Date: 2026-10-19 20:11:05.402871
+
+"""
+import hashlib
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2d4a8c1f7'
+down_revision = '3a9d6c1f0e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=32), server_default='', nullable=False))
+        batch_op.create_index('ix_transactions_user_fingerprint', ['user_id', 'fingerprint'], unique=False)
+
+    # Backfill with the same key as utils.transaction_fingerprint:
+    # day|signed pence|category (0 for none)|normalized description
+    connection = op.get_bind()
+    rows = []
+    for transaction_id, transaction_type, transaction_date, amount, category_id, description in connection.execute(sa.text(
+        'SELECT transaction_id, transaction_type, transaction_date, amount, category_id, description FROM transactions'
+    )):
+        pence = int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+        sign = '-' if transaction_type == 'expense' else '+'
+        words = re.sub(r'[^0-9a-z]+', ' ', (description or '').lower()).strip()
+        key = f"{str(transaction_date)[:10]}|{sign}{pence}|{category_id or 0}|{words}"
+        rows.append({'transaction_id': transaction_id,
+                     'fingerprint': hashlib.blake2b(key.encode(), digest_size=16).hexdigest()})
+
+    if rows:
+        connection.execute(sa.text(
+            'UPDATE transactions SET fingerprint = :fingerprint WHERE transaction_id = :transaction_id'
+        ), rows)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_user_fingerprint')
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,26 @@
+"""Add (user_id, transaction_date, transaction_id) index for the expense timeline
+
+Revision ID: c11cc2352022
+Revises: a8ae4de6c2f9
+Create Date: 2026-10-19 12:40:26.803114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c11cc2352022'
+down_revision = 'a8ae4de6c2f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('ix_transactions_user_date', ['user_id', 'transaction_date', 'transaction_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_user_date')
@@ -0,0 +1,75 @@
+"""Add merchant column and full-text search over transaction descriptions
+
+Revision ID: d3f81a6b2c40
+Revises: b6e2d4a8c1f7
+Create Date: 2026-10-19 21:26:44.915330
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f81a6b2c40'
+down_revision = 'b6e2d4a8c1f7'
+branch_labels = None
+depends_on = None
+
+SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5("
+    "description, owner, prefix='2 3 4 5 6', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions "
+    "WHEN new.description IS NOT NULL BEGIN "
+    "INSERT INTO transactions_fts(rowid, description, owner) "
+    "VALUES (new.transaction_id, new.description, 'u' || new.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions "
+    "WHEN old.description IS NOT NULL BEGIN "
+    "DELETE FROM transactions_fts WHERE rowid = old.transaction_id; END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, user_id ON transactions "
+    "BEGIN "
+    "DELETE FROM transactions_fts WHERE rowid = old.transaction_id; "
+    "INSERT INTO transactions_fts(rowid, description, owner) "
+    "SELECT new.transaction_id, new.description, 'u' || new.user_id WHERE new.description IS NOT NULL; END",
+)
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('merchant', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_transactions_user_merchant',
+                              ['user_id', 'merchant', 'transaction_type', 'transaction_date', 'amount'],
+                              unique=False)
+
+    # Backfill as utils.merchant_name: normalized words of the description without reference numbers
+    connection = op.get_bind()
+    rows = []
+    for transaction_id, description in connection.execute(sa.text(
+        'SELECT transaction_id, description FROM transactions WHERE description IS NOT NULL'
+    )):
+        words = re.sub(r'[^0-9a-z]+', ' ', description.lower()).split()
+        merchant = ' '.join(word for word in words if not any(c.isdigit() for c in word))[:64] or None
+        rows.append({'transaction_id': transaction_id, 'merchant': merchant})
+    if rows:
+        connection.execute(sa.text(
+            'UPDATE transactions SET merchant = :merchant WHERE transaction_id = :transaction_id'
+        ), rows)
+
+    if connection.dialect.name == 'sqlite':
+        for statement in SEARCH_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO transactions_fts(rowid, description, owner) "
+                   "SELECT transaction_id, description, 'u' || user_id FROM transactions "
+                   "WHERE description IS NOT NULL")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('transactions_fts_insert', 'transactions_fts_delete', 'transactions_fts_update'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS transactions_fts')
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_user_merchant')
+        batch_op.drop_column('merchant')
@@ -0,0 +1,47 @@
+"""Add partial unique index on the active budget scope
+
+Revision ID: e4b7a9c03d15
+Revises: 5d0e6b3f7a21
+Create Date: 2026-10-19 16:42:09.381206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a9c03d15'
+down_revision = '5d0e6b3f7a21'
+branch_labels = None
+depends_on = None
+
+
+SCOPE_KEY = [sa.text('coalesce(user_id, 0)'), sa.text('coalesce(member_id, 0)'), sa.text('coalesce(category_id, 0)')]
+
+
+def upgrade():
+    # Earlier SELECT-then-INSERT writes could race into duplicate active budgets:
+    # keep the newest one of each (user, member, category) scope active
+    budgets = sa.table('budgets', sa.column('budget_id', sa.Integer), sa.column('is_active', sa.Boolean),
+                       sa.column('user_id', sa.Integer), sa.column('member_id', sa.Integer),
+                       sa.column('category_id', sa.Integer))
+    newer = budgets.alias('newer')
+    same_scope = sa.and_(*(
+        sa.func.coalesce(newer.c[name], 0) == sa.func.coalesce(budgets.c[name], 0)
+        for name in ('user_id', 'member_id', 'category_id')
+    ))
+    op.execute(budgets.update().where(
+        budgets.c.is_active == sa.true(),
+        sa.select(newer.c.budget_id).where(
+            newer.c.is_active == sa.true(),
+            newer.c.budget_id > budgets.c.budget_id,
+            same_scope
+        ).exists()
+    ).values(is_active=False))
+
+    op.create_index('uq_budgets_active_scope', 'budgets', SCOPE_KEY, unique=True,
+                    sqlite_where=sa.text('is_active = 1'), postgresql_where=sa.text('is_active'))
+
+
+def downgrade():
+    op.drop_index('uq_budgets_active_scope', table_name='budgets')
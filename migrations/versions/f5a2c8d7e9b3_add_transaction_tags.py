@@ -0,0 +1,44 @@
+"""Add transaction tags
+
+Revision ID: f5a2c8d7e9b3
+Revises: d3f81a6b2c40
+Create Date: 2026-10-19 21:37:05.118420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a2c8d7e9b3'
+down_revision = 'd3f81a6b2c40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tags',
+    sa.Column('tag_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('tag_id'),
+    sa.UniqueConstraint('user_id', 'name', name='uq_tags_user_name')
+    )
+    op.create_table('transaction_tags',
+    sa.Column('transaction_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.tag_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transactions.transaction_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('transaction_id', 'tag_id')
+    )
+    with op.batch_alter_table('transaction_tags', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_tags_tag_id', ['tag_id', 'transaction_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction_tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_tags_tag_id')
+
+    op.drop_table('transaction_tags')
+    op.drop_table('tags')
@@ -2,14 +2,14 @@
 import pytest
 from app import create_app, db
 from app.models import User, Category, Member, Transaction, Budget
+from app.services import FamilyExpenseService
 from datetime import datetime
 
 
 @pytest.fixture(scope='function')
 def app():
     """Create application for testing"""
-    app = create_app()
-    app.config.update({
+    app = create_app({
         'TESTING': True,
         'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
         'WTF_CSRF_ENABLED': False,
@@ -30,6 +30,8 @@ def app():
 
     with app.app_context():
         db.drop_all()
+    # Process-level caches must not outlive the per-test database
+    FamilyExpenseService.clear_matrix_cache()
 
 
 @pytest.fixture(scope='function')
@@ -210,3 +210,188 @@ class TestBudgetPauseActivate:
 
             assert budget.is_paused() is False
             assert budget.is_active is True
+
+
+class TestMemberBudgets:
+    """Test member budgets fed with members' month-to-date shares"""
+
+    @pytest.fixture
+    def member_budgets(self, app, test_user, test_member, test_category):
+        """A category and a total budget for a member, with shared spending this month and last"""
+        from datetime import timedelta
+        from app.models import Transaction, MembersTransaction
+
+        with app.app_context():
+            now = datetime.now()
+            last_month = now.replace(day=1) - timedelta(days=1)
+            for amount, category_id, when in ((90.00, test_category, now),
+                                              (30.00, None, now),
+                                              (500.00, test_category, last_month)):
+                trans = Transaction(user_id=test_user.user_id, category_id=category_id, amount=amount,
+                                    transaction_type='expense', transaction_date=when)
+                db.session.add(trans)
+                db.session.flush()
+                db.session.add(MembersTransaction(transaction_id=trans.transaction_id,
+                                                  member_id=test_member.member_id))
+
+            category_budget = Budget(member_id=test_member.member_id, category_id=test_category,
+                                     budget_amount=50.00, alert_threshold=80.0)
+            total_budget = Budget(member_id=test_member.member_id, category_id=None,
+                                  budget_amount=200.00, alert_threshold=80.0)
+            db.session.add_all([category_budget, total_budget])
+            db.session.commit()
+            return category_budget.budget_id, total_budget.budget_id
+
+    def test_statuses_use_member_shares(self, app, test_user, member_budgets):
+        """Test spend is the member's share this month, per category and in total"""
+        from app.services import BudgetService
+
+        with app.app_context():
+            statuses = BudgetService.get_member_budget_statuses(test_user.user_id)
+            by_id = {status['budget_id']: status for status in statuses}
+            category_budget, total_budget = member_budgets
+
+            assert by_id[category_budget]['spent'] == 45.00
+            assert by_id[category_budget]['status'] == 'alert_threshold_reached'
+            assert by_id[total_budget]['spent'] == 60.00
+            assert by_id[total_budget]['status'] == 'within_budget'
+            assert [status['budget_id'] for status in statuses] == [category_budget, total_budget]
+
+    def test_member_budgets_endpoint(self, auth_client, member_budgets):
+        """Test the JSON endpoint lists the member budgets"""
+        data = auth_client.get('/api/budgets/members').get_json()
+        assert {budget['member_name'] for budget in data['budgets']} == {'Sarah Johnson'}
+
+
+class TestBudgetHistory:
+    """Test month-close snapshots and the budget-vs-actual history"""
+
+    @pytest.fixture
+    def closed_months(self, app, test_user, test_member, test_category):
+        """Last month's spending, plus a user category budget, a total budget and a member budget"""
+        from datetime import timedelta
+        from app.models import Transaction
+
+        with app.app_context():
+            last_month = datetime.now().replace(day=1) - timedelta(days=1)
+            for amount, category_id in ((60.00, test_category), (25.00, None)):
+                db.session.add(Transaction(user_id=test_user.user_id, category_id=category_id, amount=amount,
+                                           transaction_type='expense', transaction_date=last_month))
+            db.session.add_all([
+                Budget(user_id=test_user.user_id, category_id=test_category, budget_amount=100.00),
+                Budget(user_id=test_user.user_id, category_id=None, budget_amount=400.00),
+                Budget(member_id=test_member.member_id, category_id=test_category, budget_amount=10.00),
+                Budget(user_id=test_user.user_id, category_id=None, budget_amount=999.00, is_active=False)
+            ])
+            db.session.commit()
+            return last_month.year, last_month.month
+
+    def test_capture_is_bulk_and_idempotent(self, app, test_user, closed_months):
+        """Test every active budget is captured once, member budgets under their owner"""
+        from app.models import BudgetSnapshot
+        from app.services import BudgetSnapshotService
+
+        with app.app_context():
+            assert BudgetSnapshotService.capture_month(*closed_months) == 3
+            assert BudgetSnapshotService.capture_month(*closed_months) == 0
+            assert {snapshot.user_id for snapshot in BudgetSnapshot.query} == {test_user.user_id}
+
+    def test_history_joins_snapshots_to_spend(self, app, test_user, test_category, closed_months):
+        """Test category budgets match their category and total budgets match all spending"""
+        from app.services import BudgetSnapshotService
+
+        with app.app_context():
+            BudgetSnapshotService.capture_month(*closed_months)
+            # A later change to the live budget must not rewrite history
+            Budget.query.filter_by(user_id=test_user.user_id, category_id=test_category).one().budget_amount = 1.00
+            db.session.commit()
+
+            history = BudgetSnapshotService.get_budget_history(test_user.user_id, 12)
+            month = '%04d-%02d' % closed_months
+
+            assert [entry['category_id'] for entry in history] == [None, test_category]
+            assert history[0]['months'] == [{'month': month, 'budget_amount': 400.00,
+                                             'actual': 85.00, 'percentage_used': 21.25}]
+            assert history[1]['months'] == [{'month': month, 'budget_amount': 100.00,
+                                             'actual': 60.00, 'percentage_used': 60.00}]
+
+    def test_history_endpoint_bounds(self, auth_client):
+        """Test the endpoint accepts 12 to 36 months"""
+        assert auth_client.get('/api/budgets/history').get_json() == {'history': []}
+        assert auth_client.get('/api/budgets/history?months=36').status_code == 200
+        assert auth_client.get('/api/budgets/history?months=6').status_code == 400
+        assert auth_client.get('/api/budgets/history?months=48').status_code == 400
+
+    def test_snapshot_command(self, app, closed_months):
+        """Test the CLI job captures the requested month"""
+        year, month = closed_months
+        result = app.test_cli_runner().invoke(args=['budgets', 'snapshot', '--month', f'{year:04d}-{month:02d}'])
+        assert 'Captured 3 budget snapshots' in result.output
+
+
+class TestBudgetUpsert:
+    """Test budgets are created or updated by one atomic upsert per scope"""
+
+    def test_upsert_updates_the_active_budget(self, app, test_user, test_category):
+        """Test a second upsert updates in place and keeps settings it was not given"""
+        from app.events import event_hub
+        from app.services import BudgetService
+
+        with app.app_context():
+            first = BudgetService.upsert_budget(100.00, user_id=test_user.user_id,
+                                                category_id=test_category, alert_threshold=70.0)
+            version = event_hub.version(test_user.user_id)
+            second = BudgetService.upsert_budget(150.00, user_id=test_user.user_id, category_id=test_category)
+
+            assert second == first
+            assert event_hub.version(test_user.user_id) == version + 1
+            budget = Budget.query.filter_by(user_id=test_user.user_id).one()
+            assert float(budget.budget_amount) == 150.00
+            assert float(budget.alert_threshold) == 70.0
+
+    def test_scopes_are_separate(self, app, test_user, test_member, test_category):
+        """Test total, category, member and paused budgets each keep their own row"""
+        from app.services import BudgetService
+
+        with app.app_context():
+            paused = Budget(user_id=test_user.user_id, category_id=test_category,
+                            budget_amount=10.00, is_active=False)
+            db.session.add(paused)
+            db.session.commit()
+
+            BudgetService.create_or_update_total_budget(test_user.user_id, 500.00, alert_threshold=90.0)
+            BudgetService.create_or_update_budget(test_user.user_id, 50.00, category_id=test_category)
+            BudgetService.upsert_budget(20.00, user_id=test_user.user_id, member_id=test_member.member_id,
+                                        category_id=test_category)
+            BudgetService.upsert_budget(25.00, user_id=test_user.user_id, member_id=test_member.member_id,
+                                        category_id=test_category)
+
+            active = Budget.query.filter_by(is_active=True).order_by(Budget.budget_id).all()
+            assert [(b.member_id, b.category_id, float(b.budget_amount)) for b in active] == [
+                (None, None, 500.00), (None, test_category, 50.00), (test_member.member_id, test_category, 25.00)
+            ]
+            assert float(active[0].alert_threshold) == 90.0
+            assert float(db.session.get(Budget, paused.budget_id).budget_amount) == 10.00
+
+    def test_duplicate_active_budgets_are_rejected(self, app, test_user, test_category):
+        """Test the partial unique index refuses a second active budget for a scope"""
+        from sqlalchemy.exc import IntegrityError
+
+        with app.app_context():
+            db.session.add_all([Budget(user_id=test_user.user_id, category_id=test_category, budget_amount=1),
+                                Budget(user_id=test_user.user_id, category_id=test_category, budget_amount=2)])
+            with pytest.raises(IntegrityError):
+                db.session.commit()
+            db.session.rollback()
+
+    def test_add_budget_route_twice(self, app, auth_client, test_user, test_category):
+        """Test re-submitting the personal budget form updates the same budget"""
+        for amount, threshold in (('100.00', '80'), ('300.00', '60')):
+            response = auth_client.post('/budget/add', json={'amount': amount, 'alert_threshold': threshold,
+                                                             'category_id': test_category})
+            assert response.get_json()['success']
+
+        with app.app_context():
+            budget = Budget.query.filter_by(user_id=test_user.user_id, category_id=test_category).one()
+            assert float(budget.budget_amount) == 300.00
+            assert float(budget.alert_threshold) == 60.0
@@ -0,0 +1,247 @@
+"""Tests for the NumPy columnar analytics engine against SimpleAnalyticsService"""
+import random
+import threading
+import pytest
+from datetime import datetime, timedelta
+from app.models import Transaction, Member, MembersTransaction, Category, db
+from app.services import SimpleAnalyticsService
+
+pytest.importorskip('numpy')
+
+from app.columnar import ColumnarAnalytics
+
+
+@pytest.fixture
+def seeded_user(app, test_user):
+    """A user with a year of random income, personal and shared expenses"""
+    ColumnarAnalytics.invalidate()
+    rng = random.Random(42)
+    with app.app_context():
+        category_ids = [category.category_id for category in Category.query.all()] + [None]
+        members = [Member(user_id=test_user.user_id, name=f'Member {i}', relationship='Child')
+                   for i in range(3)]
+        db.session.add_all(members)
+        db.session.flush()
+
+        now = datetime.now()
+        for _ in range(200):
+            transaction = Transaction(
+                user_id=test_user.user_id,
+                category_id=rng.choice(category_ids),
+                amount=round(rng.uniform(1, 500), 2),
+                transaction_type='income' if rng.random() < 0.15 else 'expense',
+                transaction_date=now - timedelta(days=rng.randint(0, 400), hours=rng.randint(0, 23)),
+                user_participates=rng.random() < 0.8
+            )
+            db.session.add(transaction)
+            db.session.flush()
+            for member in rng.sample(members, rng.randint(0, 3)):
+                db.session.add(MembersTransaction(transaction_id=transaction.transaction_id,
+                                                  member_id=member.member_id))
+        db.session.commit()
+
+    yield test_user.user_id
+    ColumnarAnalytics.invalidate()
+
+
+class TestColumnarMatchesOracle:
+    """Test vectorized results equal the SQL/ORM implementations"""
+
+    def test_totals_and_monthly_series(self, app, seeded_user):
+        """Test all-time totals and per-month figures match exactly"""
+        with app.app_context():
+            now = datetime.now()
+            start = datetime(now.year - 1, 1, 1)
+            end = datetime(now.year + 1, 1, 1)
+
+            assert ColumnarAnalytics.get_totals(seeded_user) == {
+                'income': SimpleAnalyticsService.get_total_income(seeded_user),
+                'expenses': SimpleAnalyticsService.get_total_expenses(seeded_user)
+            }
+            assert (ColumnarAnalytics.get_monthly_series(seeded_user, start, end)
+                    == SimpleAnalyticsService.get_monthly_series(seeded_user, start, end))
+            assert (ColumnarAnalytics.get_monthly_totals(seeded_user, now.year, now.month)
+                    == SimpleAnalyticsService.get_monthly_totals(seeded_user, now.year, now.month))
+
+    def test_category_spending(self, app, seeded_user):
+        """Test per-category spending, uncategorized rows counted as Other"""
+        with app.app_context():
+            expected = SimpleAnalyticsService.get_spending_by_category(seeded_user)
+            actual = ColumnarAnalytics.get_spending_by_category(seeded_user)
+
+            assert actual.keys() == expected.keys()
+            for name, amount in expected.items():
+                assert actual[name] == pytest.approx(amount)
+
+    def test_expense_shares(self, app, seeded_user):
+        """Test user and member shares match the Transaction share helpers"""
+        with app.app_context():
+            expenses = Transaction.query.filter_by(user_id=seeded_user, transaction_type='expense').all()
+            shares = ColumnarAnalytics.get_expense_shares(seeded_user)
+
+            assert shares['user_share'] == pytest.approx(sum(t.get_user_share() for t in expenses))
+            assert shares['members_share'] == pytest.approx(sum(t.get_members_total_share() for t in expenses))
+
+    def test_budget_spent(self, app, seeded_user, test_category):
+        """Test personal budget spending matches the dashboard's filter"""
+        with app.app_context():
+            start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            expected = sum(float(t.amount) for t in Transaction.query.filter(
+                Transaction.user_id == seeded_user,
+                Transaction.transaction_type == 'expense',
+                Transaction.category_id == test_category,
+                Transaction.transaction_date >= start_of_month,
+                Transaction.user_participates == True,
+                ~Transaction.members.any()
+            ))
+
+            assert ColumnarAnalytics.get_budget_spent(
+                seeded_user, test_category, start_of_month, personal_only=True
+            ) == pytest.approx(expected)
+
+
+class TestColumnarMaintenance:
+    """Test snapshots follow committed writes"""
+
+    def test_insert_is_appended(self, app, seeded_user, test_category):
+        """Test a committed insert is appended to the cached snapshot"""
+        with app.app_context():
+            before = ColumnarAnalytics.get_columns(seeded_user)
+            db.session.add(Transaction(user_id=seeded_user, category_id=test_category, amount=12.34,
+                                       transaction_type='expense', transaction_date=datetime.now()))
+            db.session.commit()
+
+            after = ColumnarAnalytics.get_columns(seeded_user)
+            assert len(after) == len(before) + 1
+            assert ColumnarAnalytics.get_totals(seeded_user)['expenses'] == \
+                SimpleAnalyticsService.get_total_expenses(seeded_user)
+
+    def test_delete_reloads(self, app, seeded_user):
+        """Test a delete drops the snapshot so it reloads"""
+        with app.app_context():
+            before = ColumnarAnalytics.get_columns(seeded_user)
+            db.session.delete(Transaction.query.filter_by(user_id=seeded_user).first())
+            db.session.commit()
+
+            after = ColumnarAnalytics.get_columns(seeded_user)
+            assert after is not before
+            assert len(after) == len(before) - 1
+            assert ColumnarAnalytics.get_totals(seeded_user)['income'] == \
+                SimpleAnalyticsService.get_total_income(seeded_user)
+
+    def test_concurrent_appends_are_kept(self, app, seeded_user, test_category, monkeypatch):
+        """Test rows appended by a reader that stored first survive a slower reader's store"""
+        from app.columnar import TransactionColumns
+        load_rows = TransactionColumns.load
+
+        def add():
+            transaction = Transaction(user_id=seeded_user, category_id=test_category, amount=5.00,
+                                      transaction_type='expense', transaction_date=datetime.now())
+            db.session.add(transaction)
+            db.session.commit()
+            loaded[(transaction.transaction_id,)] = load_rows(seeded_user, [transaction.transaction_id])
+
+        loaded = {}
+        entered, release = threading.Event(), threading.Event()
+
+        def load(user_id, transaction_ids=None):
+            if threading.current_thread().name == 'slow':
+                entered.set()
+                release.wait(5)
+            return loaded[tuple(transaction_ids)]
+
+        with app.app_context():
+            before = len(ColumnarAnalytics.get_columns(seeded_user))
+            add()
+            monkeypatch.setattr(TransactionColumns, 'load', staticmethod(load))
+            slow = threading.Thread(target=ColumnarAnalytics.get_columns, args=(seeded_user,), name='slow')
+            slow.start()
+            assert entered.wait(5)
+            add()
+            fast = threading.Thread(target=ColumnarAnalytics.get_columns, args=(seeded_user,), name='fast')
+            fast.start()
+            fast.join(5)
+            release.set()
+            slow.join(5)
+
+            assert len(ColumnarAnalytics.get_columns(seeded_user)) == before + 2
+
+    def test_batch_endpoint_uses_columnar(self, app, auth_client, seeded_user):
+        """Test the batch endpoint gives the same widgets with COLUMNAR_ANALYTICS on"""
+        expected = auth_client.get('/api/analytics/batch').get_json()
+        app.config['COLUMNAR_ANALYTICS'] = True
+        actual = auth_client.get('/api/analytics/batch').get_json()
+
+        assert actual == expected
+        assert seeded_user in ColumnarAnalytics._snapshots
+
+
+class TestTagBitmaps:
+    """Test tag bitset filters and totals against the SQL implementation"""
+
+    TAGS = ('holiday', 'work', 'kids', 'car', 'gift')
+
+    @pytest.fixture
+    def tagged_user(self, app, seeded_user):
+        """The seeded user's transactions with zero to three random tags each"""
+        from app.services import TagService
+        rng = random.Random(7)
+        with app.app_context():
+            for transaction in Transaction.query.filter_by(user_id=seeded_user):
+                TagService.set_tags(db.session, transaction, rng.sample(self.TAGS, rng.randint(0, 3)))
+            db.session.commit()
+        return seeded_user
+
+    def assert_matches_sql(self, app, user_id, filters):
+        from app.services import TagService
+        for all_tags, any_tags, none_tags, start in filters:
+            app.config['COLUMNAR_ANALYTICS'] = False
+            expected = TagService.filter_transactions(user_id, all_tags, any_tags, none_tags, start, limit=500)
+            expected_totals = TagService.tag_totals(user_id, start)
+            app.config['COLUMNAR_ANALYTICS'] = True
+            actual = TagService.filter_transactions(user_id, all_tags, any_tags, none_tags, start, limit=500)
+            assert actual['transaction_ids'] == expected['transaction_ids']
+            assert actual['count'] == expected['count']
+            assert actual['income'] == pytest.approx(expected['income'])
+            assert actual['expenses'] == pytest.approx(expected['expenses'])
+            actual_totals = TagService.tag_totals(user_id, start)
+            assert [row['tag'] for row in actual_totals] == [row['tag'] for row in expected_totals]
+            for row, expected_row in zip(actual_totals, expected_totals):
+                assert row['count'] == expected_row['count']
+                assert row['expenses'] == pytest.approx(expected_row['expenses'])
+
+    def test_filters_match_sql(self, app, tagged_user):
+        """Test AND/OR/NOT combinations and date ranges select the same rows and totals"""
+        rng = random.Random(3)
+        month_ago = datetime.now() - timedelta(days=30)
+        filters = [((), (), (), None), (('holiday',), (), (), None), (('holiday', 'work'), (), (), month_ago),
+                   ((), ('kids', 'car'), ('gift',), None), ((), (), ('holiday', 'work'), month_ago)]
+        filters += [(tuple(rng.sample(self.TAGS, rng.randint(0, 2))), tuple(rng.sample(self.TAGS, rng.randint(0, 2))),
+                     tuple(rng.sample(self.TAGS, rng.randint(0, 2))), None) for _ in range(20)]
+        with app.app_context():
+            self.assert_matches_sql(app, tagged_user, filters)
+
+    def test_bitmaps_follow_tag_writes(self, app, tagged_user, test_category):
+        """Test retagging patches the cached bitmaps and new tagged rows are appended to them"""
+        from app.services import TagService
+        filters = [(('holiday',), (), (), None), ((), ('gift', 'new'), ('kids',), None)]
+        with app.app_context():
+            app.config['COLUMNAR_ANALYTICS'] = True
+            ColumnarAnalytics.get_tag_index(tagged_user)
+
+            retagged = Transaction.query.filter_by(user_id=tagged_user).order_by(Transaction.transaction_id).first()
+            TagService.set_tags(db.session, retagged, ['new', 'gift'])
+            added = Transaction(user_id=tagged_user, category_id=test_category, amount=7.50,
+                                transaction_type='expense', transaction_date=datetime.now())
+            db.session.add(added)
+            TagService.set_tags(db.session, added, ['holiday', 'new'])
+            db.session.commit()
+
+            generation = ColumnarAnalytics._tag_bitmaps[tagged_user][0]
+            self.assert_matches_sql(app, tagged_user, filters)
+            assert ColumnarAnalytics._tag_bitmaps[tagged_user][0] == generation  # patched, not reloaded
+            assert len(ColumnarAnalytics._tag_bitmaps[tagged_user][1].bitsets) == len(self.TAGS) + 1
+
+            db.session.delete(Transaction.query.filter_by(user_id=tagged_user).first())
+            db.session.commit()
+            self.assert_matches_sql(app, tagged_user, filters)
@@ -179,3 +179,211 @@ class TestIncomeTransactions:
             assert trans.transaction_type == 'income'
             # Income transactions don't use splitting logic
             assert trans.amount == 1000.00
+
+
+class TestStoredShares:
+    """Test the persisted penny-exact participant shares"""
+
+    @pytest.fixture
+    def three_members(self, app, test_user):
+        """Three family members, in member_id order"""
+        with app.app_context():
+            members = [Member(user_id=test_user.user_id, name=f'Member {i}', relationship='Child')
+                       for i in range(3)]
+            db.session.add_all(members)
+            db.session.commit()
+            return [member.member_id for member in members]
+
+    def add_split(self, user_id, category_id, amount, member_ids, user_participates=True):
+        trans = Transaction(user_id=user_id, category_id=category_id, amount=amount,
+                            transaction_type='expense', transaction_date=datetime.now(),
+                            user_participates=user_participates)
+        db.session.add(trans)
+        db.session.flush()
+        for member_id in member_ids:
+            db.session.add(MembersTransaction(transaction_id=trans.transaction_id, member_id=member_id))
+        db.session.commit()
+        return trans.transaction_id
+
+    def stored_shares(self, trans_id):
+        trans = db.session.get(Transaction, trans_id)
+        db.session.refresh(trans)
+        return float(trans.user_share_amount), [float(mt.share_amount) for mt in
+                                                sorted(trans.members, key=lambda mt: mt.member_id)]
+
+    def test_uneven_split_adds_up(self, app, test_user, test_category, three_members):
+        """Test leftover pence go to the first participants and shares sum to the amount"""
+        with app.app_context():
+            trans_id = self.add_split(test_user.user_id, test_category, 100.00, three_members)
+            assert self.stored_shares(trans_id) == (25.00, [25.00, 25.00, 25.00])
+
+            trans_id = self.add_split(test_user.user_id, test_category, 10.00, three_members[:2])
+            assert self.stored_shares(trans_id) == (3.34, [3.33, 3.33])
+
+            trans_id = self.add_split(test_user.user_id, test_category, 0.05, three_members,
+                                      user_participates=False)
+            assert self.stored_shares(trans_id) == (0.00, [0.02, 0.02, 0.01])
+
+    def test_personal_transaction_user_bears_all(self, app, test_user, test_category):
+        """Test a transaction without members stores the full amount as the user's share"""
+        with app.app_context():
+            trans_id = self.add_split(test_user.user_id, test_category, 42.50, [])
+            assert self.stored_shares(trans_id) == (42.50, [])
+
+    def test_shares_follow_edits(self, app, test_user, test_category, three_members):
+        """Test amount, participation and member changes re-split the transaction"""
+        with app.app_context():
+            trans_id = self.add_split(test_user.user_id, test_category, 10.00, three_members[:2])
+
+            trans = db.session.get(Transaction, trans_id)
+            trans.amount = 20.00
+            db.session.commit()
+            assert self.stored_shares(trans_id) == (6.67, [6.67, 6.66])
+
+            trans.user_participates = False
+            db.session.commit()
+            assert self.stored_shares(trans_id) == (0.00, [10.00, 10.00])
+
+            db.session.delete(db.session.get(Member, three_members[0]))
+            db.session.commit()
+            assert self.stored_shares(trans_id) == (0.00, [20.00])
+
+    def test_edit_family_expense_resplits(self, app, auth_client, test_user, test_category, three_members):
+        """Test removing members through the edit form re-splits the expense"""
+        with app.app_context():
+            trans_id = self.add_split(test_user.user_id, test_category, 30.00, three_members)
+
+        auth_client.post(f'/edit_family_expense/{trans_id}', data={
+            'expense_id': trans_id,
+            'amount': '30.00',
+            'category_id': test_category,
+            'member_ids': [three_members[0]],
+            'include_user': 'true'
+        })
+
+        with app.app_context():
+            assert self.stored_shares(trans_id) == (15.00, [15.00])
+
+    def test_edit_family_expense_touches_only_changed_links(self, app, auth_client, test_user,
+                                                            test_category, three_members):
+        """Test an edit swaps only the changed member links and publishes which expense changed"""
+        from app.events import event_hub
+
+        with app.app_context():
+            trans_id = self.add_split(test_user.user_id, test_category, 30.00, three_members[:2])
+        form = {
+            'expense_id': trans_id,
+            'expense_date': datetime.now().strftime('%Y-%m-%d'),
+            'amount': '30.00',
+            'category_id': test_category,
+            'member_ids': [three_members[0], three_members[2]],
+            'include_user': 'true'
+        }
+
+        subscription = event_hub.subscribe(test_user.user_id)
+        try:
+            auth_client.post(f'/edit_family_expense/{trans_id}', data=form)
+            message = subscription.get_nowait()
+            assert message['data']['rewritten_ids'] == [trans_id]
+            with app.app_context():
+                assert self.stored_shares(trans_id) == (10.00, [10.00, 10.00])
+                assert [link.member_id for link in MembersTransaction.query.filter_by(transaction_id=trans_id)
+                        .order_by(MembersTransaction.member_id)] == [three_members[0], three_members[2]]
+
+            # Re-saving the same form writes nothing, so nothing is published
+            auth_client.post(f'/edit_family_expense/{trans_id}', data=form)
+            assert subscription.empty()
+        finally:
+            event_hub.unsubscribe(test_user.user_id, subscription)
+
+    def test_identical_resave_with_pence_is_not_an_edit(self, app, auth_client, test_user,
+                                                        test_category, three_members):
+        """Test re-saving an unchanged amount that is not a whole float (10.10) writes and publishes nothing"""
+        from app.events import event_hub
+
+        with app.app_context():
+            trans_id = self.add_split(test_user.user_id, test_category, 10.10, three_members[:2])
+            # Marker share the hooks would overwrite if they re-split
+            db.session.execute(Transaction.__table__.update().where(
+                Transaction.transaction_id == trans_id).values(user_share_amount=1.23))
+            db.session.commit()
+        form = {'expense_id': trans_id, 'amount': '10.10', 'category_id': test_category,
+                'member_ids': three_members[:2], 'include_user': 'true'}
+
+        subscription = event_hub.subscribe(test_user.user_id)
+        try:
+            auth_client.post(f'/edit_family_expense/{trans_id}', data=form)
+            assert subscription.empty()
+            with app.app_context():
+                assert self.stored_shares(trans_id)[0] == 1.23
+        finally:
+            event_hub.unsubscribe(test_user.user_id, subscription)
+
+    def test_family_summary_sums_stored_shares(self, app, test_user, test_category, three_members):
+        """Test family contributions are the sums of the stored shares"""
+        from app.services import FamilyExpenseService
+
+        with app.app_context():
+            self.add_split(test_user.user_id, test_category, 10.00, three_members[:2])
+            self.add_split(test_user.user_id, test_category, 10.00, three_members[:2])
+
+            summary = FamilyExpenseService.get_family_summary(test_user.user_id)
+            assert summary['user_contribution'] == 6.68
+            assert summary['member_contributions'] == {three_members[0]: 6.66, three_members[1]: 6.66,
+                                                       three_members[2]: 0}
+
+
+class TestCostSplitExpressions:
+    """Test the cost-split helpers used as SQL expressions"""
+
+    @pytest.fixture
+    def mixed_expenses(self, app, test_user, test_member, test_category):
+        """A personal, a shared and a members-only expense"""
+        with app.app_context():
+            ids = []
+            for amount, member_ids, user_participates in ((30.00, [], True),
+                                                          (100.00, [test_member.member_id], True),
+                                                          (60.00, [test_member.member_id], False)):
+                trans = Transaction(user_id=test_user.user_id, category_id=test_category, amount=amount,
+                                    transaction_type='expense', transaction_date=datetime.now(),
+                                    user_participates=user_participates)
+                db.session.add(trans)
+                db.session.flush()
+                for member_id in member_ids:
+                    db.session.add(MembersTransaction(transaction_id=trans.transaction_id, member_id=member_id))
+                ids.append(trans.transaction_id)
+            db.session.commit()
+            return ids
+
+    def test_expressions_match_instance_methods(self, app, test_user, mixed_expenses):
+        """Test SQL values equal the instance helpers row by row"""
+        with app.app_context():
+            rows = db.session.query(
+                Transaction,
+                Transaction.is_personal_transaction(),
+                Transaction.is_members_only_expense(),
+                Transaction.get_user_share(),
+                Transaction.get_members_total_share(),
+                Transaction.get_user_net_expense()
+            ).filter(Transaction.user_id == test_user.user_id).all()
+
+            assert len(rows) == 3
+            for trans, personal, members_only, user_share, members_share, net in rows:
+                assert bool(personal) == trans.is_personal_transaction()
+                assert bool(members_only) == trans.is_members_only_expense()
+                assert float(user_share) == pytest.approx(trans.get_user_share())
+                assert float(members_share) == pytest.approx(trans.get_members_total_share())
+                assert float(net) == pytest.approx(trans.get_user_net_expense())
+
+    def test_filter_and_rank_in_sql(self, app, test_user, mixed_expenses):
+        """Test filtering on the split and ranking by net cost run in the query"""
+        from app.services import TransactionService, ReportingService
+
+        with app.app_context():
+            personal = Transaction.query.filter(Transaction.is_personal_transaction()).all()
+            assert [trans.transaction_id for trans in personal] == [mixed_expenses[0]]
+
+            top = TransactionService.get_top_expenses_by_net_cost(test_user.user_id, datetime.now().year, limit=2)
+            assert [trans.transaction_id for trans in top] == [mixed_expenses[1], mixed_expenses[0]]
+
+            assert ReportingService.get_members_share_by_category(test_user.user_id) == {'Food': 110.00}
@@ -0,0 +1,200 @@
+"""Tests for dashboard panel computation"""
+import time
+import pytest
+from app import create_app, db
+from app.models import User, Category, Transaction, Budget
+from app.services import DashboardService
+from datetime import datetime
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """Application backed by a WAL-mode SQLite file so panel threads share data"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'dashboard.db'}",
+        'WTF_CSRF_ENABLED': False,
+        'SECRET_KEY': 'test-secret-key'
+    })
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.text('PRAGMA journal_mode=WAL'))
+        food = Category(category_name='Food', user_id=None)
+        user = User(user_name='Panel User', email='panels@example.com')
+        user.set_password('Password123!')
+        db.session.add_all([food, user])
+        db.session.commit()
+
+        now = datetime.now()
+        db.session.add_all([
+            Transaction(user_id=user.user_id, category_id=food.category_id, amount=2000.00,
+                        transaction_type='income', transaction_date=now),
+            Transaction(user_id=user.user_id, category_id=food.category_id, amount=120.50,
+                        transaction_type='expense', transaction_date=now),
+            Budget(user_id=user.user_id, category_id=food.category_id, budget_amount=200.00,
+                   is_active=True, alert_threshold=80.0, notifications_enabled=True)
+        ])
+        db.session.commit()
+        app.config['PANEL_USER_ID'] = user.user_id
+
+    yield app
+
+    with app.app_context():
+        db.drop_all()
+
+
+class TestDashboardPanels:
+    """Test serial and concurrent dashboard panels"""
+
+    def test_serial_panels(self, file_app):
+        """Test panels compute the monthly and all-time figures"""
+        with file_app.app_context():
+            user_id = file_app.config['PANEL_USER_ID']
+            panels, degraded = DashboardService.get_dashboard_panels(user_id, '6months')
+
+            assert degraded == []
+            assert panels['monthly_totals']['expenses'] == 120.50
+            assert panels['all_time_totals']['balance'] == 1879.50
+            assert panels['budget_alerts'][0]['spent'] == 120.50
+            assert panels['category_spending'] == {'Food': 120.50}
+
+    def test_concurrent_panels_match_serial(self, file_app):
+        """Test concurrent panels give the same results as the serial path"""
+        with file_app.app_context():
+            user_id = file_app.config['PANEL_USER_ID']
+            now = datetime.now()
+            serial, _ = DashboardService.get_dashboard_panels(user_id, '1year', now=now)
+            concurrent, degraded = DashboardService.get_dashboard_panels_concurrent(
+                file_app, user_id, '1year', now=now, deadline=10.0
+            )
+
+            assert degraded == []
+            assert concurrent == serial
+
+    def test_slow_panel_degrades(self, file_app, monkeypatch):
+        """Test a panel missing the deadline falls back to its default"""
+        def slow_category_spending(user_id):
+            time.sleep(3.0)
+            return {'Food': 1}
+
+        monkeypatch.setattr('app.services.SimpleAnalyticsService.get_spending_by_category',
+                            slow_category_spending)
+
+        with file_app.app_context():
+            user_id = file_app.config['PANEL_USER_ID']
+            panels, degraded = DashboardService.get_dashboard_panels_concurrent(
+                file_app, user_id, '6months', deadline=1.5
+            )
+
+            assert degraded == ['category_spending']
+            assert panels['category_spending'] == {}
+            assert panels['monthly_totals']['income'] == 2000.00
+
+    def test_pool_follows_worker_setting(self):
+        """Test a changed worker count gets a pool of that size"""
+        from app.services import _get_dashboard_executor
+
+        assert _get_dashboard_executor(3) is _get_dashboard_executor(3)
+        assert _get_dashboard_executor(5)._max_workers == 5
+
+    def test_dashboard_page_concurrent_mode(self, file_app):
+        """Test the dashboard renders with concurrent panels enabled"""
+        file_app.config['DASHBOARD_CONCURRENT_PANELS'] = True
+        client = file_app.test_client()
+        client.post('/login', data={
+            'email': 'panels@example.com',
+            'password': 'Password123!'
+        })
+
+        response = client.get('/dashboard?range=3months')
+        assert response.status_code == 200
+        assert b'120.50' in response.data
+
+
+def login(app):
+    """Test client logged in as the panel user"""
+    client = app.test_client()
+    client.post('/login', data={
+        'email': 'panels@example.com',
+        'password': 'Password123!'
+    })
+    return client
+
+
+class TestDashboardFragments:
+    """Test lazy-loaded dashboard fragments"""
+
+    def test_comparison_fragment(self, file_app):
+        """Test the comparison series covers the range and ends with this month"""
+        client = login(file_app)
+
+        response = client.get('/dashboard/fragments/comparison?range=3months')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['range'] == '3months'
+        assert data['months'][-1]['month'] == datetime.now().strftime('%Y-%m')
+        assert data['months'][-1]['income'] == 2000.00
+        assert data['months'][-1]['expenses'] == 120.50
+
+    def test_comparison_matches_panel(self, file_app):
+        """Test the grouped monthly series matches the dashboard panel"""
+        with file_app.app_context():
+            user_id = file_app.config['PANEL_USER_ID']
+            now = datetime.now()
+            panels, _ = DashboardService.get_dashboard_panels(user_id, '1year', now=now)
+            comparison = DashboardService.get_monthly_comparison(user_id, '1year', now)
+
+            assert comparison == panels['monthly_comparison']
+            assert sum(month['expenses'] for month in comparison) == 120.50
+
+    def test_budget_alerts_fragment_etag(self, file_app):
+        """Test the budget alerts HTML fragment revalidates with its ETag"""
+        client = login(file_app)
+
+        response = client.get('/dashboard/fragments/budget_alerts')
+        assert response.status_code == 200
+        assert b'Food' in response.data
+
+        cached = client.get('/dashboard/fragments/budget_alerts',
+                            headers={'If-None-Match': response.headers['ETag']})
+        assert cached.status_code == 304
+
+
+class TestAnalyticsBatch:
+    """Test the batched analytics endpoint"""
+
+    def test_batch_matches_single_endpoints(self, file_app):
+        """Test each batched widget equals its standalone endpoint"""
+        with file_app.app_context():
+            food = Category.query.filter_by(category_name='Food').first()
+            db.session.add(Transaction(user_id=file_app.config['PANEL_USER_ID'],
+                                       category_id=food.category_id, amount=99.50,
+                                       transaction_type='expense', transaction_date=datetime.now()))
+            db.session.commit()
+        client = login(file_app)
+
+        batch = client.get('/api/analytics/batch').get_json()
+
+        assert batch['transaction_stats'] == client.get('/transactions/api/transaction_stats').get_json()
+        assert batch['category_spending'] == client.get('/transactions/api/category_spending').get_json()
+        assert batch['monthly_comparison'] == client.get('/transactions/api/monthly_comparison').get_json()
+        assert batch['budget_alerts'] == client.get('/transactions/api/budget_alerts').get_json()
+        assert batch['budget_alerts'][0]['spent'] == 220.00
+        assert batch['annual_data'] == client.get('/api/annual_data').get_json()
+
+    def test_batch_selected_widgets(self, file_app):
+        """Test only the requested widgets are returned"""
+        client = login(file_app)
+
+        response = client.get('/api/analytics/batch?widgets=annual_data,transaction_stats')
+        assert response.status_code == 200
+        assert set(response.get_json()) == {'annual_data', 'transaction_stats'}
+        assert response.get_json()['transaction_stats']['current_balance'] == 1879.50
+
+    def test_batch_unknown_widget(self, file_app):
+        """Test an unknown widget name is rejected"""
+        client = login(file_app)
+
+        response = client.get('/api/analytics/batch?widgets=annual_data,nope')
+        assert response.status_code == 400
@@ -1,7 +1,7 @@
 """Tests for family member management"""
 import pytest
 from app.models import Member, Transaction, MembersTransaction, db
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class TestMemberCreation:
@@ -144,3 +144,325 @@ class TestMemberStatistics:
             monthly = member.get_monthly_contribution(now.month, now.year)
 
             assert monthly >= 0
+
+
+class TestFamilyFragments:
+    """Test lazy-loaded family page fragments"""
+
+    def test_category_chart_fragment(self, app, auth_client, test_user, test_member, test_category):
+        """Test category chart JSON splits a shared expense per participant"""
+        with app.app_context():
+            trans = Transaction(user_id=test_user.user_id, category_id=test_category,
+                                amount=90.00, transaction_type='expense',
+                                transaction_date=datetime.now(), user_participates=True)
+            db.session.add(trans)
+            db.session.commit()
+            db.session.add(MembersTransaction(transaction_id=trans.transaction_id,
+                                              member_id=test_member.member_id))
+            db.session.commit()
+
+        response = auth_client.get('/family_management/fragments/category_chart')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['family'][0]['amount'] == 90.00
+        assert data['per_member']['Sarah Johnson'][0]['amount'] == 45.00
+
+    def test_shell_defers_summary(self, app, auth_client, test_user, test_member, monkeypatch):
+        """Test the page shell renders without the summary, which its fragment serves"""
+        with app.app_context():
+            trans = Transaction(user_id=test_user.user_id, amount=40.00, transaction_type='expense',
+                                transaction_date=datetime.now(), user_participates=True)
+            db.session.add(trans)
+            db.session.commit()
+
+        summary = auth_client.get('/family_management/fragments/summary').get_json()
+        assert summary['total_family_expenses'] == 40.00
+        assert summary['member_contributions'] == {str(test_member.member_id): 0}
+
+        def not_in_shell(user_id):
+            raise AssertionError('summary computed during the page render')
+
+        monkeypatch.setattr('app.services.FamilyExpenseService.get_family_summary', not_in_shell)
+        response = auth_client.get('/family_management')
+        assert response.status_code == 200
+        assert b'data-summary-url' in response.data
+
+    def test_fragment_revalidates_with_etag(self, auth_client):
+        """Test an unchanged fragment answers 304 to If-None-Match"""
+        response = auth_client.get('/family_management/fragments/budget_alerts')
+        assert response.status_code == 200
+        assert response.headers['ETag']
+
+        cached = auth_client.get('/family_management/fragments/budget_alerts',
+                                 headers={'If-None-Match': response.headers['ETag']})
+        assert cached.status_code == 304
+
+
+class TestMemberStats:
+    """Test MemberService.get_stats"""
+
+    @pytest.fixture
+    def family_expenses(self, app, test_user, test_category):
+        """Two members sharing expenses this month and last month, plus an income"""
+        with app.app_context():
+            first = Member(user_id=test_user.user_id, name='First', relationship='Child')
+            second = Member(user_id=test_user.user_id, name='Second', relationship='Child')
+            idle = Member(user_id=test_user.user_id, name='Idle', relationship='Parent')
+            db.session.add_all([first, second, idle])
+            db.session.flush()
+
+            this_month = datetime.now().replace(day=1, hour=12)
+            last_month = (this_month - timedelta(days=1)).replace(day=1)
+            for amount, when, members, transaction_type in (
+                (30.00, this_month, [first, second], 'expense'),
+                (10.00, this_month, [first], 'expense'),
+                (50.00, last_month, [second], 'expense'),
+                (99.00, this_month, [first], 'income')
+            ):
+                trans = Transaction(user_id=test_user.user_id, category_id=test_category, amount=amount,
+                                    transaction_type=transaction_type, transaction_date=when)
+                db.session.add(trans)
+                db.session.flush()
+                for member in members:
+                    db.session.add(MembersTransaction(transaction_id=trans.transaction_id,
+                                                      member_id=member.member_id))
+            db.session.commit()
+            return {'first': first.member_id, 'second': second.member_id, 'idle': idle.member_id,
+                    'this_month': this_month}
+
+    def test_lifetime_and_monthly_stats(self, app, test_user, family_expenses):
+        """Test totals, counts and averages for every member, with and without a period"""
+        from app.services import MemberService
+
+        with app.app_context():
+            lifetime = MemberService.get_stats(test_user.user_id)
+            assert lifetime[family_expenses['first']] == {
+                'total_transactions': 2, 'total_contribution': 15.00, 'average_per_transaction': 7.50
+            }
+            assert lifetime[family_expenses['second']]['total_contribution'] == 35.00
+            assert lifetime[family_expenses['idle']] == {
+                'total_transactions': 0, 'total_contribution': 0, 'average_per_transaction': 0
+            }
+
+            this_month = family_expenses['this_month']
+            monthly = MemberService.get_stats(test_user.user_id, [family_expenses['second']],
+                                              period=(this_month.year, this_month.month))
+            assert monthly == {family_expenses['second']: {
+                'total_transactions': 1, 'total_contribution': 10.00, 'average_per_transaction': 10.00
+            }}
+
+    def test_model_helpers_delegate(self, app, family_expenses):
+        """Test the Member helpers and to_dict report the same figures"""
+        with app.app_context():
+            member = db.session.get(Member, family_expenses['second'])
+            this_month = family_expenses['this_month']
+
+            assert member.get_monthly_contribution(this_month.month, this_month.year) == 10.00
+            assert member.get_lifetime_stats()['total_transactions'] == 2
+            assert member.to_dict()['total_contribution'] == 35.00
+
+    def test_single_query_for_all_members(self, app, test_user, family_expenses):
+        """Test stats for every member come from one statement"""
+        from sqlalchemy import event
+        from app.services import MemberService
+
+        with app.app_context():
+            statements = []
+            engine = db.engine
+            listener = lambda *args: statements.append(args[2])
+            event.listen(engine, 'before_cursor_execute', listener)
+            try:
+                MemberService.get_stats(test_user.user_id)
+            finally:
+                event.remove(engine, 'before_cursor_execute', listener)
+
+            assert len(statements) == 1
+
+
+class TestParticipantCategoryMatrix:
+    """Test FamilyExpenseService.get_participant_category_matrix"""
+
+    @pytest.fixture
+    def shared_spending(self, app, test_user, test_member, test_category):
+        """A shared Food expense, a members-only uncategorized one and an old personal one"""
+        with app.app_context():
+            now = datetime.now()
+            for amount, category_id, members, user_participates, when in (
+                (90.00, test_category, [test_member.member_id], True, now),
+                (20.00, None, [test_member.member_id], False, now),
+                (15.00, test_category, [], True, now - timedelta(days=400))
+            ):
+                trans = Transaction(user_id=test_user.user_id, category_id=category_id, amount=amount,
+                                    transaction_type='expense', transaction_date=when,
+                                    user_participates=user_participates)
+                db.session.add(trans)
+                db.session.flush()
+                for member_id in members:
+                    db.session.add(MembersTransaction(transaction_id=trans.transaction_id, member_id=member_id))
+            db.session.commit()
+        return test_member.member_id
+
+    def test_matrix_matches_model_split(self, app, test_user, shared_spending):
+        """Test each cell equals the per-row cost split, user row first"""
+        from app.services import FamilyExpenseService
+
+        with app.app_context():
+            matrix = FamilyExpenseService.get_participant_category_matrix(test_user.user_id)
+
+            assert matrix['categories'] == ['Food', 'Other']
+            assert [row['member_id'] for row in matrix['rows']] == [None, shared_spending]
+            assert matrix['rows'][0]['amounts'] == {'Food': 60.00}
+            assert matrix['rows'][1]['amounts'] == {'Food': 45.00, 'Other': 20.00}
+            assert matrix['rows'][1]['name'] == 'Sarah Johnson'
+
+            recent = FamilyExpenseService.get_participant_category_matrix(
+                test_user.user_id, start_date=datetime.now() - timedelta(days=30)
+            )
+            assert recent['rows'][0]['amounts'] == {'Food': 45.00}
+
+    def test_matrix_cached_until_data_changes(self, app, test_user, test_category, shared_spending):
+        """Test the cached matrix is reused until a write is published"""
+        from app.services import FamilyExpenseService
+
+        with app.app_context():
+            first = FamilyExpenseService.get_participant_category_matrix(test_user.user_id)
+            assert FamilyExpenseService.get_participant_category_matrix(test_user.user_id) is first
+
+            db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category, amount=5.00,
+                                       transaction_type='expense', transaction_date=datetime.now()))
+            db.session.commit()
+
+            refreshed = FamilyExpenseService.get_participant_category_matrix(test_user.user_id)
+            assert refreshed is not first
+            assert refreshed['rows'][0]['amounts']['Food'] == 65.00
+
+    def test_matrix_endpoint(self, auth_client, shared_spending):
+        """Test the JSON endpoint labels the user's row and validates dates"""
+        data = auth_client.get('/api/family/category_matrix').get_json()
+        assert data['rows'][0]['name'] == 'Test User'
+        assert auth_client.get('/api/family/category_matrix?start=soon').status_code == 400
+
+
+class TestParticipantMonthlySeries:
+    """Test FamilyExpenseService.get_participant_monthly_series"""
+
+    def test_calendar_months_with_shares(self, app, test_user, test_member, test_category):
+        """Test each calendar month is reported once with every participant's share"""
+        from app.services import FamilyExpenseService
+
+        with app.app_context():
+            # 31-day months around "now" used to be skipped or repeated by 30-day stepping
+            now = datetime(2025, 7, 31, 18, 0)
+            for amount, when, members in ((60.00, datetime(2025, 7, 31, 20, 0), [test_member.member_id]),
+                                          (25.00, datetime(2025, 5, 31, 9, 0), []),
+                                          (40.00, datetime(2025, 3, 1), [test_member.member_id]),
+                                          (99.00, datetime(2025, 1, 31), [])):
+                trans = Transaction(user_id=test_user.user_id, category_id=test_category, amount=amount,
+                                    transaction_type='expense', transaction_date=when)
+                db.session.add(trans)
+                db.session.flush()
+                for member_id in members:
+                    db.session.add(MembersTransaction(transaction_id=trans.transaction_id, member_id=member_id))
+            db.session.commit()
+
+            series = FamilyExpenseService.get_participant_monthly_series(test_user.user_id, 6, now)
+
+            assert [p['member_id'] for p in series['participants']] == [None, test_member.member_id]
+            assert [entry['month'] for entry in series['months']] == [
+                '2025-02', '2025-03', '2025-04', '2025-05', '2025-06', '2025-07'
+            ]
+            by_month = {entry['month']: entry for entry in series['months']}
+            assert by_month['2025-07']['expenses'] == 60.00
+            assert by_month['2025-07']['shares'] == [30.00, 30.00]
+            assert by_month['2025-05']['shares'] == [25.00, 0.0]
+            assert by_month['2025-03']['shares'] == [20.00, 20.00]
+            assert by_month['2025-04']['expenses'] == 0
+
+            comparison = FamilyExpenseService.get_monthly_comparison(test_user.user_id, now)
+            assert [entry['expenses'] for entry in comparison] == [0, 40.00, 0, 25.00, 0, 60.00]
+
+    def test_monthly_shares_endpoint(self, auth_client):
+        """Test arbitrary month counts and the bounds check"""
+        data = auth_client.get('/api/family/monthly_shares?months=24').get_json()
+        assert len(data['months']) == 24
+        assert data['participants'][0]['name'] == 'Test User'
+        assert auth_client.get('/api/family/monthly_shares?months=0').status_code == 400
+
+
+class TestExpenseTimeline:
+    """Test the keyset-paginated family expense timeline"""
+
+    @pytest.fixture
+    def timeline_expenses(self, app, test_user, test_member, test_category):
+        """Seven shared expenses, several on the same timestamp, and one personal expense"""
+        with app.app_context():
+            other_member = Member(user_id=test_user.user_id, name='Other', relationship='Child')
+            db.session.add(other_member)
+            db.session.flush()
+
+            same_time = datetime(2025, 6, 1, 12, 0)
+            ids = []
+            for index in range(7):
+                when = same_time if index < 4 else same_time - timedelta(days=index)
+                member_id = test_member.member_id if index % 2 == 0 else other_member.member_id
+                trans = Transaction(user_id=test_user.user_id, category_id=test_category, amount=10.00 + index,
+                                    transaction_type='expense', transaction_date=when)
+                db.session.add(trans)
+                db.session.flush()
+                db.session.add(MembersTransaction(transaction_id=trans.transaction_id, member_id=member_id))
+                ids.append(trans.transaction_id)
+            db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category, amount=5.00,
+                                       transaction_type='expense', transaction_date=same_time))
+            db.session.commit()
+            return {'ids': ids, 'member_id': test_member.member_id}
+
+    def test_pages_cover_every_shared_expense_once(self, app, test_user, timeline_expenses):
+        """Test walking the cursor returns each shared expense once, newest first"""
+        from app.services import FamilyExpenseService
+
+        with app.app_context():
+            seen, cursor = [], None
+            while True:
+                page = FamilyExpenseService.get_expense_timeline(test_user.user_id, 'Test User',
+                                                                 cursor=cursor, limit=3)
+                seen.extend(expense['id'] for expense in page['expenses'])
+                cursor = page['next_cursor']
+                if cursor is None:
+                    break
+
+            ids = timeline_expenses['ids']
+            assert seen == [ids[3], ids[2], ids[1], ids[0], ids[4], ids[5], ids[6]]
+
+    def test_filters_and_batched_loading(self, app, test_user, test_category, timeline_expenses):
+        """Test member filtering and that a page costs a fixed number of queries"""
+        from sqlalchemy import event
+        from app.services import FamilyExpenseService
+
+        with app.app_context():
+            page = FamilyExpenseService.get_expense_timeline(test_user.user_id, 'Test User',
+                                                             member_id=timeline_expenses['member_id'])
+            assert [expense['id'] for expense in page['expenses']] == [
+                timeline_expenses['ids'][2], timeline_expenses['ids'][0],
+                timeline_expenses['ids'][4], timeline_expenses['ids'][6]
+            ]
+            assert page['expenses'][0]['shared_with'] == ['Test User', 'Sarah Johnson']
+
+            db.session.expire_all()
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                FamilyExpenseService.get_expense_timeline(test_user.user_id, 'Test User', limit=7)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+            assert len(statements) == 2
+
+    def test_timeline_endpoint(self, auth_client, timeline_expenses):
+        """Test the JSON endpoint pages with next_cursor and rejects bad cursors"""
+        first = auth_client.get('/api/family/expenses?limit=5').get_json()
+        assert len(first['expenses']) == 5
+        second = auth_client.get(f"/api/family/expenses?limit=5&cursor={first['next_cursor']}").get_json()
+        assert len(second['expenses']) == 2
+        assert second['next_cursor'] is None
+
+        assert auth_client.get('/api/family/expenses?cursor=not-a-cursor').status_code == 400
@@ -0,0 +1,233 @@
+"""Tests for bank statement import"""
+import io
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from app.importer import CategoryRules, StatementError, parse_statement
+from app.models import Category, DailyCumulative, Transaction
+from app.services import LedgerService, StatementImportService
+
+CSV_STATEMENT = """Date,Description,Amount
+03/03/2025,TESCO STORES 2231,-23.45
+03/03/2025,Monthly salary,2500.00
+04/03/2025,UBER *TRIP,-12.10
+05/03/2025,Corner shop,-4.99
+06/03/2025,Broken row,abc
+07/03/2025,Zero row,0.00
+"""
+
+OFX_STATEMENT = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20250303120000[0:GMT]
+<TRNAMT>-23.45
+<NAME>TESCO STORES
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20250304</DTPOSTED><TRNAMT>100.00</TRNAMT><MEMO>Refund</MEMO></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+QIF_STATEMENT = """!Type:Bank
+D03/03/2025
+T-23.45
+PTESCO STORES
+^
+D04/03'25
+T1,250.00
+PEmployer Ltd
+^
+"""
+
+
+def ledger_matches_rebuild(user_id):
+    """Test helper: the incrementally kept ledger equals a full rebuild"""
+    def rows():
+        return [(row.transaction_type, row.category_key, row.day, row.day_amount, row.cumulative_amount)
+                for row in DailyCumulative.query.filter_by(user_id=user_id).order_by(
+                    DailyCumulative.transaction_type, DailyCumulative.category_key, DailyCumulative.day)]
+
+    incremental = rows()
+    LedgerService.rebuild(user_id)
+    return rows() == incremental
+
+
+class TestStatementParsing:
+    """Test the streaming statement parsers and rule matching"""
+
+    def test_formats_parse_to_the_same_rows(self):
+        """Test CSV, OFX and QIF give signed amounts, dates and descriptions per record"""
+        csv_rows = list(parse_statement(io.StringIO(CSV_STATEMENT), 'csv'))
+        assert csv_rows[0] == (2, datetime(2025, 3, 3), Decimal('-23.45'), 'TESCO STORES 2231')
+        assert isinstance(csv_rows[4], StatementError) and 'Line 6' in str(csv_rows[4])
+
+        ofx_rows = list(parse_statement(io.StringIO(OFX_STATEMENT), 'ofx'))
+        assert [(row.date, row.amount, row.description) for row in ofx_rows] == [
+            (datetime(2025, 3, 3), Decimal('-23.45'), 'TESCO STORES'),
+            (datetime(2025, 3, 4), Decimal('100.00'), 'Refund'),
+        ]
+
+        qif_rows = list(parse_statement(io.StringIO(QIF_STATEMENT), 'qif'))
+        assert [(row.date, row.amount, row.description) for row in qif_rows] == [
+            (datetime(2025, 3, 3), Decimal('-23.45'), 'TESCO STORES'),
+            (datetime(2025, 3, 4), Decimal('1250.00'), 'Employer Ltd'),
+        ]
+
+    def test_rules_match_earliest_then_most_specific(self):
+        """Test the compiled rules pick the leftmost match, then regex over keyword and longer keyword"""
+        assert CategoryRules.default().match('Uber Eats order') == 'Food'
+        rules = CategoryRules.default([('re:the \\w+ shop', 'Entertainment'), ('corner', 'Shopping')])
+        assert rules.match('The corner shop') == 'Entertainment'
+        assert rules.match('UBER *TRIP') == 'Transport'
+        assert rules.match('A corner shop') == 'Shopping'
+        assert rules.match('Unknown payee') is None
+        with pytest.raises(ValueError):
+            CategoryRules([('re:(', 'Food')])
+
+
+class TestStatementImport:
+    """Test importing statements as transactions"""
+
+    def test_upload_imports_categorizes_and_replays(self, app, auth_client, test_user):
+        """Test a CSV upload inserts valid rows, reports bad ones, keeps the ledger and replays by key"""
+        def upload():
+            return auth_client.post('/transactions/api/import', data={
+                'statement': (io.BytesIO(CSV_STATEMENT.encode()), 'march.csv'),
+                'rules': '[{"pattern": "corner", "category": "Shopping"}]'
+            }, headers={'Idempotency-Key': 'march-import'}, content_type='multipart/form-data')
+
+        data = upload().get_json()
+        assert data['success'] and not data['replayed']
+        assert (data['imported'], data['categorized'], data['rejected']) == (4, 3, 2)
+        assert len(data['errors']) == 2
+
+        with app.app_context():
+            categories = {category.category_id: category.category_name for category in Category.query}
+            rows = {row.description: (row.transaction_type, row.amount, categories.get(row.category_id))
+                    for row in Transaction.query.filter_by(user_id=test_user.user_id)}
+            assert rows == {
+                'TESCO STORES 2231': ('expense', Decimal('23.45'), 'Food'),
+                'Monthly salary': ('income', Decimal('2500.00'), None),
+                'UBER *TRIP': ('expense', Decimal('12.10'), 'Transport'),
+                'Corner shop': ('expense', Decimal('4.99'), 'Shopping'),
+            }
+            assert LedgerService.get_balance_as_of(test_user.user_id, datetime(2025, 3, 31)) == 2500 - 40.54
+            assert ledger_matches_rebuild(test_user.user_id)
+
+        replay = upload().get_json()
+        assert replay == {'success': True, 'replayed': True, 'imported': 4}
+        with app.app_context():
+            assert Transaction.query.count() == 4
+
+    def test_unknown_rule_category_rejects_the_upload(self, app, auth_client):
+        """Test a rule naming a category the user cannot use imports nothing"""
+        response = auth_client.post('/transactions/api/import', data={
+            'statement': (io.BytesIO(CSV_STATEMENT.encode()), 'march.csv'),
+            'rules': '[{"pattern": "corner", "category": "Pets"}]'
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 400
+        with app.app_context():
+            assert Transaction.query.count() == 0
+
+    def test_unmatched_expenses_go_to_other(self, app, test_user):
+        """Test expenses no rule matches get the Other category, or are rejected without one"""
+        lines = ['Date,Description,Amount', '2025-03-01,Unknown payee,-9.99',
+                 '2025-03-02,Tesco,-5.00', '2025-03-03,Gift,20.00']
+
+        with app.app_context():
+            report, _ = StatementImportService.run(
+                test_user.user_id, lambda: parse_statement(iter(lines), 'csv'))
+            other = Category.query.filter_by(category_name='Other').one()
+            assert (report['imported'], report['categorized']) == (3, 1)
+            assert Transaction.query.filter_by(description='Unknown payee').one().category_id == other.category_id
+            assert Transaction.query.filter_by(description='Gift').one().category_id is None
+
+            db.session.delete(other)
+            db.session.commit()
+            report = StatementImportService.import_rows(
+                db.session, test_user.user_id, parse_statement(iter(lines), 'csv'), CategoryRules.default(),
+                skip_duplicates=False)
+            db.session.rollback()
+            assert (report['imported'], report['rejected']) == (2, 1)
+            assert report['errors'][0].startswith('Line 2:')
+
+    def test_many_ledger_days_rebuild_the_ledger(self, app, test_user, monkeypatch):
+        """Test an import spanning more days than the threshold still leaves an exact ledger"""
+        monkeypatch.setattr(StatementImportService, 'LEDGER_REBUILD_KEYS', 2)
+        monkeypatch.setattr(StatementImportService, 'BATCH_SIZE', 3)
+        lines = ['Date,Description,Amount'] + [f'2025-01-{day:02d},Tesco,-{day}.00' for day in range(1, 11)]
+
+        with app.app_context():
+            report, _ = StatementImportService.run(
+                test_user.user_id, lambda: parse_statement(iter(lines), 'csv'))
+            assert report['imported'] == 10
+            assert LedgerService.get_range_total(test_user.user_id, datetime(2025, 1, 1),
+                                                 datetime(2025, 2, 1)) == 55.0
+            assert ledger_matches_rebuild(test_user.user_id)
+
+
+class TestDuplicateDetection:
+    """Test fingerprints and duplicate matching of imported and entered transactions"""
+
+    def test_overlapping_import_skips_stored_rows(self, app, test_user):
+        """Test re-imported rows are skipped once per stored match and same-amount neighbours are flagged"""
+        def import_lines(*rows):
+            lines = ['Date,Description,Amount'] + list(rows)
+            return StatementImportService.run(test_user.user_id, lambda: parse_statement(iter(lines), 'csv'))[0]
+
+        with app.app_context():
+            first = import_lines('2025-03-03,Coffee,-3.20', '2025-03-04,Tesco,-20.00')
+            assert (first['imported'], first['duplicates']) == (2, 0)
+
+            # Two coffees on the 3rd (one new), the Tesco row again, and a new Tesco row two days later
+            second = import_lines('2025-03-03,COFFEE,-3.20', '2025-03-03,Coffee,-3.20',
+                                  '2025-03-04,Tesco,-20.00', '2025-03-06,Tesco Extra,-20.00')
+            assert (second['imported'], second['duplicates']) == (2, 2)
+            tesco = Transaction.query.filter_by(description='Tesco').one()
+            assert {'line': 5, 'duplicate_of': tesco.transaction_id} in second['possible_duplicates']
+            assert Transaction.query.count() == 4
+            assert ledger_matches_rebuild(test_user.user_id)
+
+    def test_fingerprint_follows_edits(self, app, test_user, test_category):
+        """Test ORM edits and bulk recategorizing keep the stored fingerprint current"""
+        from app.services import BulkTransactionService
+        from app.utils import transaction_fingerprint
+
+        def current(transaction):
+            return transaction_fingerprint(transaction.transaction_type, transaction.transaction_date,
+                                           transaction.amount, transaction.category_id, transaction.description)
+
+        with app.app_context():
+            trans = Transaction(user_id=test_user.user_id, category_id=test_category, amount=12.50,
+                                transaction_type='expense', transaction_date=datetime(2025, 3, 3))
+            db.session.add(trans)
+            db.session.commit()
+            assert trans.fingerprint == current(trans)
+
+            trans.amount = 13.00
+            db.session.commit()
+            assert trans.fingerprint == current(trans)
+
+            BulkTransactionService.run(test_user.user_id, 'recategorize',
+                                       Transaction.transaction_id == trans.transaction_id, category_id=None)
+            db.session.refresh(trans)
+            assert trans.category_id is None and trans.fingerprint == current(trans)
+
+    def test_duplicates_api_pairs_repeated_amounts(self, app, auth_client, test_user, test_category):
+        """Test the duplicates endpoint pairs same-amount entries inside the window only"""
+        with app.app_context():
+            for amount, day in ((45.00, 1), (45.00, 3), (45.00, 20), (9.99, 3)):
+                db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category, amount=amount,
+                                           transaction_type='expense', transaction_date=datetime(2025, 3, day)))
+            db.session.commit()
+            first, second = [t.transaction_id for t in Transaction.query.filter_by(amount=45.00)
+                             .order_by(Transaction.transaction_date).limit(2)]
+
+        data = auth_client.get('/transactions/api/duplicates?days=3').get_json()
+        assert [(pair['transaction_id'], pair['duplicate_of'], pair['days_apart'], pair['exact'])
+                for pair in data['duplicates']] == [(second, first, 2, False)]
+        assert auth_client.get('/transactions/api/duplicates?days=90').status_code == 400
@@ -0,0 +1,162 @@
+"""Tests for the daily_cumulative prefix-sum ledger"""
+import random
+from datetime import datetime, timedelta
+from app.models import Transaction, Category, DailyCumulative, db
+from app.services import LedgerService
+
+
+def ledger_rows(user_id):
+    """Every ledger row for a user, in key order"""
+    return [
+        (row.transaction_type, row.category_key, row.day, row.day_amount, row.cumulative_amount)
+        for row in DailyCumulative.query.filter_by(user_id=user_id).order_by(
+            DailyCumulative.transaction_type, DailyCumulative.category_key, DailyCumulative.day
+        )
+    ]
+
+
+def raw_total(user_id, transaction_type, start, end, category_id=None):
+    """Reference total straight from the transactions table"""
+    query = Transaction.query.filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_type == transaction_type,
+        Transaction.transaction_date >= start,
+        Transaction.transaction_date < end
+    )
+    if category_id is not None:
+        query = query.filter(Transaction.category_id == category_id)
+    return round(sum(float(t.amount) for t in query), 2)
+
+
+def add_transaction(user_id, category_id, amount, days_ago, transaction_type='expense'):
+    transaction = Transaction(user_id=user_id, category_id=category_id, amount=amount,
+                              transaction_type=transaction_type,
+                              transaction_date=datetime.now() - timedelta(days=days_ago))
+    db.session.add(transaction)
+    db.session.commit()
+    return transaction.transaction_id
+
+
+class TestLedgerMaintenance:
+    """Test the ledger follows ORM writes"""
+
+    def test_matches_raw_sums_after_writes(self, app, test_user, test_category):
+        """Test range totals match raw SQL after inserts, a back-dated edit and a delete"""
+        rng = random.Random(7)
+        with app.app_context():
+            category_ids = [category.category_id for category in Category.query.all()] + [None]
+            ids = [add_transaction(test_user.user_id, rng.choice(category_ids),
+                                   round(rng.uniform(1, 200), 2), rng.randint(0, 90),
+                                   'income' if rng.random() < 0.2 else 'expense')
+                   for _ in range(40)]
+
+            edited = db.session.get(Transaction, ids[0])
+            edited.transaction_date = datetime.now() - timedelta(days=120)
+            edited.amount = 55.55
+            edited.category_id = test_category
+            db.session.commit()
+
+            db.session.delete(db.session.get(Transaction, ids[1]))
+            db.session.commit()
+
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            for start_days, end_days in ((150, 0), (60, 30), (10, 0), (120, 119)):
+                start = today - timedelta(days=start_days)
+                end = today - timedelta(days=end_days - 1)
+                for transaction_type in ('income', 'expense'):
+                    assert LedgerService.get_range_total(
+                        test_user.user_id, start, end, transaction_type
+                    ) == raw_total(test_user.user_id, transaction_type, start, end)
+                assert LedgerService.get_range_total(
+                    test_user.user_id, start, end, 'expense', test_category
+                ) == raw_total(test_user.user_id, 'expense', start, end, test_category)
+
+    def test_incremental_equals_rebuild(self, app, test_user, test_category):
+        """Test incrementally maintained rows equal a full rebuild"""
+        with app.app_context():
+            first = add_transaction(test_user.user_id, test_category, 10.00, 5)
+            add_transaction(test_user.user_id, None, 20.00, 3)
+            add_transaction(test_user.user_id, test_category, 30.00, 1)
+            moved = db.session.get(Transaction, first)
+            moved.transaction_date = datetime.now()
+            db.session.commit()
+
+            incremental = ledger_rows(test_user.user_id)
+            LedgerService.rebuild(test_user.user_id)
+
+            assert ledger_rows(test_user.user_id) == incremental
+
+    def test_rebuild_since_equals_full_rebuild(self, app, test_user, test_category):
+        """Test recomputing only recent days continues each series' running total"""
+        with app.app_context():
+            for days_ago in (9, 6, 4, 2, 0):
+                add_transaction(test_user.user_id, test_category, 10.00 + days_ago, days_ago)
+                add_transaction(test_user.user_id, None, 5.00, days_ago, transaction_type='income')
+            full = ledger_rows(test_user.user_id)
+            # Rows the window rebuild must replace, not add to
+            db.session.execute(DailyCumulative.__table__.update().where(
+                DailyCumulative.day >= (datetime.now() - timedelta(days=4)).date()
+            ).values(cumulative_amount=0))
+
+            LedgerService.rebuild(test_user.user_id, since=(datetime.now() - timedelta(days=4)).date())
+
+            assert ledger_rows(test_user.user_id) == full
+
+    def test_rollback_leaves_ledger_untouched(self, app, test_user, test_category):
+        """Test ledger rows written during a flush roll back with it"""
+        with app.app_context():
+            add_transaction(test_user.user_id, test_category, 10.00, 0)
+            before = ledger_rows(test_user.user_id)
+
+            db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category,
+                                       amount=99.00, transaction_type='expense',
+                                       transaction_date=datetime.now()))
+            db.session.flush()
+            db.session.rollback()
+
+            assert ledger_rows(test_user.user_id) == before
+
+
+class TestLedgerEndpoints:
+    """Test the ledger JSON endpoints"""
+
+    def test_range_total_balance_and_heatmap(self, app, auth_client, test_user, test_category):
+        """Test the endpoints report ledger figures for the requested dates"""
+        with app.app_context():
+            add_transaction(test_user.user_id, test_category, 40.00, 2)
+            add_transaction(test_user.user_id, test_category, 15.50, 0)
+            add_transaction(test_user.user_id, None, 100.00, 10, 'income')
+
+        today = datetime.now().date()
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        start = (today - timedelta(days=2)).isoformat()
+
+        response = auth_client.get(f'/api/ledger/range_total?start={start}&end={tomorrow}')
+        assert response.get_json()['total'] == 55.50
+
+        response = auth_client.get(f'/api/ledger/range_total?start={start}&end={today.isoformat()}'
+                                   f'&category_id={test_category}')
+        assert response.get_json()['total'] == 40.00
+
+        response = auth_client.get(f'/api/ledger/balance?date={start}')
+        assert response.get_json()['balance'] == 60.00
+
+        days = auth_client.get(f'/api/ledger/heatmap?start={start}&end={tomorrow}').get_json()['days']
+        assert days == [{'date': start, 'amount': 40.00}, {'date': today.isoformat(), 'amount': 15.50}]
+
+    def test_rejects_bad_arguments(self, auth_client):
+        """Test malformed dates and unknown types are rejected"""
+        assert auth_client.get('/api/ledger/range_total?start=01/02/2025').status_code == 400
+        assert auth_client.get('/api/ledger/range_total?type=transfer').status_code == 400
+        assert auth_client.get('/api/ledger/balance?date=yesterday').status_code == 400
+
+    def test_clear_all_data_removes_ledger(self, app, auth_client, test_user, test_category):
+        """Test clearing data also clears the user's ledger rows"""
+        with app.app_context():
+            add_transaction(test_user.user_id, test_category, 40.00, 2)
+            assert ledger_rows(test_user.user_id)
+
+        assert auth_client.post('/clear_all_data').get_json()['success']
+
+        with app.app_context():
+            assert ledger_rows(test_user.user_id) == []
@@ -0,0 +1,124 @@
+"""Tests for the change event hub and the live updates stream"""
+import json
+from datetime import datetime
+from app.events import EventHub, event_hub
+from app.models import Transaction, Budget, db
+
+
+def read_event(chunks):
+    """Next non-heartbeat SSE message as (event type, data)"""
+    while True:
+        chunk = next(chunks).decode()
+        if chunk.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        return fields.get('event'), json.loads(fields['data'])
+
+
+class TestEventHub:
+    """Test publish/subscribe behaviour"""
+
+    def test_publish_reaches_only_that_users_subscribers(self):
+        """Test events are delivered per user and bump the version"""
+        hub = EventHub()
+        first = hub.subscribe(1)
+        other = hub.subscribe(2)
+
+        version = hub.publish(1, 'data_changed', {'kinds': ['transactions']})
+
+        assert version == 1
+        assert hub.version(1) == 1
+        assert first.get_nowait()['data'] == {'kinds': ['transactions']}
+        assert other.empty()
+
+    def test_full_queue_keeps_newest_event(self):
+        """Test a slow subscriber loses its oldest event, not the newest"""
+        hub = EventHub(max_queue_size=2)
+        subscription = hub.subscribe(1)
+        for _ in range(3):
+            hub.publish(1, 'data_changed')
+
+        assert [subscription.get_nowait()['version'] for _ in range(2)] == [2, 3]
+
+    def test_unsubscribe(self):
+        """Test unsubscribed queues stop receiving events"""
+        hub = EventHub()
+        subscription = hub.subscribe(1)
+        hub.unsubscribe(1, subscription)
+        hub.publish(1, 'data_changed')
+
+        assert hub.subscriber_count(1) == 0
+        assert subscription.empty()
+
+
+class TestWriteNotifications:
+    """Test committed writes publish change events"""
+
+    def test_commit_publishes(self, app, test_user, test_category):
+        """Test committing a transaction notifies the owner"""
+        subscription = event_hub.subscribe(test_user.user_id)
+        try:
+            with app.app_context():
+                db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category,
+                                           amount=10.00, transaction_type='expense',
+                                           transaction_date=datetime.now()))
+                db.session.commit()
+
+            message = subscription.get_nowait()
+            assert message['event'] == 'data_changed'
+            assert message['data']['kinds'] == ['transactions']
+            assert len(message['data']['appended']) == 1
+            assert message['data']['rewritten'] is False
+        finally:
+            event_hub.unsubscribe(test_user.user_id, subscription)
+
+    def test_rollback_does_not_publish(self, app, test_user, test_category):
+        """Test flushed but rolled back writes are not published"""
+        subscription = event_hub.subscribe(test_user.user_id)
+        try:
+            with app.app_context():
+                db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category,
+                                           amount=10.00, transaction_type='expense',
+                                           transaction_date=datetime.now()))
+                db.session.flush()
+                db.session.rollback()
+
+            assert subscription.empty()
+        finally:
+            event_hub.unsubscribe(test_user.user_id, subscription)
+
+
+class TestLiveStream:
+    """Test the Server-Sent Events endpoint"""
+
+    def test_stream_pushes_budget_crossing(self, app, auth_client, test_user, test_category):
+        """Test a write that crosses a budget threshold is pushed to the stream"""
+        with app.app_context():
+            db.session.add(Budget(user_id=test_user.user_id, category_id=test_category,
+                                  budget_amount=100.00, alert_threshold=80.0))
+            db.session.commit()
+
+        response = auth_client.get('/transactions/api/live')
+        assert response.mimetype == 'text/event-stream'
+        chunks = iter(response.response)
+
+        event_type, snapshot = read_event(chunks)
+        assert event_type == 'snapshot'
+        assert snapshot['budgets'][0]['status'] == 'within_budget'
+
+        with app.app_context():
+            db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category,
+                                       amount=85.00, transaction_type='expense',
+                                       transaction_date=datetime.now()))
+            db.session.commit()
+
+        event_type, budget = read_event(chunks)
+        assert event_type == 'budget_alert'
+        assert budget['status'] == 'alert_threshold_reached'
+
+        event_type, snapshot = read_event(chunks)
+        assert event_type == 'snapshot'
+        assert snapshot['monthly_expenses'] == 85.00
+
+        response.close()
+        assert event_hub.subscriber_count(test_user.user_id) == 0
@@ -0,0 +1,164 @@
+"""Tests for recurring transaction rules and their materializer"""
+from datetime import date
+from app.models import (Transaction, Member, MembersTransaction, RecurringRule, RecurringRuleMember,
+                        RecurringOccurrence, db)
+from app.services import LedgerService, RecurringService
+from app.utils import recurrence_date
+from tests.test_ledger import ledger_rows
+
+
+class TestRecurrenceDates:
+    """Test the occurrence schedule of a rule"""
+
+    def test_month_ends_are_clamped(self):
+        """Test a rule anchored on the 31st falls on each month's last day"""
+        anchor = date(2025, 1, 31)
+        assert [recurrence_date(anchor, 'month', 1, index) for index in range(4)] == [
+            date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)]
+        assert recurrence_date(date(2024, 2, 29), 'year', 1, 1) == date(2025, 2, 28)
+        assert recurrence_date(anchor, 'week', 2, 3) == date(2025, 3, 14)
+
+
+class TestMaterializer:
+    """Test the batch job enters due occurrences once"""
+
+    def test_catch_up_and_rerun(self, app, test_user, test_category):
+        """Test missed months are entered in one run and a second run adds nothing"""
+        with app.app_context():
+            rule = RecurringService.create_rule(test_user.user_id, 'expense', '12.50', 'month',
+                                                date(2025, 1, 31), category_id=test_category,
+                                                description='Netflix subscription')
+            report = RecurringService.materialize(date(2025, 5, 15))
+
+            assert report == {'transactions': 4, 'rules': 1, 'users': 1, 'behind': 0}
+            dates = [t.transaction_date.date() for t in
+                     Transaction.query.filter_by(user_id=test_user.user_id).order_by(Transaction.transaction_date)]
+            assert dates == [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)]
+            assert db.session.get(RecurringRule, rule.rule_id).next_date == date(2025, 5, 31)
+            for occurrence in RecurringOccurrence.query.filter_by(rule_id=rule.rule_id):
+                entered = db.session.get(Transaction, occurrence.transaction_id)
+                assert entered.transaction_date.date() == occurrence.occurrence_date
+
+            assert RecurringService.materialize(date(2025, 5, 15))['transactions'] == 0
+            assert Transaction.query.filter_by(user_id=test_user.user_id).count() == 4
+
+            incremental = ledger_rows(test_user.user_id)
+            LedgerService.rebuild(test_user.user_id)
+            assert ledger_rows(test_user.user_id) == incremental
+
+    def test_deleted_occurrence_is_not_reentered(self, app, test_user, test_category):
+        """Test a generated transaction the user deleted stays deleted"""
+        with app.app_context():
+            rule = RecurringService.create_rule(test_user.user_id, 'income', '100', 'week', date(2025, 3, 3),
+                                                category_id=test_category, end_date=date(2025, 3, 20))
+            RecurringService.materialize(date(2025, 3, 10))
+            db.session.delete(Transaction.query.filter_by(user_id=test_user.user_id).first())
+            db.session.commit()
+            # As if the run's rule update had been lost: the schedule restarts at the anchor
+            stale = db.session.get(RecurringRule, rule.rule_id)
+            stale.next_date, stale.occurrence_count = date(2025, 3, 3), 0
+            db.session.commit()
+
+            assert RecurringService.materialize(date(2025, 4, 1))['transactions'] == 1
+            assert Transaction.query.filter_by(user_id=test_user.user_id).count() == 2
+            assert RecurringOccurrence.query.filter_by(rule_id=rule.rule_id).count() == 3
+            assert RecurringOccurrence.query.filter_by(transaction_id=None).count() == 1
+            assert db.session.get(RecurringRule, rule.rule_id).next_date is None
+
+    def test_shared_rule_splits_each_occurrence(self, app, test_user, test_member, test_category):
+        """Test occurrences of a rule with members get member links and the user's share"""
+        with app.app_context():
+            RecurringService.create_rule(test_user.user_id, 'expense', '90.00', 'day', date(2025, 6, 1),
+                                         category_id=test_category, member_ids=[test_member.member_id],
+                                         interval_count=3)
+            RecurringService.materialize(date(2025, 6, 7))
+
+            transactions = Transaction.query.filter_by(user_id=test_user.user_id).all()
+            assert len(transactions) == 3
+            assert all(float(t.user_share_amount) == 45.00 for t in transactions)
+            assert MembersTransaction.query.count() == 3
+
+    def test_deleted_members_are_not_split_with(self, app, test_user, test_member, test_category):
+        """Test a rule stops splitting with a member deleted through the ORM or out of band"""
+        with app.app_context():
+            other = Member(user_id=test_user.user_id, name='Tom', relationship='Child')
+            db.session.add(other)
+            db.session.commit()
+            other_id = other.member_id
+            RecurringService.create_rule(test_user.user_id, 'expense', '30.00', 'month', date(2025, 6, 1),
+                                         category_id=test_category,
+                                         member_ids=[test_member.member_id, other_id])
+
+            db.session.delete(db.session.get(Member, test_member.member_id))
+            db.session.commit()
+            assert RecurringRuleMember.query.count() == 1
+            Member.query.filter_by(member_id=other_id).delete()
+            db.session.commit()
+            RecurringService.materialize(date(2025, 6, 1))
+
+            transaction = Transaction.query.filter_by(user_id=test_user.user_id).one()
+            assert float(transaction.user_share_amount) == 30.00
+            assert MembersTransaction.query.count() == 0
+
+    def test_bulk_delete_detaches_occurrences(self, app, auth_client, test_user, test_category):
+        """Test bulk-deleted transactions leave their occurrences without a transaction"""
+        with app.app_context():
+            RecurringService.create_rule(test_user.user_id, 'expense', '5', 'day', date(2025, 6, 1),
+                                         category_id=test_category)
+            RecurringService.materialize(date(2025, 6, 2))
+            ids = [t.transaction_id for t in Transaction.query]
+
+        response = auth_client.post('/transactions/api/bulk', json={'action': 'delete', 'ids': ids})
+        assert response.get_json()['affected'] == 2
+        with app.app_context():
+            assert RecurringOccurrence.query.filter(RecurringOccurrence.transaction_id.isnot(None)).count() == 0
+            assert RecurringService.materialize(date(2025, 6, 2))['transactions'] == 0
+
+    def test_catch_up_is_capped(self, app, test_user, test_category, monkeypatch):
+        """Test a rule far behind is reported and continues on the next run"""
+        monkeypatch.setattr(RecurringService, 'MAX_CATCH_UP', 5)
+        with app.app_context():
+            RecurringService.create_rule(test_user.user_id, 'expense', '1', 'day', date(2025, 1, 1),
+                                         category_id=test_category)
+            assert RecurringService.materialize(date(2025, 1, 8))['behind'] == 1
+            assert RecurringService.materialize(date(2025, 1, 8)) == {
+                'transactions': 3, 'rules': 1, 'users': 1, 'behind': 0}
+
+    def test_run_command(self, app, test_user, test_category):
+        """Test the CLI job enters occurrences up to --date"""
+        with app.app_context():
+            RecurringService.create_rule(test_user.user_id, 'income', '2000', 'month', date(2025, 1, 25),
+                                         category_id=test_category)
+        result = app.test_cli_runner().invoke(args=['recurring', 'run', '--date', '2025-03-01'])
+        assert 'Entered 2 transactions from 1 rules for 1 users.' in result.output
+
+
+class TestRecurringApi:
+    """Test the recurring rule endpoints"""
+
+    def test_create_list_and_delete(self, app, auth_client, test_category):
+        """Test a rule round-trips through the API and deleting it keeps its transactions"""
+        response = auth_client.post('/transactions/api/recurring', json={
+            'type': 'expense', 'amount': '9.99', 'interval_unit': 'month', 'anchor_date': '2025-01-15',
+            'category_id': test_category, 'description': 'Spotify'})
+        assert response.status_code == 201
+        rule_id = response.get_json()['rule']['rule_id']
+        assert [rule['rule_id'] for rule in auth_client.get('/transactions/api/recurring').get_json()['rules']] == [rule_id]
+
+        with app.app_context():
+            RecurringService.materialize(date(2025, 2, 20))
+        assert auth_client.delete(f'/transactions/api/recurring/{rule_id}').status_code == 200
+        assert auth_client.delete(f'/transactions/api/recurring/{rule_id}').status_code == 404
+        with app.app_context():
+            assert Transaction.query.count() == 2
+            assert RecurringOccurrence.query.count() == 0
+
+    def test_rejects_bad_rules(self, auth_client, test_category):
+        """Test invalid rules are rejected with 400"""
+        base = {'type': 'expense', 'amount': '10', 'interval_unit': 'month', 'anchor_date': '2025-01-01',
+                'category_id': test_category}
+        for change in ({'type': 'transfer'}, {'amount': '0'}, {'amount': 'abc'}, {'interval_unit': 'hour'},
+                       {'interval_count': 0}, {'anchor_date': '01/01/2025'}, {'end_date': '2024-12-31'},
+                       {'category_id': None}, {'member_ids': [999]}):
+            response = auth_client.post('/transactions/api/recurring', json=dict(base, **change))
+            assert response.status_code == 400, change
@@ -45,6 +45,64 @@ class TestTransactionCreation:
             assert float(transaction.amount) == 50.00
 
 
+class TestIdempotentCreation:
+    """Test replayed creation requests do not add second rows"""
+
+    def test_double_submit_with_form_token(self, app, auth_client, test_user, test_category):
+        """Test re-posting the same form token adds one transaction"""
+        form = {
+            'amount': '50.00',
+            'transaction_type': 'expense',
+            'category_id': test_category,
+            'transaction_date': '2025-11-22',
+            'idempotency_key': 'form-token-1'
+        }
+        auth_client.post('/transactions/add_transaction', data=form)
+        auth_client.post('/transactions/add_transaction', data=form)
+        auth_client.post('/transactions/add_transaction', data=dict(form, idempotency_key='form-token-2'))
+
+        with app.app_context():
+            assert Transaction.query.filter_by(user_id=test_user.user_id).count() == 2
+
+    def test_header_key_on_family_expense(self, app, auth_client, test_user, test_member, test_category):
+        """Test an Idempotency-Key header makes retried family expenses replay"""
+        from app.models import MembersTransaction
+
+        form = {'amount': '30.00', 'category_id': test_category,
+                'member_ids': [test_member.member_id], 'include_user': 'true'}
+        for _ in range(2):
+            auth_client.post('/add_family_expense', data=form, headers={'Idempotency-Key': 'retry-1'})
+
+        with app.app_context():
+            assert Transaction.query.filter_by(user_id=test_user.user_id).count() == 1
+            assert MembersTransaction.query.count() == 1
+
+    def test_expired_keys_are_reused_and_purged(self, app, test_user, test_category):
+        """Test an expired key creates a new row and purge removes expired keys"""
+        from datetime import timedelta
+        from app.models import IdempotencyKey
+        from app.services import IdempotencyService
+
+        def create(session):
+            transaction = Transaction(user_id=test_user.user_id, category_id=test_category, amount=10.00,
+                                      transaction_type='expense', transaction_date=datetime.now())
+            session.add(transaction)
+            session.flush()
+            return transaction.transaction_id
+
+        with app.app_context():
+            first, replayed = IdempotencyService.run_once(test_user.user_id, 'test', 'key', create)
+            assert not replayed
+            assert IdempotencyService.run_once(test_user.user_id, 'test', 'key', create) == (first, True)
+
+            IdempotencyKey.query.one().expires_at = datetime.now() - timedelta(seconds=1)
+            db.session.commit()
+            second, replayed = IdempotencyService.run_once(test_user.user_id, 'test', 'key', create)
+            assert second != first and not replayed
+
+            assert IdempotencyService.purge_expired(datetime.now() + timedelta(days=2)) == 1
+            assert IdempotencyKey.query.count() == 0
+
 class TestTransactionEdit:
     """Test editing transactions"""
 
@@ -138,3 +196,321 @@ class TestTransactionDisplay:
 
         response = auth_client.get('/transactions/')
         assert b'50' in response.data or b'50.00' in response.data
+
+
+class TestTransactionDateBuckets:
+    """Test the stored year/year_month columns"""
+
+    def test_buckets_follow_transaction_date(self, app, test_user, test_category):
+        """Test ORM inserts, date edits and Core inserts all set the buckets"""
+        with app.app_context():
+            transaction = Transaction(user_id=test_user.user_id, category_id=test_category,
+                                      amount=10.00, transaction_type='expense',
+                                      transaction_date=datetime(2024, 12, 31, 18, 0))
+            db.session.add(transaction)
+            db.session.commit()
+            assert (transaction.year, transaction.year_month) == (2024, 202412)
+
+            transaction.transaction_date = datetime(2025, 1, 2)
+            db.session.commit()
+            db.session.expire_all()
+            assert (transaction.year, transaction.year_month) == (2025, 202501)
+
+            db.session.execute(Transaction.__table__.insert(), [{
+                'user_id': test_user.user_id, 'category_id': test_category, 'amount': 5.00,
+                'transaction_type': 'income', 'transaction_date': datetime(2023, 7, 15),
+                'user_participates': True
+            }])
+            core_row = Transaction.query.filter_by(transaction_type='income').one()
+            assert (core_row.year, core_row.year_month) == (2023, 202307)
+
+    def test_yearly_totals_and_available_periods(self, app, test_user, test_category):
+        """Test per-year totals and the years/months with data"""
+        from app.services import SimpleAnalyticsService
+
+        with app.app_context():
+            for amount, transaction_type, when in ((100.00, 'income', datetime(2024, 3, 1)),
+                                                   (40.00, 'expense', datetime(2024, 3, 20)),
+                                                   (25.50, 'expense', datetime(2025, 6, 5))):
+                db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category,
+                                           amount=amount, transaction_type=transaction_type,
+                                           transaction_date=when))
+            db.session.commit()
+
+            assert SimpleAnalyticsService.get_available_years(test_user.user_id) == [2024, 2025]
+            assert SimpleAnalyticsService.get_available_months(test_user.user_id) == [(2024, 3), (2025, 6)]
+            assert SimpleAnalyticsService.get_yearly_totals(test_user.user_id) == [
+                {'year': 2024, 'income': 100.00, 'expenses': 40.00, 'balance': 60.00},
+                {'year': 2025, 'income': 0.0, 'expenses': 25.50, 'balance': -25.50}
+            ]
+
+    def test_cashflow_page_lists_years(self, app, auth_client, test_user, test_category):
+        """Test the cash flow page renders a row per year with data"""
+        with app.app_context():
+            db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category,
+                                       amount=12.00, transaction_type='expense',
+                                       transaction_date=datetime(2022, 5, 1)))
+            db.session.commit()
+
+        response = auth_client.get('/cashflow')
+        assert response.status_code == 200
+        assert b'2022' in response.data
+
+
+class TestBulkTransactions:
+    """Test the set-based bulk transaction API"""
+
+    @pytest.fixture
+    def bulk_rows(self, app, test_user, test_member, test_category):
+        """Four expenses and one income across two days, the first expense shared with a member"""
+        from app.models import MembersTransaction
+
+        with app.app_context():
+            ids = []
+            for amount, transaction_type, day in ((10.00, 'expense', 3), (20.00, 'expense', 3),
+                                                  (30.00, 'expense', 4), (40.00, 'expense', 4),
+                                                  (500.00, 'income', 4)):
+                trans = Transaction(user_id=test_user.user_id, category_id=test_category, amount=amount,
+                                    transaction_type=transaction_type, transaction_date=datetime(2025, 3, day))
+                db.session.add(trans)
+                db.session.flush()
+                ids.append(trans.transaction_id)
+            db.session.add(MembersTransaction(transaction_id=ids[0], member_id=test_member.member_id))
+            db.session.commit()
+            return ids
+
+    def ledger_matches_rebuild(self, user_id):
+        """Test helper: the incrementally kept ledger equals a full rebuild"""
+        from app.models import DailyCumulative
+        from app.services import LedgerService
+
+        def rows():
+            return [(row.transaction_type, row.category_key, row.day, row.day_amount, row.cumulative_amount)
+                    for row in DailyCumulative.query.filter_by(user_id=user_id).order_by(
+                        DailyCumulative.transaction_type, DailyCumulative.category_key, DailyCumulative.day)]
+
+        incremental = rows()
+        LedgerService.rebuild(user_id)
+        return rows() == incremental
+
+    def test_recategorize_and_redate_by_ids(self, app, auth_client, test_user, bulk_rows):
+        """Test recategorizing and moving rows keeps buckets and the ledger consistent"""
+        with app.app_context():
+            other_category = Category.query.filter_by(category_name='Transport').one().category_id
+
+        response = auth_client.post('/transactions/api/bulk', json={
+            'action': 'recategorize', 'ids': bulk_rows[1:3], 'category_id': other_category})
+        assert response.get_json() == {'success': True, 'affected': 2, 'replayed': False}
+
+        response = auth_client.post('/transactions/api/bulk', json={
+            'action': 'set_date', 'filter': {'category_id': other_category}, 'date': '2025-04-15'})
+        assert response.get_json()['affected'] == 2
+
+        with app.app_context():
+            moved = Transaction.query.filter(Transaction.transaction_id.in_(bulk_rows[1:3])).all()
+            assert {(t.category_id, t.transaction_date, t.year_month) for t in moved} == {
+                (other_category, datetime(2025, 4, 15), 202504)}
+            assert self.ledger_matches_rebuild(test_user.user_id)
+
+    def test_delete_by_filter(self, app, auth_client, test_user, bulk_rows):
+        """Test deleting by filter removes matching rows with their member links"""
+        from app.models import MembersTransaction
+
+        response = auth_client.post('/transactions/api/bulk', json={
+            'action': 'delete', 'filter': {'transaction_type': 'expense', 'end': '2025-03-03'}})
+        assert response.get_json()['affected'] == 2
+
+        with app.app_context():
+            assert sorted(t.transaction_id for t in Transaction.query) == bulk_rows[2:]
+            assert MembersTransaction.query.count() == 0
+            assert self.ledger_matches_rebuild(test_user.user_id)
+
+    def test_assign_members_resplits_expenses_only(self, app, auth_client, test_user, test_member, bulk_rows):
+        """Test member assignment links expenses, leaves income alone and re-splits shares"""
+        from app.models import MembersTransaction
+
+        response = auth_client.post('/transactions/api/bulk', json={
+            'action': 'assign_members', 'ids': bulk_rows, 'member_ids': [test_member.member_id]})
+        assert response.get_json()['affected'] == 4
+
+        with app.app_context():
+            assert MembersTransaction.query.count() == 4
+            shares = {t.transaction_id: float(t.user_share_amount) for t in Transaction.query}
+            assert shares == {bulk_rows[0]: 5.00, bulk_rows[1]: 10.00, bulk_rows[2]: 15.00,
+                              bulk_rows[3]: 20.00, bulk_rows[4]: 500.00}
+
+        response = auth_client.post('/transactions/api/bulk', json={
+            'action': 'assign_members', 'ids': bulk_rows, 'member_ids': []})
+        with app.app_context():
+            assert MembersTransaction.query.count() == 0
+            assert float(db.session.get(Transaction, bulk_rows[0]).user_share_amount) == 10.00
+
+    def test_rejects_bad_requests_and_replays(self, app, auth_client, test_user, bulk_rows):
+        """Test malformed selections are rejected and a repeated Idempotency-Key replays"""
+        assert auth_client.post('/transactions/api/bulk', json={'action': 'delete', 'filter': {}}).status_code == 400
+        assert auth_client.post('/transactions/api/bulk', json={
+            'action': 'delete', 'filter': {'owner': 1}}).status_code == 400
+        assert auth_client.post('/transactions/api/bulk', json={
+            'action': 'assign_members', 'ids': bulk_rows, 'member_ids': [9999]}).status_code == 400
+        assert auth_client.post('/transactions/api/bulk', json={
+            'action': 'archive', 'ids': bulk_rows}).status_code == 400
+
+        request = {'action': 'delete', 'ids': bulk_rows[:1]}
+        first = auth_client.post('/transactions/api/bulk', json=request, headers={'Idempotency-Key': 'bulk-1'})
+        again = auth_client.post('/transactions/api/bulk', json=request, headers={'Idempotency-Key': 'bulk-1'})
+        assert first.get_json()['affected'] == 1
+        assert again.get_json() == {'success': True, 'affected': 1, 'replayed': True}
+        with app.app_context():
+            assert Transaction.query.count() == 4
+
+
+class TestTransactionSearch:
+    """Test description search, merchant autocomplete and top merchants"""
+
+    @pytest.fixture
+    def described(self, app, test_user, test_category, admin_user):
+        """Expenses with descriptions for the test user, and one for another user"""
+        with app.app_context():
+            for description, amount, day in (('TESCO STORES 2231', 20.00, 1), ('Tesco Express 14', 5.00, 2),
+                                             ('Tesco petrol station', 40.00, 3), ('Uber trip to Tesco', 15.00, 4),
+                                             ('Netflix subscription', 9.99, 5)):
+                db.session.add(Transaction(user_id=test_user.user_id, category_id=test_category, amount=amount,
+                                           transaction_type='expense', transaction_date=datetime(2025, 3, day),
+                                           description=description))
+            db.session.add(Transaction(user_id=admin_user.user_id, category_id=test_category, amount=1.00,
+                                       transaction_type='expense', transaction_date=datetime(2025, 3, 1),
+                                       description='Tesco meal deal'))
+            db.session.commit()
+
+    def test_search_ranks_prefix_matches_for_one_user(self, app, auth_client, described):
+        """Test the last word matches as a prefix, only the user's rows return, and edits reindex"""
+        results = auth_client.get('/transactions/api/search?q=tesco sto').get_json()['results']
+        assert [row['description'] for row in results] == ['TESCO STORES 2231']
+
+        results = auth_client.get('/transactions/api/search?q=tes').get_json()['results']
+        assert len(results) == 4 and 'Tesco meal deal' not in [row['description'] for row in results]
+        # Operators typed by the user are searched as plain words
+        assert auth_client.get('/transactions/api/search?q=tesco OR "netflix').get_json()['results'] == []
+
+        with app.app_context():
+            netflix = Transaction.query.filter_by(description='Netflix subscription').one()
+            netflix.description = 'Disney plus'
+            db.session.delete(Transaction.query.filter_by(description='Tesco Express 14').one())
+            db.session.commit()
+        assert auth_client.get('/transactions/api/search?q=netflix').get_json()['results'] == []
+        assert [row['merchant'] for row in auth_client.get('/transactions/api/search?q=disney')
+                .get_json()['results']] == ['disney plus']
+        assert len(auth_client.get('/transactions/api/search?q=tesco').get_json()['results']) == 3
+
+    def test_merchant_suggestions_and_totals(self, auth_client, described):
+        """Test autocomplete groups merchants by prefix and top merchants rank by total spent"""
+        suggestions = auth_client.get('/transactions/api/merchants/suggest?prefix=Tes').get_json()['merchants']
+        assert [row['merchant'] for row in suggestions] == ['tesco express', 'tesco petrol station', 'tesco stores']
+
+        top = auth_client.get('/transactions/api/merchants/top?start=2025-03-01&end=2025-03-04').get_json()
+        assert [(row['merchant'], row['total']) for row in top['merchants']] == [
+            ('tesco petrol station', 40.0), ('tesco stores', 20.0), ('uber trip to tesco', 15.0),
+            ('tesco express', 5.0)
+        ]
+        assert auth_client.get('/transactions/api/merchants/top?start=March').status_code == 400
+
+    def test_family_expense_keeps_description(self, app, auth_client, test_category):
+        """Test the family expense form stores its description and the edit form updates it"""
+        auth_client.post('/add_family_expense', data={
+            'amount': '12.00', 'category_id': test_category, 'description': 'School trip',
+            'include_user': 'true'
+        })
+        with app.app_context():
+            expense = Transaction.query.one()
+            assert (expense.description, expense.merchant) == ('School trip', 'school trip')
+
+        auth_client.post(f'/edit_family_expense/{expense.transaction_id}', data={
+            'expense_id': expense.transaction_id, 'amount': '12.00', 'category_id': test_category,
+            'description': 'School trip deposit', 'include_user': 'true'
+        })
+        data = auth_client.get(f'/api/family_expense/{expense.transaction_id}').get_json()
+        assert data['expense']['description'] == 'School trip deposit'
+
+
+class TestTransactionTags:
+    """Test tagging transactions, tag filters and per-tag totals"""
+
+    def test_add_and_edit_forms_save_tags(self, app, auth_client, test_user, test_category):
+        """Test the add form normalizes and de-duplicates tags and the edit form replaces them"""
+        auth_client.post('/transactions/add_transaction', data={
+            'amount': '30.00', 'transaction_type': 'expense', 'category_id': test_category,
+            'transaction_date': '2025-03-01', 'tags': 'Holiday, spain , holiday,'
+        })
+        with app.app_context():
+            transaction = Transaction.query.one()
+            assert sorted(link.tag.name for link in transaction.tags) == ['holiday', 'spain']
+
+        auth_client.post(f'/transactions/edit_transaction/{transaction.transaction_id}', data={
+            'amount': '30.00', 'transaction_type': 'expense', 'category_id': test_category,
+            'transaction_date': '2025-03-01', 'tags': 'holiday, Hotel Stay'
+        })
+        tags = auth_client.get('/transactions/api/tags').get_json()['tags']
+        assert [(tag['name'], tag['count']) for tag in tags] == [('holiday', 1), ('hotel-stay', 1), ('spain', 0)]
+
+    def test_filters_and_totals(self, app, auth_client, test_user, test_category, admin_user):
+        """Test all/any/none filters and tag totals cover only the user's tagged rows"""
+        with app.app_context():
+            ids = []
+            for amount, kind, day in ((100.00, 'expense', 1), (40.00, 'expense', 2), (25.00, 'expense', 3),
+                                      (500.00, 'income', 4)):
+                transaction = Transaction(user_id=test_user.user_id, category_id=test_category, amount=amount,
+                                          transaction_type=kind, transaction_date=datetime(2025, 3, day))
+                db.session.add(transaction)
+                ids.append(transaction)
+            other = Transaction(user_id=admin_user.user_id, category_id=test_category, amount=9.00,
+                                transaction_type='expense', transaction_date=datetime(2025, 3, 1))
+            db.session.add(other)
+            db.session.commit()
+            ids = [transaction.transaction_id for transaction in ids]
+            other_id = other.transaction_id
+
+        for transaction_id, tags in zip(ids, (['holiday', 'spain'], ['holiday'], ['spain', 'work'], ['work'])):
+            assert auth_client.put(f'/transactions/api/{transaction_id}/tags',
+                                   json={'tags': tags}).get_json()['tags'] == tags
+        assert auth_client.put(f'/transactions/api/{other_id}/tags', json={'tags': ['spain']}).status_code == 404
+        too_many = auth_client.put(f'/transactions/api/{ids[0]}/tags', json={'tags': [f't{n}' for n in range(11)]})
+        assert too_many.status_code == 400
+
+        def select(query):
+            data = auth_client.get(f'/transactions/api/tags/filter?{query}').get_json()
+            return data['count'], data['income'], data['expenses'], data['transaction_ids']
+
+        assert select('all=holiday,spain') == (1, 0.0, 100.0, [ids[0]])
+        assert select('any=holiday,work&none=spain') == (2, 500.0, 40.0, [ids[3], ids[1]])
+        assert select('any=spain&end=2025-03-02') == (1, 0.0, 100.0, [ids[0]])
+        assert select('all=holiday,unknown')[0] == 0
+        assert select('none=unknown')[0] == 4
+
+        totals = auth_client.get('/transactions/api/tags/totals').get_json()['tags']
+        assert [(row['tag'], row['count'], row['income'], row['expenses']) for row in totals] == [
+            ('holiday', 2, 0.0, 140.0), ('spain', 2, 0.0, 125.0), ('work', 2, 500.0, 25.0)
+        ]
+        assert auth_client.get('/transactions/api/tags/totals?start=03-2025').status_code == 400
+
+    def test_bulk_delete_removes_tag_links(self, app, auth_client, test_user, test_category):
+        """Test bulk-deleted rows leave no tag links for a reused id to inherit"""
+        from app.models import TransactionTag
+
+        with app.app_context():
+            transaction = Transaction(user_id=test_user.user_id, category_id=test_category, amount=12.00,
+                                      transaction_type='expense', transaction_date=datetime(2025, 3, 1))
+            db.session.add(transaction)
+            db.session.commit()
+            transaction_id = transaction.transaction_id
+        auth_client.put(f'/transactions/api/{transaction_id}/tags', json={'tags': ['groceries']})
+
+        response = auth_client.post('/transactions/api/bulk', json={'action': 'delete', 'ids': [transaction_id]})
+        assert response.get_json()['affected'] == 1
+
+        with app.app_context():
+            assert TransactionTag.query.count() == 0
+            reused = Transaction(user_id=test_user.user_id, category_id=test_category, amount=99.00,
+                                 transaction_type='expense', transaction_date=datetime(2025, 3, 2))
+            db.session.add(reused)
+            db.session.commit()
+        assert auth_client.get('/transactions/api/tags/totals').get_json()['tags'] == []
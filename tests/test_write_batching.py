@@ -0,0 +1,101 @@
+"""Tests for group-committed request writes"""
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app
+from app.batcher import run_write
+from app.models import User, Category, Transaction, MembersTransaction, Member, DailyCumulative, db
+
+
+@pytest.fixture
+def batched_app(tmp_path):
+    """App writing to a SQLite file through the write batcher, with one user and one member"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'batched.db'}",
+        'WTF_CSRF_ENABLED': False,
+        'SECRET_KEY': 'test-secret-key',
+        'WRITE_BATCHING': True,
+        'WRITE_BATCH_WINDOW_MS': 20
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(user_name='Batch User', email='batch@example.com')
+        user.set_password('Password123!')
+        db.session.add_all([user, Category(category_name='Food', user_id=None)])
+        db.session.flush()
+        db.session.add(Member(user_id=user.user_id, name='Sam', relationship='Child'))
+        db.session.commit()
+
+    yield app
+
+    app.extensions['write_batcher'].close()
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+
+
+def user_id(app):
+    with app.app_context():
+        return User.query.one().user_id
+
+
+class TestWriteBatcher:
+    """Test concurrent write units share commits but not failures"""
+
+    def test_concurrent_units_commit_together(self, batched_app):
+        """Test every good unit commits, a failing unit fails alone, in fewer commits than units"""
+        owner = user_id(batched_app)
+        errors = []
+
+        def submit(index):
+            with batched_app.app_context():
+                def write(session):
+                    # Unit 3 violates NOT NULL on amount
+                    session.add(Transaction(user_id=owner, amount=None if index == 3 else index + 1,
+                                            transaction_type='expense', transaction_date=datetime.now()))
+                    session.flush()
+                try:
+                    run_write(write)
+                except IntegrityError:
+                    errors.append(index)
+
+        threads = [threading.Thread(target=submit, args=(index,)) for index in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        batcher = batched_app.extensions['write_batcher']
+        with batched_app.app_context():
+            assert errors == [3]
+            assert Transaction.query.count() == 15
+            assert batcher.units == 16
+            assert batcher.batches < 16
+            # Derived ledger rows were written by the same group commits
+            assert DailyCumulative.query.filter_by(category_key=DailyCumulative.ALL_CATEGORIES).one().day_amount \
+                == sum(range(1, 17)) * 100 - 4 * 100
+
+    def test_family_expense_route_goes_through_batcher(self, batched_app):
+        """Test the family expense form writes the expense and its member links via the writer"""
+        client = batched_app.test_client()
+        client.post('/login', data={'email': 'batch@example.com', 'password': 'Password123!'})
+        with batched_app.app_context():
+            category_id = Category.query.one().category_id
+            member_id = Member.query.one().member_id
+
+        client.post('/add_family_expense', data={
+            'amount': '30.00',
+            'category_id': category_id,
+            'member_ids': [member_id],
+            'include_user': 'true'
+        })
+
+        assert batched_app.extensions['write_batcher'].units == 1
+        with batched_app.app_context():
+            link = MembersTransaction.query.one()
+            assert link.member_id == member_id
+            assert float(link.share_amount) == 15.00